@@ -32,6 +32,9 @@ def create_app(config_class=None):
     # 初始化扩展
     db.init_app(app)
     login_manager.init_app(app)
+    # 批量上传放宽请求体大小上限，须在 CSRF 校验读取表单之前执行
+    from flask_app.admin.bulk_upload_view import raise_bulk_upload_limit
+    app.before_request(raise_bulk_upload_limit)
     csrf.init_app(app)
     migrate.init_app(app, db)
     babel.init_app(app)
@@ -65,6 +68,32 @@ def create_app(config_class=None):
     # 创建数据库表
     with app.app_context():
         db.create_all()
+        from flask_app.utils.schema_utils import add_missing_columns
+        add_missing_columns(db)
+    
+    # 证书文件存储（维护按内容存放的文件的引用数）
+    from flask_app.services.blob_store import blob_store
+    blob_store.init_app(app)
+    
+    # 启动AI识别后台工作线程
+    from flask_app.services.extraction_worker import extraction_workers
+    extraction_workers.init_app(app)
+    
+    # API密钥池（进程退出时写回调用次数）
+    from flask_app.services.api_key_pool import api_key_pool
+    api_key_pool.init_app(app)
+    
+    # AI调用记录（进程退出时写入缓冲区中的记录）
+    from flask_app.services.ai_call_log import ai_call_recorder
+    ai_call_recorder.init_app(app)
+    
+    # AI识别结果缓存（定期写回命中记录并淘汰缓存）
+    from flask_app.services.extraction_cache_service import ExtractionCacheService
+    ExtractionCacheService.init_app(app)
+    
+    # 注册命令行工具
+    from flask_app.cli import register_commands
+    register_commands(app)
     
     # 注册首页路由
     @app.route('/')
@@ -149,13 +149,16 @@ def init_admin(app):
     """初始化 Flask-Admin"""
     from flask_app.admin.views import (
         UserAdminView, CertificateAdminView, DictionaryAdminView,
-        SystemConfigAdminView, APIKeyAdminView, FileAdminView
+        SystemConfigAdminView, APIKeyAdminView, FileAdminView,
+        ExtractionCacheAdminView
     )
     from flask_app.admin.custom_views import (
-        CertificateUploadView, UserImportView, MyCertificatesView,
-        StudentCertificatesView, StatisticsView
+        CertificateUploadView, BulkUploadView, UserImportView, MyCertificatesView,
+        StudentCertificatesView, StatisticsView, AIUsageView
+    )
+    from flask_app.models import (
+        User, Certificate, Dictionary, SystemConfig, APIKey, File, ExtractionCache
     )
-    from flask_app.models import User, Certificate, Dictionary, SystemConfig, APIKey, File
     
     admin = Admin(
         app,
@@ -174,6 +177,12 @@ def init_admin(app):
         category='证书管理'
     ))
     
+    admin.add_view(BulkUploadView(
+        name='批量上传',
+        endpoint='bulk_upload',
+        category='证书管理'
+    ))
+    
     admin.add_view(MyCertificatesView(
         name='我的证书',
         endpoint='my_certs',
@@ -229,6 +238,19 @@ def init_admin(app):
         category='系统设置'
     ))
     
+    admin.add_view(ExtractionCacheAdminView(
+        ExtractionCache, db.session,
+        name='识别缓存',
+        endpoint='extraction_cache_admin',
+        category='系统设置'
+    ))
+    
+    admin.add_view(AIUsageView(
+        name='AI调用统计',
+        endpoint='ai_usage',
+        category='系统设置'
+    ))
+    
     # ===== 统计报表 =====
     admin.add_view(StatisticsView(
         name='统计报表',
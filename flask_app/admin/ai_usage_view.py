@@ -0,0 +1,111 @@
+"""
+AI调用统计视图 - 按日期、密钥、模型汇总接口调用的次数、耗时与token用量
+"""
+from flask import redirect, url_for, request
+from flask_admin import BaseView, expose
+from flask_login import current_user
+from datetime import datetime, timedelta
+from sqlalchemy import case, func
+
+from flask_app.models import AICallLog, APIKey
+from flask_app import db
+
+
+class AIUsageView(BaseView):
+    """AI调用统计视图（仅管理员）"""
+
+    # 可选的统计范围（天）
+    RANGE_CHOICES = [1, 7, 30, 90]
+
+    @staticmethod
+    def _aggregate_columns():
+        """各维度共用的汇总列"""
+        return [
+            func.count(AICallLog.log_id).label('calls'),
+            func.sum(case((AICallLog.outcome.in_([AICallLog.OUTCOME_OK, AICallLog.OUTCOME_EMPTY]), 0),
+                          else_=1)).label('errors'),
+            func.sum(case((AICallLog.outcome == AICallLog.OUTCOME_EMPTY, 1), else_=0)).label('empty'),
+            func.sum(case((AICallLog.fallback.is_(True), 1), else_=0)).label('fallback'),
+            func.sum(case((AICallLog.thinking.is_(True), 1), else_=0)).label('thinking'),
+            func.coalesce(func.sum(AICallLog.prompt_tokens), 0).label('prompt_tokens'),
+            func.coalesce(func.sum(AICallLog.completion_tokens), 0).label('completion_tokens'),
+            func.coalesce(func.sum(AICallLog.total_tokens), 0).label('total_tokens'),
+            func.avg(AICallLog.latency_ms).label('avg_latency'),
+            func.max(AICallLog.latency_ms).label('max_latency'),
+            func.coalesce(func.sum(AICallLog.payload_bytes), 0).label('payload_bytes'),
+        ]
+
+    @staticmethod
+    def _to_dict(row, **extra):
+        data = dict(extra)
+        for name in ['calls', 'errors', 'empty', 'fallback', 'thinking', 'prompt_tokens',
+                     'completion_tokens', 'total_tokens', 'max_latency', 'payload_bytes']:
+            data[name] = int(getattr(row, name) or 0)
+        data['avg_latency'] = round(float(row.avg_latency or 0))
+        data['error_rate'] = round(data['errors'] * 100 / data['calls'], 1) if data['calls'] else 0
+        data['avg_tokens'] = round(data['total_tokens'] / data['calls']) if data['calls'] else 0
+        return data
+
+    @expose('/')
+    def index(self, cls=None, *args, **kwargs):
+        if not current_user.is_authenticated:
+            return redirect(url_for('auth.login', next=request.url))
+
+        days = request.args.get('days', 7, type=int)
+        if days not in self.RANGE_CHOICES:
+            days = 7
+        since = (datetime.now() - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        columns = self._aggregate_columns()
+
+        def grouped(*keys):
+            return db.session.query(*keys, *columns).filter(AICallLog.created_at >= since).group_by(*keys)
+
+        totals = self._to_dict(db.session.query(*columns).filter(AICallLog.created_at >= since).one())
+
+        # 按日期
+        day = func.date(AICallLog.created_at)
+        by_day = [self._to_dict(row, day=str(row[0])) for row in grouped(day).order_by(day.desc()).all()]
+
+        # 按密钥
+        keys = {key.key_id: key for key in APIKey.query.all()}
+        by_key = []
+        for row in grouped(AICallLog.key_id).order_by(func.count(AICallLog.log_id).desc()).all():
+            key = keys.get(row[0])
+            by_key.append(self._to_dict(
+                row,
+                key_id=row[0],
+                masked_key=key.masked_key if key else '（已删除）',
+                model_name=key.model_name if key else '',
+                is_active=bool(key and key.is_active),
+                usage_count=key.usage_count if key else None,
+                max_usage=key.max_usage if key else None
+            ))
+
+        # 按模型
+        by_model = [
+            self._to_dict(row, model_name=row[0] or '未知')
+            for row in grouped(AICallLog.model_name).order_by(func.count(AICallLog.log_id).desc()).all()
+        ]
+
+        # 按调用结果
+        by_outcome = [
+            {'outcome': outcome, 'count': count}
+            for outcome, count in db.session.query(AICallLog.outcome, func.count(AICallLog.log_id))
+            .filter(AICallLog.created_at >= since)
+            .group_by(AICallLog.outcome).order_by(func.count(AICallLog.log_id).desc()).all()
+        ]
+
+        return self.render('admin/custom/ai_usage.html',
+                           days=days,
+                           range_choices=self.RANGE_CHOICES,
+                           totals=totals,
+                           by_day=by_day,
+                           by_key=by_key,
+                           by_model=by_model,
+                           by_outcome=by_outcome)
+
+    def is_accessible(self):
+        return current_user.is_authenticated and current_user.role == 'admin'
+
+    def is_visible(self):
+        return current_user.is_authenticated and current_user.role == 'admin'
@@ -0,0 +1,245 @@
+"""
+批量上传证书视图（教师、教学秘书用）
+"""
+from flask import redirect, url_for, request, flash, current_app
+from flask_admin import BaseView, expose
+from flask_login import current_user
+from sqlalchemy import literal
+from datetime import datetime
+import logging
+import os
+import uuid
+import zipfile
+
+from flask_app.models import Certificate, File
+from flask_app import db
+from flask_app.utils.file_utils import get_file_type, save_upload_stream
+
+logger = logging.getLogger(__name__)
+
+
+class BulkUploadView(BaseView):
+    """批量上传证书视图"""
+
+    # 允许的证书格式（PDF在识别前渲染为图片）
+    ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.pdf'}
+
+    @expose('/', methods=['GET', 'POST'])
+    def index(self, cls=None, **kwargs):
+        if not current_user.is_authenticated:
+            return redirect(url_for('auth.login', next=request.url))
+
+        if current_user.role not in ['teacher', 'admin', 'secretary']:
+            flash('只有教师、教学秘书和管理员可以批量上传证书', 'warning')
+            return redirect(url_for('admin.index'))
+
+        if request.method == 'POST':
+            # 请求体大小上限已由 raise_bulk_upload_limit() 在 CSRF 校验之前放宽
+            try:
+                uploads, skipped = self._collect_uploads(request.files.getlist('certificate_files'))
+            except zipfile.BadZipFile:
+                flash('❌ ZIP 文件已损坏或格式不正确', 'danger')
+                return redirect(request.url)
+            except ValueError as e:
+                flash(f'❌ {e}', 'danger')
+                return redirect(request.url)
+
+            if not uploads and not skipped:
+                flash('请选择要上传的证书文件或 ZIP 压缩包（支持 JPG、PNG、BMP、GIF、WEBP、PDF）', 'warning')
+                return redirect(request.url)
+
+            batch_id, created, skipped = self._create_batch(uploads, skipped)
+            if created:
+                flash(f'✅ 已上传 {created} 张证书，AI 正在后台识别，识别结果会自动填入下方草稿', 'success')
+            if skipped:
+                flash(f'⚡ {skipped} 张证书与已上传的证书重复，已跳过', 'info')
+            if not created:
+                return redirect(url_for('.index'))
+            return redirect(url_for('.index', batch_id=batch_id))
+
+        items = []
+        pending = 0
+        batch_id = request.args.get('batch_id')
+        if batch_id:
+            from flask_app.services.extraction_job_service import ExtractionJobService
+            jobs = ExtractionJobService.get_batch_jobs(batch_id, user_id=current_user.user_id)
+            cert_ids = [job.cert_id for job in jobs if job.cert_id]
+            certs = {c.cert_id: c for c in Certificate.query.filter(Certificate.cert_id.in_(cert_ids))} if cert_ids else {}
+            for job in jobs:
+                items.append({'job': job, 'cert': certs.get(job.cert_id)})
+                if not job.is_finished:
+                    pending += 1
+
+        return self.render('admin/custom/bulk_upload.html',
+                          batch_id=batch_id,
+                          items=items,
+                          pending=pending,
+                          max_files=current_app.config.get('BULK_UPLOAD_MAX_FILES', 200))
+
+    def _collect_uploads(self, files):
+        """
+        逐个保存上传的证书文件，ZIP 压缩包会被展开
+
+        每个文件（或压缩包内的文件）分块写入文件存储，内存中只保留一个分块；
+        批次内重复的文件不保存。
+
+        Returns:
+            tuple: ([(原始文件名, MD5, 文件路径, 文件大小), ...], 批次内重复的文件数)
+        """
+        max_files = current_app.config.get('BULK_UPLOAD_MAX_FILES', 200)
+        max_file_size = current_app.config.get('MAX_CONTENT_LENGTH')
+        uploads = []
+        seen = set()
+        count = 0
+
+        def save(stream, filename):
+            nonlocal count
+            count += 1
+            if count > max_files:
+                raise ValueError(f'单次最多上传 {max_files} 张证书')
+            file_path, file_md5, file_size, _ = save_upload_stream(
+                stream, filename, is_duplicate=lambda md5: md5 in seen
+            )
+            if file_path is not None:
+                seen.add(file_md5)
+                uploads.append((filename, file_md5, file_path, file_size))
+
+        for file in files:
+            if not file or not file.filename:
+                continue
+            ext = os.path.splitext(file.filename)[1].lower()
+
+            if ext == '.zip':
+                with zipfile.ZipFile(file.stream) as archive:
+                    for info in archive.infolist():
+                        name = info.filename
+                        if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                            continue
+                        if os.path.splitext(name)[1].lower() not in self.ALLOWED_EXTENSIONS:
+                            continue
+                        if max_file_size and info.file_size > max_file_size:
+                            raise ValueError(f'压缩包内文件 {os.path.basename(name)} 超过单个文件大小限制')
+                        with archive.open(info) as member:
+                            save(member, os.path.basename(name))
+            elif ext in self.ALLOWED_EXTENSIONS:
+                save(file.stream, file.filename)
+
+        return uploads, count - len(uploads)
+
+    def _create_batch(self, uploads, skipped=0):
+        """
+        创建文件记录、草稿证书并提交批量识别任务
+
+        Args:
+            uploads: _collect_uploads() 保存的文件
+            skipped: 已跳过的批次内重复文件数
+
+        Returns:
+            tuple: (批次ID, 新建证书数, 跳过的重复文件数)
+        """
+        from flask_app.services.extraction_job_service import ExtractionJobService
+
+        files_by_md5 = {file_md5: (filename, file_path, file_size)
+                        for filename, file_md5, file_path, file_size in uploads}
+
+        # 一次查询同时比对已有证书和已上传文件
+        md5_list = list(files_by_md5)
+        cert_query = db.session.query(
+            Certificate.file_md5.label('file_md5'),
+            literal('certificate').label('source'),
+            Certificate.file_path.label('file_path')
+        ).filter(
+            Certificate.file_md5.in_(md5_list),
+            Certificate.submitter_id == current_user.user_id
+        )
+        file_query = db.session.query(
+            File.file_md5.label('file_md5'),
+            literal('file').label('source'),
+            File.file_path.label('file_path')
+        ).filter(
+            File.file_md5.in_(md5_list),
+            File.user_id == current_user.user_id
+        )
+        existing_certs = set()
+        existing_files = {}
+        for row in cert_query.union_all(file_query).all():
+            if row.source == 'certificate':
+                existing_certs.add(row.file_md5)
+            elif os.path.exists(row.file_path):
+                existing_files[row.file_md5] = row.file_path
+
+        now = datetime.now()
+        items = []
+
+        for file_md5, (filename, saved_path, file_size) in files_by_md5.items():
+            if file_md5 in existing_certs:
+                skipped += 1
+                continue
+            file_type = get_file_type(filename)
+
+            file_path = existing_files.get(file_md5)
+            if not file_path:
+                file_path = saved_path
+                db.session.add(File(
+                    user_id=current_user.user_id,
+                    file_name=os.path.basename(file_path),
+                    file_path=file_path,
+                    file_type=file_type,
+                    file_size=file_size,
+                    file_md5=file_md5,
+                    upload_time=now
+                ))
+
+            # 草稿证书，识别完成后由后台任务回填
+            cert = Certificate(
+                cert_id=str(uuid.uuid4()),
+                submitter_id=current_user.user_id,
+                submitter_role=current_user.role,
+                student_id='',
+                student_name='',
+                department=current_user.department if current_user.role == 'secretary' else '',
+                competition_name='',
+                award_category='',
+                award_level='',
+                competition_type='',
+                organizer='',
+                advisor='',
+                file_path=file_path,
+                file_md5=file_md5,
+                extraction_method='glm4v',
+                status='draft',
+                created_at=now
+            )
+            db.session.add(cert)
+            items.append({
+                'file_path': file_path,
+                'file_md5': file_md5,
+                'file_type': file_type,
+                'cert_id': cert.cert_id
+            })
+
+        db.session.commit()
+
+        batch_id = str(uuid.uuid4())
+        if items:
+            ExtractionJobService.enqueue_batch(current_user.user_id, items, batch_id)
+            logger.info(f"用户 {current_user.account_id} 批量上传 {len(items)} 张证书，批次 {batch_id}")
+
+        return batch_id, len(items), skipped
+
+    def is_accessible(self):
+        return current_user.is_authenticated and current_user.role in ['teacher', 'admin', 'secretary']
+    
+    def is_visible(self):
+        return current_user.is_authenticated and current_user.role in ['teacher', 'admin', 'secretary']
+
+
+def raise_bulk_upload_limit():
+    """
+    批量上传放宽请求体大小上限（BULK_UPLOAD_MAX_CONTENT_LENGTH）
+
+    全局 CSRF 校验在 before_request 中读取表单，须在其之前注册，否则请求体已按
+    MAX_CONTENT_LENGTH 解析并返回413。
+    """
+    if request.method == 'POST' and request.endpoint == 'bulk_upload.index':
+        request.max_content_length = current_app.config.get('BULK_UPLOAD_MAX_CONTENT_LENGTH')
@@ -4,15 +4,18 @@
 from flask import redirect, url_for, request, flash, current_app
 from flask_admin import BaseView, expose
 from flask_login import current_user
-from werkzeug.utils import secure_filename
 from datetime import datetime
 import os
-import hashlib
+import logging
 
 from flask_app.models import Certificate, File, SystemConfig
 from flask_app.schemas import CertificateSubmitSchema, validate_data
 from flask_app import db
 from flask_app.utils.date_utils import parse_award_date
+from flask_app.utils.certificate_utils import prepare_extracted_info
+from flask_app.utils.file_utils import get_file_type, save_upload_stream, create_file_record, resolve_file_md5
+
+logger = logging.getLogger(__name__)
 
 
 class CertificateUploadView(BaseView):
@@ -36,6 +39,7 @@ class CertificateUploadView(BaseView):
         file_md5 = None
         is_quick_upload = False
         existing_cert = None
+        extraction_job_id = None
         can_edit = True
         
         if request.method == 'POST':
@@ -52,109 +56,143 @@ class CertificateUploadView(BaseView):
                 # 处理文件上传
                 file = request.files.get('certificate_file')
                 if file and file.filename:
-                    # 验证文件类型，只允许图片格式
-                    allowed_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp'}
+                    # 验证文件类型，允许图片和PDF（PDF在识别前渲染为图片）
+                    allowed_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.pdf'}
                     original_filename = file.filename
                     ext = os.path.splitext(original_filename)[1].lower()
                     
                     if ext not in allowed_extensions:
-                        flash('❌ 不支持该文件格式！请将PDF或其他格式转换为图片（支持 JPG、PNG、BMP、GIF、WEBP）后再上传。', 'danger')
+                        flash('❌ 不支持该文件格式！请上传图片（JPG、PNG、BMP、GIF、WEBP）或PDF文件。', 'danger')
                         return redirect(request.url)
                     
-                    # 计算MD5
-                    file_content = file.read()
-                    file_md5 = hashlib.md5(file_content).hexdigest()
-                    file.seek(0)
+                    # 分块读取上传流，边计算MD5边写入文件存储；已有相同证书时丢弃临时文件（秒传）
+                    duplicates = []
                     
-                    # 检查秒传
-                    existing_cert = Certificate.query.filter_by(
-                        file_md5=file_md5,
-                        submitter_id=current_user.user_id
-                    ).first()
+                    def is_duplicate(md5):
+                        cert = Certificate.query.filter_by(
+                            file_md5=md5,
+                            submitter_id=current_user.user_id
+                        ).first()
+                        if cert:
+                            duplicates.append(cert)
+                        return cert is not None
+                    
+                    keep_max_bytes = current_app.config.get('EXTRACTION_UPLOAD_KEEP_MAX_BYTES', 0) \
+                        if current_app.config.get('EXTRACTION_ON_UPLOAD', True) else 0
+                    file_path, file_md5, file_size, file_content = save_upload_stream(
+                        file.stream, original_filename,
+                        is_duplicate=is_duplicate,
+                        keep_max_bytes=keep_max_bytes
+                    )
+                    existing_cert = duplicates[0] if duplicates else None
                     
                     if existing_cert:
                         # 秒传成功
                         is_quick_upload = True
                         flash('⚡ 秒传成功！检测到相同证书，已加载原有数据', 'info')
-                        
-                        # 根据角色和证书状态判断是否可编辑
-                        if current_user.role in ['admin', 'secretary']:
-                            can_edit = True  # 管理员和教学秘书可以编辑任何状态
-                        elif current_user.role == 'teacher':
-                            can_edit = existing_cert.status in ['draft', 'pending_teacher']
-                        else:  # student
-                            can_edit = existing_cert.status == 'draft'
-                        
-                        # 确保 award_date 是字符串格式
-                        award_date_str = ''
-                        if existing_cert.award_date:
-                            if isinstance(existing_cert.award_date, datetime):
-                                award_date_str = existing_cert.award_date.strftime('%Y-%m-%d')
-                            else:
-                                award_date_str = str(existing_cert.award_date)
-                        
-                        extracted_info = {
-                            'student_id': existing_cert.student_id,
-                            'student_name': existing_cert.student_name,
-                            'student_department': existing_cert.department,
-                            'competition_name': existing_cert.competition_name,
-                            'award_category': existing_cert.award_category,
-                            'award_level': existing_cert.award_level,
-                            'competition_type': existing_cert.competition_type,
-                            'organizer': existing_cert.organizer,
-                            'award_date': award_date_str,
-                            'advisor': existing_cert.advisor,
-                            'advisor_id': existing_cert.advisor_id or ''
-                        }
+                        extracted_info, can_edit = self._load_existing_cert(existing_cert)
                         file_path = existing_cert.file_path
                     else:
-                        # 保存文件到 static/uploads 目录
-                        original_filename = secure_filename(file.filename)
-                        ext = os.path.splitext(original_filename)[1].lower()
-                        if not ext:
-                            ext = '.jpg'  # 默认扩展名
-                        
-                        user_folder = f"{current_user.account_id}_{current_user.name}"
-                        
-                        # 统一保存到 static/uploads 目录
-                        base_dir = current_app.config.get('UPLOAD_FOLDER', 
-                            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'uploads'))
-                        
-                        file_type = 'image'  # 只支持图片
-                        
-                        save_dir = os.path.join(base_dir, user_folder)
-                        os.makedirs(save_dir, exist_ok=True)
-                        
-                        date_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        unique_filename = f"{date_str}_cert{ext}"
-                        file_path = os.path.join(save_dir, unique_filename)
-                        
-                        with open(file_path, 'wb') as f:
-                            f.write(file_content)
-                        
-                        # 保存文件记录
-                        file_record = File(
-                            user_id=current_user.user_id,
-                            file_name=unique_filename,
-                            file_path=file_path,
-                            file_type=file_type,
-                            file_size=len(file_content),
-                            file_md5=file_md5,
-                            upload_time=datetime.now()
+                        extracted_info, extraction_job_id = self._register_upload(
+                            file_path, file_md5, file_size, file_content
                         )
-                        db.session.add(file_record)
-                        db.session.commit()
-                        
-                        flash('✅ 文件上传成功，请点击"AI识别"按钮提取证书信息', 'success')
+                        if extracted_info:
+                            flash('✅ 文件上传成功，已加载相同文件的识别结果，请核对信息后保存', 'success')
+                        elif extraction_job_id:
+                            flash('✅ 文件上传成功，AI正在后台识别证书信息', 'success')
+                        else:
+                            flash('✅ 文件上传成功，请点击"AI识别"按钮提取证书信息', 'success')
                 else:
                     flash('请选择要上传的文件', 'warning')
             
+            elif action == 'instant':
+                # 秒传：浏览器计算的MD5与已保存的文件相同，校验持有文件后不再上传内容
+                from flask import session
+                from flask_app.services.blob_store import blob_store
+                import hmac
+                import time
+                
+                challenge = session.pop('upload_challenge', None)
+                file_md5 = (request.form.get('file_md5') or '').lower()
+                proof = request.form.get('proof') or ''
+                original_filename = request.form.get('file_name') or ''
+                key = blob_store.find(file_md5, challenge.get('file_size')) if challenge else None
+                if not challenge or challenge.get('file_md5') != file_md5 \
+                        or challenge.get('expires', 0) < time.time() or key is None \
+                        or not hmac.compare_digest(proof, blob_store.possession_proof(key, challenge)) \
+                        or not blob_store.claim(key):
+                    flash('❌ 秒传校验失败，请重新选择文件上传', 'danger')
+                    return redirect(request.url)
+                
+                existing_cert = Certificate.query.filter_by(
+                    file_md5=file_md5,
+                    submitter_id=current_user.user_id
+                ).first()
+                if existing_cert:
+                    is_quick_upload = True
+                    flash('⚡ 秒传成功！检测到相同证书，已加载原有数据', 'info')
+                    extracted_info, can_edit = self._load_existing_cert(existing_cert)
+                    file_path = existing_cert.file_path
+                else:
+                    # 其他用户上传过的文件：引用同一份文件，证书由当前用户另行保存
+                    file_path = blob_store.path_for(key)
+                    extracted_info, extraction_job_id = self._register_upload(
+                        file_path, file_md5, challenge['file_size'], None, original_filename
+                    )
+                    if extracted_info:
+                        flash('⚡ 秒传成功！已加载相同文件的识别结果，请核对信息后保存', 'success')
+                    elif extraction_job_id:
+                        flash('⚡ 秒传成功！AI正在后台识别证书信息', 'success')
+                    else:
+                        flash('⚡ 秒传成功！请点击"AI识别"按钮提取证书信息', 'success')
+            
+            elif action == 'chunked':
+                # 分片上传完成：文件记录已在完成上传时创建
+                from flask_app.models import UploadSession
+                from flask_app.services.extraction_job_service import ExtractionJobService
+                
+                upload = UploadSession.query.filter_by(
+                    upload_id=request.form.get('upload_id', ''),
+                    user_id=current_user.user_id,
+                    status=UploadSession.STATUS_DONE
+                ).first()
+                file_record = File.query.get(upload.file_id) if upload and upload.file_id else None
+                if not file_record:
+                    flash('❌ 上传未完成或已过期，请重新上传', 'danger')
+                    return redirect(request.url)
+                
+                file_path = file_record.file_path
+                file_md5 = file_record.file_md5
+                existing_cert = Certificate.query.filter_by(
+                    file_md5=file_md5,
+                    submitter_id=current_user.user_id
+                ).first()
+                if existing_cert:
+                    is_quick_upload = True
+                    flash('⚡ 检测到相同证书，已加载原有数据', 'info')
+                    extracted_info, can_edit = self._load_existing_cert(existing_cert)
+                    file_path = existing_cert.file_path
+                else:
+                    # 刷新页面时沿用已创建的识别任务
+                    job = ExtractionJobService.find_active_job(current_user.user_id, file_path)
+                    if job and job.status != job.STATUS_DONE:
+                        extraction_job_id = job.job_id
+                    else:
+                        extracted_info, extraction_job_id = self._prepare_extraction(file_path, file_md5, None)
+                    if extracted_info:
+                        flash('✅ 文件上传成功，已加载相同文件的识别结果，请核对信息后保存', 'success')
+                    elif extraction_job_id:
+                        flash('✅ 文件上传成功，AI正在后台识别证书信息', 'success')
+                    else:
+                        flash('✅ 文件上传成功，请点击"AI识别"按钮提取证书信息', 'success')
+            
             elif action == 'extract':
                 # AI识别
                 file_path = request.form.get('file_path')
-                file_md5 = request.form.get('file_md5')
                 
                 if file_path and os.path.exists(file_path):
+                    # 页面上的MD5由服务器端确定，不沿用表单提交的值
+                    file_md5 = resolve_file_md5(file_path)
                     try:
                         from flask_app.api.certificate_extractor import CertificateExtractor
                         import logging
@@ -164,30 +202,19 @@ class CertificateUploadView(BaseView):
 
                         logger.info(f"开始AI识别文件: {file_path}")
                         extractor = CertificateExtractor()
-                        logger.info(f"文件类型: image")
+                        file_type = get_file_type(file_path)
+                        logger.info(f"文件类型: {file_type}")
 
-                        # 只支持图片识别
-                        extracted_info = extractor.extract_certificate_info(file_path, 'image')
+                        extracted_info = extractor.extract_certificate_info(file_path, file_type)
                         logger.info(f"AI识别结果: {extracted_info}")
 
                         if not extracted_info or all(v == '' for v in extracted_info.values()):
                             flash('⚠️ AI识别未返回有效数据，请检查API配置或稍后重试', 'warning')
                         else:
-                            # 将列表类型的字段转换为字符串（逗号分隔）
-                            for key, value in extracted_info.items():
-                                if isinstance(value, list):
-                                    extracted_info[key] = ', '.join(str(item) for item in value)
-
                             flash('✅ AI识别完成，请核对信息后保存', 'success')
 
-                        # 预填充用户信息
-                        if current_user.role == 'student':
-                            extracted_info['student_id'] = current_user.account_id
-                            if not extracted_info.get('student_name'):
-                                extracted_info['student_name'] = current_user.name
-                        elif current_user.role == 'teacher':
-                            extracted_info['advisor'] = current_user.name
-                            extracted_info['advisor_id'] = current_user.account_id
+                        # 整理识别结果并预填充用户信息
+                        extracted_info = prepare_extracted_info(extracted_info)
 
                     except ValueError as ve:
                         flash(f'⚠️ AI配置错误：{str(ve)}，请检查API密钥配置', 'warning')
@@ -204,7 +231,7 @@ class CertificateUploadView(BaseView):
             elif action == 'save':
                 # 保存证书
                 file_path = request.form.get('file_path')
-                file_md5 = request.form.get('file_md5')
+                file_md5 = resolve_file_md5(file_path) if file_path else None
                 status = request.form.get('status', 'draft')
                 
                 # 验证数据
@@ -325,6 +352,7 @@ class CertificateUploadView(BaseView):
                           file_md5=file_md5,
                           is_quick_upload=is_quick_upload,
                           existing_cert=existing_cert,
+                          extraction_job_id=extraction_job_id,
                           can_edit=can_edit,
                           colleges=colleges,
                           categories=categories,
@@ -333,5 +361,103 @@ class CertificateUploadView(BaseView):
                           deadline=SystemConfig.get_deadline_display() if current_user.role not in ['admin', 'secretary'] else None,
                           is_overdue=not SystemConfig.is_before_deadline() if current_user.role not in ['admin', 'secretary'] else False)
     
+    @staticmethod
+    def _load_existing_cert(existing_cert):
+        """
+        加载当前用户已有的相同证书
+
+        Returns:
+            tuple: (证书信息, 是否可编辑)
+        """
+        # 根据角色和证书状态判断是否可编辑
+        if current_user.role in ['admin', 'secretary']:
+            can_edit = True  # 管理员和教学秘书可以编辑任何状态
+        elif current_user.role == 'teacher':
+            can_edit = existing_cert.status in ['draft', 'pending_teacher']
+        else:  # student
+            can_edit = existing_cert.status == 'draft'
+        
+        # 确保 award_date 是字符串格式
+        award_date_str = ''
+        if existing_cert.award_date:
+            if isinstance(existing_cert.award_date, datetime):
+                award_date_str = existing_cert.award_date.strftime('%Y-%m-%d')
+            else:
+                award_date_str = str(existing_cert.award_date)
+        
+        extracted_info = {
+            'student_id': existing_cert.student_id,
+            'student_name': existing_cert.student_name,
+            'student_department': existing_cert.department,
+            'competition_name': existing_cert.competition_name,
+            'award_category': existing_cert.award_category,
+            'award_level': existing_cert.award_level,
+            'competition_type': existing_cert.competition_type,
+            'organizer': existing_cert.organizer,
+            'award_date': award_date_str,
+            'advisor': existing_cert.advisor,
+            'advisor_id': existing_cert.advisor_id or ''
+        }
+        return extracted_info, can_edit
+    
+    def _register_upload(self, file_path, file_md5, file_size, file_content, original_filename=None):
+        """
+        为当前用户保存文件记录，并取得识别结果
+
+        Returns:
+            tuple: (识别结果，没有时为None, 识别任务ID，没有时为None)
+        """
+        create_file_record(
+            user_id=current_user.user_id,
+            filename=os.path.basename(original_filename or file_path),
+            file_path=file_path,
+            file_type=get_file_type(file_path),
+            file_size=file_size,
+            file_md5=file_md5
+        )
+        return self._prepare_extraction(file_path, file_md5, file_content)
+    
+    def _prepare_extraction(self, file_path, file_md5, file_content):
+        """
+        相同文件（任何用户）在识别缓存中有当前模型与提示词的结果时直接使用，否则创建识别任务
+
+        Returns:
+            tuple: (识别结果，没有时为None, 识别任务ID，没有时为None)
+        """
+        from flask_app.api.certificate_extractor import CertificateExtractor
+        
+        result = CertificateExtractor().find_cached(file_md5)
+        if result:
+            return prepare_extracted_info(result), None
+        return None, self._enqueue_extraction(file_path, file_md5, get_file_type(file_path), file_content)
+    
+    @staticmethod
+    def _enqueue_extraction(file_path, file_md5, file_type, file_content):
+        """
+        上传后立即创建识别任务，文件内容直接交给工作线程
+
+        Returns:
+            str: 任务ID；未开启上传后识别或用户未完成的任务已达上限时返回None
+        """
+        from flask_app.services.extraction_job_service import ExtractionJobService
+
+        if not current_app.config.get('EXTRACTION_ON_UPLOAD', True):
+            return None
+        if not ExtractionJobService.can_enqueue(current_user.user_id):
+            return None
+        try:
+            job = ExtractionJobService.enqueue(
+                user_id=current_user.user_id,
+                file_path=file_path,
+                file_md5=file_md5,
+                file_type=file_type,
+                file_data=file_content
+            )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"创建识别任务失败: {e}")
+            return None
+        return job.job_id
+    
     def is_accessible(self):
         return current_user.is_authenticated
@@ -5,15 +5,19 @@ Flask-Admin 自定义视图
 保留此文件是为了向后兼容，所有视图类现在从对应模块导入。
 """
 from flask_app.admin.certificate_upload_view import CertificateUploadView
+from flask_app.admin.bulk_upload_view import BulkUploadView
 from flask_app.admin.my_certificates_view import MyCertificatesView
 from flask_app.admin.student_certificates_view import StudentCertificatesView
 from flask_app.admin.user_import_view import UserImportView
 from flask_app.admin.statistics_view import StatisticsView
+from flask_app.admin.ai_usage_view import AIUsageView
 
 __all__ = [
     'CertificateUploadView',
+    'BulkUploadView',
     'MyCertificatesView',
     'StudentCertificatesView',
     'UserImportView',
-    'StatisticsView'
+    'StatisticsView',
+    'AIUsageView'
 ]
@@ -3,9 +3,10 @@ Flask-Admin ModelView 视图
 """
 from flask import redirect, url_for, request, flash
 from flask_admin.contrib.sqla import ModelView
+from flask_admin.actions import action
 from flask_admin.form import Select2Widget
 from flask_login import current_user
-from wtforms import SelectField, PasswordField
+from wtforms import SelectField, PasswordField, FloatField
 from wtforms.validators import Optional
 from datetime import datetime
 from flask_app.models import Dictionary
@@ -383,10 +384,19 @@ class SystemConfigAdminView(SecureModelView):
         return super().on_model_change(form, model, is_created)
 
 
+# 密钥思考模式选项
+THINKING_MODE_CHOICES = [
+    ('', '系统默认'),
+    ('auto', '自动（缺字段时开启思考）'),
+    ('disabled', '关闭思考'),
+    ('enabled', '开启思考'),
+]
+
+
 class APIKeyAdminView(SecureModelView):
     """API密钥管理视图"""
     
-    column_list = ['model_name', 'api_key', 'is_active',
+    column_list = ['model_name', 'api_key', 'is_active', 'thinking_mode',
                    'usage_count', 'max_usage', 'last_used_at', 'created_at']
     column_searchable_list = ['model_name']
     column_filters = ['is_active', 'model_name']
@@ -401,6 +411,12 @@ class APIKeyAdminView(SecureModelView):
         'is_active': '是否可用',
         'usage_count': '调用次数',
         'max_usage': '最大调用次数',
+        'rate_limit_rps': '每秒调用上限',
+        'max_concurrency': '最大并发数',
+        'thinking_mode': '思考模式',
+        'thinking_model_name': '思考模式模型',
+        'max_tokens': '最大输出token数',
+        'request_timeout': '请求超时（秒）',
         'created_at': '创建时间',
         'last_used_at': '最后使用时间',
         'created_by': '创建者'
@@ -409,16 +425,83 @@ class APIKeyAdminView(SecureModelView):
     # 隐藏敏感信息
     column_formatters = {
         'api_key': lambda v, c, m, p: m.masked_key,
-        'is_active': lambda v, c, m, p: '✅ 可用' if m.is_active else '❌ 不可用'
+        'is_active': lambda v, c, m, p: '✅ 可用' if m.is_active else '❌ 不可用',
+        'thinking_mode': lambda v, c, m, p: dict(THINKING_MODE_CHOICES).get(m.thinking_mode or '', m.thinking_mode)
     }
 
     form_excluded_columns = ['created_at', 'updated_at', 'created_by', 'last_used_at']
 
+    form_choices = {
+        'thinking_mode': THINKING_MODE_CHOICES
+    }
+
+    # Flask-Admin 不会为 SQLAlchemy 2 的 Float 列生成表单字段
+    form_overrides = {
+        'rate_limit_rps': FloatField,
+        'request_timeout': FloatField
+    }
+
     form_widget_args = {
         'prompt': {
             'rows': 8
         }
     }
+    
+    form_args = {
+        'rate_limit_rps': {
+            'description': '留空使用系统默认值（AI_KEY_DEFAULT_RPS），0 表示不限制'
+        },
+        'max_concurrency': {
+            'description': '留空使用系统默认值（AI_KEY_DEFAULT_MAX_CONCURRENCY），0 表示不限制'
+        },
+        'model_name': {
+            'description': '识别使用的模型，如 glm-4.6v'
+        },
+        'thinking_mode': {
+            'description': '自动：先关闭思考快速识别，关键字段缺失时再开启思考；开启思考更准确但更慢、消耗更多token'
+        },
+        'thinking_model_name': {
+            'description': '开启思考时使用的模型，留空与模型名称相同'
+        },
+        'max_tokens': {
+            'description': '留空使用系统默认值（AI_MAX_TOKENS）'
+        },
+        'request_timeout': {
+            'description': '留空使用系统默认值（AI_REQUEST_TIMEOUT）'
+        }
+    }
+    
+    def on_model_change(self, form, model, is_created):
+        """更换密钥或停用时关闭旧密钥的客户端"""
+        from flask_app.api.ai_client_pool import client_pool
+        if is_created:
+            model.created_by = current_user.account_id
+        if not is_created and form.api_key.object_data != model.api_key:
+            client_pool.discard(form.api_key.object_data)
+        if not model.is_active:
+            client_pool.discard(model.api_key)
+        # 留空表示使用系统默认值
+        model.thinking_mode = model.thinking_mode or None
+        model.thinking_model_name = (model.thinking_model_name or '').strip() or None
+        return super().on_model_change(form, model, is_created)
+    
+    def after_model_change(self, form, model, is_created):
+        """密钥变更后重新加载密钥池并重置熔断状态"""
+        from flask_app.services.api_key_pool import api_key_pool
+        from flask_app.services.retry_policy import circuit_breakers
+        circuit_breakers.reset(model.key_id)
+        api_key_pool.reload()
+    
+    def after_model_delete(self, model):
+        """删除密钥后重新加载密钥池"""
+        from flask_app.api.ai_client_pool import client_pool
+        from flask_app.services.api_key_pool import api_key_pool
+        from flask_app.services.rate_limiter import rate_limiter
+        from flask_app.services.retry_policy import circuit_breakers
+        client_pool.discard(model.api_key)
+        rate_limiter.discard(model.key_id)
+        circuit_breakers.reset(model.key_id)
+        api_key_pool.reload()
 
 
 class FileAdminView(SecureModelView):
@@ -449,3 +532,51 @@ class FileAdminView(SecureModelView):
     
     can_create = False  # 禁止手动创建
     can_edit = False  # 禁止编辑
+
+
+class ExtractionCacheAdminView(SecureModelView):
+    """AI识别缓存管理视图"""
+    
+    column_list = ['file_md5', 'model_name', 'hit_count', 'created_at', 'last_hit_at']
+    column_searchable_list = ['file_md5']
+    column_filters = ['model_name']
+    column_sortable_list = ['hit_count', 'created_at', 'last_hit_at']
+    column_default_sort = ('last_hit_at', True)
+    
+    column_labels = {
+        'cache_id': 'ID',
+        'file_md5': '文件MD5',
+        'model_name': '模型名称',
+        'prompt_hash': '提示词哈希',
+        'result': '识别结果',
+        'hit_count': '命中次数',
+        'created_at': '创建时间',
+        'last_hit_at': '最后命中时间'
+    }
+    
+    can_create = False  # 缓存由AI识别自动写入
+    can_edit = False
+    can_view_details = True
+    
+    def delete_model(self, model):
+        """删除单条缓存，同步清除内存缓存"""
+        from flask_app.services.extraction_cache_service import ExtractionCacheService
+        return ExtractionCacheService.purge([model.cache_id]) > 0
+    
+    @action('purge', '清除所选缓存', '确定要清除所选识别缓存吗？')
+    def action_purge(self, ids):
+        from flask_app.services.extraction_cache_service import ExtractionCacheService
+        count = ExtractionCacheService.purge(ids)
+        flash(f'✅ 已清除 {count} 条识别缓存', 'success')
+    
+    @action('purge_expired', '清理过期缓存', '将按有效期与容量上限清理全部缓存，确定继续吗？')
+    def action_purge_expired(self, ids):
+        from flask_app.services.extraction_cache_service import ExtractionCacheService
+        count = ExtractionCacheService.evict()
+        flash(f'✅ 已清理 {count} 条过期缓存', 'success')
+    
+    @action('purge_all', '清空全部缓存', '确定要清空全部识别缓存吗？')
+    def action_purge_all(self, ids):
+        from flask_app.services.extraction_cache_service import ExtractionCacheService
+        count = ExtractionCacheService.purge()
+        flash(f'✅ 已清空 {count} 条识别缓存', 'success')
@@ -0,0 +1,141 @@
+"""
+AI客户端连接池 - 按API密钥复用SDK客户端及其HTTP连接
+"""
+import threading
+import time
+
+# SDK均依赖httpx，未安装任何SDK时连接池退化为每次新建客户端
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+from flask import current_app, has_app_context
+
+
+class AIClientPool:
+    """
+    进程级AI客户端注册表
+
+    以 (SDK类型, API密钥, 接口地址) 为键缓存客户端，同一密钥的多次识别共享
+    HTTP keep-alive 连接与 TLS 会话；空闲超时的客户端会被关闭并移除。
+    新接口（zai）与旧接口（zhipuai）共用同一套缓存与淘汰逻辑。
+    配置 AI_BASE_URL 时请求发往该地址（如本地模拟服务器 api/fake_glm_server.py）。
+    """
+
+    # 默认配置（可通过 Flask 配置 AI_CLIENT_POOL_SIZE / AI_CLIENT_IDLE_TIMEOUT 覆盖）
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_IDLE_TIMEOUT = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (sdk, api_key, base_url) -> {'client': ..., 'http_client': ..., 'last_used': float}
+        self._entries = {}
+
+    def _get_setting(self, name, default):
+        """读取 Flask 配置，无应用上下文时使用默认值"""
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _create_http_client(self):
+        """创建带连接池限制的 httpx 客户端"""
+        if not HTTPX_AVAILABLE:
+            return None
+        pool_size = self._get_setting('AI_CLIENT_POOL_SIZE', self.DEFAULT_POOL_SIZE)
+        idle_timeout = self._get_setting('AI_CLIENT_IDLE_TIMEOUT', self.DEFAULT_IDLE_TIMEOUT)
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=idle_timeout
+        )
+        return httpx.Client(limits=limits)
+
+    def get_client(self, client_class, api_key: str):
+        """
+        获取（或创建）指定SDK与密钥对应的客户端
+
+        Args:
+            client_class: SDK客户端类，ZhipuAiClient 或 ZhipuAI
+            api_key: API密钥
+
+        Returns:
+            可复用的SDK客户端实例
+        """
+        base_url = self._get_setting('AI_BASE_URL', None)
+        cache_key = (client_class.__name__, api_key, base_url)
+        now = time.monotonic()
+
+        self.evict_idle(now)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry:
+                entry['last_used'] = now
+                return entry['client']
+
+            http_client = self._create_http_client()
+            # 重试由 RetryPolicy 统一负责，避免与SDK内置重试叠加
+            kwargs = {'api_key': api_key, 'max_retries': self._get_setting('AI_SDK_MAX_RETRIES', 0)}
+            if base_url:
+                kwargs['base_url'] = base_url
+            if http_client is not None:
+                kwargs['http_client'] = http_client
+
+            client = client_class(**kwargs)
+            self._entries[cache_key] = {
+                'client': client,
+                'http_client': http_client,
+                'last_used': now
+            }
+            return client
+
+    def evict_idle(self, now=None):
+        """关闭并移除空闲超时的客户端"""
+        if now is None:
+            now = time.monotonic()
+        idle_timeout = self._get_setting('AI_CLIENT_IDLE_TIMEOUT', self.DEFAULT_IDLE_TIMEOUT)
+
+        with self._lock:
+            expired = [k for k, v in self._entries.items() if now - v['last_used'] > idle_timeout]
+            entries = [self._entries.pop(k) for k in expired]
+
+        for entry in entries:
+            self._close_entry(entry)
+
+    def discard(self, api_key: str):
+        """移除某个密钥的所有客户端（如密钥被禁用或删除）"""
+        with self._lock:
+            keys = [k for k in self._entries if k[1] == api_key]
+            entries = [self._entries.pop(k) for k in keys]
+
+        for entry in entries:
+            self._close_entry(entry)
+
+    def close_all(self):
+        """关闭所有客户端"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+
+        for entry in entries:
+            self._close_entry(entry)
+
+    @staticmethod
+    def _close_entry(entry):
+        http_client = entry.get('http_client')
+        if http_client is not None:
+            try:
+                http_client.close()
+            except Exception:
+                pass
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# 进程级单例
+client_pool = AIClientPool()
@@ -17,12 +17,44 @@ except ImportError:
     ZHIPUAI_AVAILABLE = False
     ZhipuAI = None
 
-import base64
-import json
-import re
+import hashlib
 import os
+import threading
+import time
 from typing import Dict, Any
-from datetime import datetime
+from flask import current_app
+
+from flask_app.models import AICallLog, ExtractionJob
+from flask_app.api.ai_client_pool import client_pool
+from flask_app.api.response_parser import get_usage, parse_certificate_response
+from flask_app.api.text_layer_extractor import TextLayerExtractor
+from flask_app.utils.file_utils import encode_file_base64, resolve_file_md5
+from flask_app.utils.image_utils import preprocess_image
+from flask_app.utils.pdf_utils import is_pdf_rendering_available, render_pdf
+from flask_app.services.ai_call_log import ai_call_recorder
+from flask_app.services.api_key_pool import api_key_pool
+from flask_app.services.rate_limiter import rate_limiter
+from flask_app.services.single_flight import extraction_flights, file_lock
+from flask_app.services.retry_policy import (
+    RetryPolicy, BREAKER_ERRORS, ERROR_UNKNOWN, circuit_breakers, classify_error, is_sdk_incompatible
+)
+
+# 当前线程正在进行的接口调用信息（由 _call_with_retry 创建，调用接口处填写模型、用量等）
+_call_info = threading.local()
+
+
+def _payload_size(value) -> int:
+    """请求内容中字符串的总字节数（base64 附件与提示词）"""
+    if isinstance(value, str):
+        # base64 附件等 ASCII 字符串的长度即字节数，不编码复制数MB的 data URI
+        if value.isascii():
+            return len(value)
+        return len(value.encode('utf-8'))
+    if isinstance(value, dict):
+        return sum(_payload_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_size(item) for item in value)
+    return 0
 
 
 class CertificateExtractor:
@@ -41,40 +73,31 @@ class CertificateExtractor:
         "award_date": "",
         "advisor": ""
     }
-    
-    def __init__(self):
-        self._current_key_index = 0
-    
-    def _get_available_api_key(self):
-        """获取可用的API密钥，如果没有可用密钥则抛出异常"""
-        from flask_app.models import APIKey
-
-        available_keys = APIKey.query.filter_by(is_active=True).order_by(APIKey.created_at.desc()).all()
-
-        if not available_keys:
-            raise Exception("没有可用的API密钥，请联系管理员配置AI识别服务的API密钥")
 
-        key = available_keys[self._current_key_index % len(available_keys)]
-        self._current_key_index += 1
+    # 新接口（zai-sdk）默认使用的模型
+    ZAI_MODEL = "glm-4.6v"
 
-        if key.max_usage and key.usage_count >= key.max_usage:
-            key.is_active = False
-            from flask_app import db
-            db.session.commit()
-            return self._get_available_api_key()
+    # 思考模式：auto 先关闭思考识别，必填字段缺失时再开启思考
+    THINKING_MODES = ('auto', 'disabled', 'enabled')
 
-        return key
+    def __init__(self, model: str = None, thinking: str = None, max_tokens: int = None, timeout: float = None):
+        """
+        Args:
+            model: 本次识别使用的模型
+            thinking: 思考模式，auto / disabled / enabled
+            max_tokens: 单次回复最大token数
+            timeout: 单次请求超时（秒）
+            以上参数为空时使用密钥的设置，密钥未设置时使用系统默认值
+        """
+        if thinking and thinking not in self.THINKING_MODES:
+            raise ValueError(f"不支持的思考模式: {thinking}")
+        self.overrides = {'model': model, 'thinking': thinking, 'max_tokens': max_tokens, 'timeout': timeout}
+        self._progress = None
+        self._file_data = None
     
-    def _increment_usage_count(self, key_id):
-        """增加API密钥的使用次数"""
-        from flask_app.models import APIKey
-        from flask_app import db
-
-        key = APIKey.query.get(key_id)
-        if key:
-            key.usage_count += 1
-            key.last_used_at = datetime.now()
-            db.session.commit()
+    def _get_available_api_key(self, exclude=None):
+        """从密钥池获取负载最低的可用密钥，使用完毕后需调用 api_key_pool.release()"""
+        return api_key_pool.acquire(exclude)
     
     def _get_prompt(self):
         """从系统配置获取提示词"""
@@ -97,79 +120,185 @@ organizer（主办单位）、
 award_date（获奖日期，格式为YYYY-MM-DD，如果只有年月则取当月一号，如2024年12月则返回2024-12-01）、
 advisor（指导教师）。
 如果某个字段无法提取，请返回空字符串。只返回JSON，不要返回其他内容。"""
+
+    def _resolve_prompt(self, api_key_obj) -> str:
+        """获取密钥对应的提示词，未设置时使用系统配置"""
+        return api_key_obj.prompt if api_key_obj.prompt else self._get_prompt()
+
+    def _resolve_settings(self, api_key_obj) -> Dict[str, Any]:
+        """
+        获取本次调用的模型与参数：本次识别的设置 > 密钥的设置 > 系统默认值
+        
+        Returns:
+            dict: model, thinking_model, thinking, max_tokens, timeout
+        """
+        config = current_app.config
+        overrides = self.overrides
+        if ZAI_AVAILABLE:
+            model = overrides['model'] or api_key_obj.model_name or self.ZAI_MODEL
+        else:
+            model = overrides['model'] or api_key_obj.model_name or 'glm-4v'
+        thinking = overrides['thinking'] or getattr(api_key_obj, 'thinking_mode', None) \
+            or config.get('AI_THINKING_MODE', 'auto')
+        if thinking not in self.THINKING_MODES:
+            thinking = 'auto'
+        return {
+            'model': model,
+            'thinking_model': overrides['model'] or getattr(api_key_obj, 'thinking_model_name', None) or model,
+            'thinking': thinking,
+            'max_tokens': overrides['max_tokens'] or getattr(api_key_obj, 'max_tokens', None)
+                or config.get('AI_MAX_TOKENS'),
+            'timeout': overrides['timeout'] or getattr(api_key_obj, 'request_timeout', None)
+                or config.get('AI_REQUEST_TIMEOUT'),
+        }
+
+    def _resolve_model(self, api_key_obj) -> str:
+        """
+        获取识别缓存使用的模型标识
+        
+        开启思考时为模型名称本身（与改造前的缓存兼容），其他模式附加模式后缀。
+        """
+        settings = self._resolve_settings(api_key_obj)
+        if settings['thinking'] == 'enabled':
+            name = settings['thinking_model']
+        elif settings['thinking'] == 'disabled':
+            name = f"{settings['model']}:fast"
+        elif settings['thinking_model'] != settings['model']:
+            name = f"{settings['model']}:auto:{settings['thinking_model']}"
+        else:
+            name = f"{settings['model']}:auto"
+        return name[:50]
     
-    def encode_file_base64(self, file_path: str) -> str:
-        """将文件编码为base64"""
-        with open(file_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
-    
-    def extract_from_image(self, image_path: str) -> Dict[str, Any]:
+    def encode_file_base64(self, file_path: str, mime_type: str = None) -> str:
+        """将文件分块编码为base64，指定 mime_type 时直接生成 data URI"""
+        return encode_file_base64(file_path, mime_type)
+
+    def extract_from_image(self, image_path: str, api_key_obj=None, file_md5: str = None,
+                           thinking: bool = None) -> Dict[str, Any]:
         """
         从图片提取证书信息（使用新的zai-sdk）
         
+        图片先经过方向校正、缩放和重新压缩（见 utils.image_utils），减小请求体积。
+        
         Args:
             image_path: 图片文件路径
+            api_key_obj: 使用的API密钥，默认自动选择并按重试策略与思考模式调用（传入时由调用方负责限流与重试）
+            file_md5: 图片MD5，用于查找已生成的派生图
+            thinking: 是否开启思考，默认按密钥的思考模式（auto 时不开启）
         """
-        api_key_obj = self._get_available_api_key()
-        prompt = api_key_obj.prompt if api_key_obj.prompt else self._get_prompt()
-        
+        if api_key_obj is None:
+            return self._extract_tiered(
+                lambda key, use_thinking: self.extract_from_image(image_path, key, file_md5, use_thinking)
+            )
+        image_path, mime_type = preprocess_image(image_path, file_md5, self._file_data)
+        return self._extract_from_prepared_image(image_path, mime_type, api_key_obj, thinking)
+    
+    def _extract_from_prepared_image(self, image_path: str, mime_type: str, api_key_obj,
+                                     thinking: bool = None) -> Dict[str, Any]:
+        """识别已预处理的图片（新接口，SDK不兼容时回退到旧接口）"""
         # 使用新的zai-sdk
         if ZAI_AVAILABLE:
             try:
-                client = ZhipuAiClient(api_key=api_key_obj.api_key)
-                
                 # 使用base64编码
-                img_base = self.encode_file_base64(image_path)
-                image_content = img_base
-                
-                response = client.chat.completions.create(
-                    model="glm-4.6v",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": image_content
-                                    }
-                                },
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                }
-                            ]
-                        }
-                    ],
-                    thinking={
-                        "type": "enabled"
+                image_content = self.encode_file_base64(image_path)
+                return self._create_completion(api_key_obj, {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_content
                     }
-                )
-                
-                self._increment_usage_count(api_key_obj.key_id)
-                
-                return self._parse_response(response)
+                }, thinking)
             except Exception as e:
+                # 只有SDK不兼容时才回退到旧接口，429/5xx等错误交给重试策略处理
+                if not is_sdk_incompatible(e):
+                    raise
                 print(f"使用zai-sdk提取图片失败: {e}，尝试使用旧接口")
-                # 如果新接口失败，回退到旧接口
-                return self._extract_from_image_legacy(image_path)
+                return self._extract_from_image_legacy(image_path, api_key_obj, mime_type)
         else:
             # 如果没有安装zai-sdk，使用旧接口
             print("zai-sdk未安装，使用旧接口提取图片")
-            return self._extract_from_image_legacy(image_path)
+            return self._extract_from_image_legacy(image_path, api_key_obj, mime_type)
     
-    def _extract_from_image_legacy(self, image_path: str) -> Dict[str, Any]:
+    def _create_completion(self, api_key_obj, attachment: Dict[str, Any], thinking: bool = None) -> Dict[str, Any]:
+        """
+        调用新接口（zai-sdk）识别附件
+        
+        Args:
+            api_key_obj: 使用的API密钥
+            attachment: 图片或文件消息内容
+            thinking: 是否开启思考，默认按密钥的思考模式（auto 时不开启）
+        """
+        settings = self._resolve_settings(api_key_obj)
+        if thinking is None:
+            thinking = settings['thinking'] == 'enabled'
+        
+        model = settings['thinking_model'] if thinking else settings['model']
+        prompt = self._resolve_prompt(api_key_obj)
+        self._note_call(model=model, thinking=thinking, payload=(attachment, prompt))
+        self._report_stage(ExtractionJob.STAGE_CALLING)
+        
+        client = client_pool.get_client(ZhipuAiClient, api_key_obj.api_key)
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        attachment,
+                        {
+                            "type": "text",
+                            "text": prompt
+                        }
+                    ]
+                }
+            ],
+            thinking={
+                "type": "enabled" if thinking else "disabled"
+            },
+            **self._request_kwargs(settings)
+        )
+        
+        return self._parse_response(response)
+    
+    @staticmethod
+    def _note_call(payload=None, **info):
+        """
+        填写当前接口调用的信息，由 _call_with_retry 在调用结束后写入调用记录
+        
+        Args:
+            payload: 请求中的附件与提示词，用于统计请求字节数
+            info: model / thinking / fallback / usage
+        """
+        current = getattr(_call_info, 'current', None)
+        if current is None:
+            return
+        if payload is not None:
+            current['payload_bytes'] = _payload_size(payload)
+        current.update(info)
+    
+    @staticmethod
+    def _request_kwargs(settings: Dict[str, Any]) -> Dict[str, Any]:
+        """请求的可选参数（最大token数、超时）"""
+        kwargs = {}
+        if settings['max_tokens']:
+            kwargs['max_tokens'] = int(settings['max_tokens'])
+        if settings['timeout']:
+            kwargs['timeout'] = float(settings['timeout'])
+        return kwargs
+    
+    def _extract_from_image_legacy(self, image_path: str, api_key_obj,
+                                   mime_type: str = "image/jpeg") -> Dict[str, Any]:
         """从图片提取证书信息（旧接口，作为备用）"""
         if not ZHIPUAI_AVAILABLE:
             raise ImportError("未安装zhipuai库，无法提取图片信息")
         
-        img_base = self.encode_file_base64(image_path)
+        image_content = self.encode_file_base64(image_path, mime_type)
         
-        api_key_obj = self._get_available_api_key()
-        client = ZhipuAI(api_key=api_key_obj.api_key)
+        client = client_pool.get_client(ZhipuAI, api_key_obj.api_key)
         
         prompt = api_key_obj.prompt if api_key_obj.prompt else self._get_prompt()
-        model = api_key_obj.model_name or 'glm-4v'
+        model = self.overrides['model'] or api_key_obj.model_name or 'glm-4v'
+        self._note_call(model=model, thinking=False, fallback=True, payload=(image_content, prompt))
+        self._report_stage(ExtractionJob.STAGE_CALLING)
         
         response = client.chat.completions.create(
             model=model,
@@ -180,7 +309,7 @@ advisor（指导教师）。
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{img_base}"
+                                "url": image_content
                             }
                         },
                         {
@@ -189,80 +318,74 @@ advisor（指导教师）。
                         }
                     ]
                 }
-            ]
+            ],
+            **self._request_kwargs(self._resolve_settings(api_key_obj))
         )
         
-        self._increment_usage_count(api_key_obj.key_id)
-        
         return self._parse_response(response)
     
-    def extract_from_pdf(self, pdf_path: str) -> Dict[str, Any]:
+    def extract_from_pdf(self, pdf_path: str, api_key_obj=None, file_md5: str = None,
+                         thinking: bool = None) -> Dict[str, Any]:
         """
-        从PDF文件提取证书信息（使用新的zai库接口）
+        从PDF文件提取证书信息
+        
+        已安装 PyMuPDF 时先在本地将页面渲染为图片（见 utils.pdf_utils），按图片识别；
+        否则将整个PDF发送给新接口（zai库）。
         
         Args:
             pdf_path: PDF文件路径
+            api_key_obj: 使用的API密钥，默认自动选择并按重试策略与思考模式调用（传入时由调用方负责限流与重试）
+            file_md5: PDF文件MD5，用于查找已渲染的图片
+            thinking: 是否开启思考，默认按密钥的思考模式（auto 时不开启）
         """
-        api_key_obj = self._get_available_api_key()
-        prompt = api_key_obj.prompt if api_key_obj.prompt else self._get_prompt()
+        if api_key_obj is None:
+            return self._extract_tiered(
+                lambda key, use_thinking: self.extract_from_pdf(pdf_path, key, file_md5, use_thinking)
+            )
+        
+        if is_pdf_rendering_available():
+            try:
+                image_path, mime_type = render_pdf(pdf_path, file_md5, self._file_data)
+            except Exception as e:
+                print(f"PDF渲染失败: {e}，直接发送PDF文件")
+            else:
+                return self._extract_from_prepared_image(image_path, mime_type, api_key_obj, thinking)
         
         # 使用新的zai库接口
         if ZAI_AVAILABLE:
             try:
-                client = ZhipuAiClient(api_key=api_key_obj.api_key)
-                
                 # 使用base64编码
-                pdf_base = self.encode_file_base64(pdf_path)
-                pdf_content = f"data:application/pdf;base64,{pdf_base}"
-                
-                response = client.chat.completions.create(
-                    model="glm-4.6v",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "file_url",
-                                    "file_url": {
-                                        "url": pdf_content
-                                    }
-                                },
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                }
-                            ]
-                        }
-                    ],
-                    thinking={
-                        "type": "enabled"
+                pdf_content = self.encode_file_base64(pdf_path, "application/pdf")
+                return self._create_completion(api_key_obj, {
+                    "type": "file_url",
+                    "file_url": {
+                        "url": pdf_content
                     }
-                )
-                
-                self._increment_usage_count(api_key_obj.key_id)
-                
-                return self._parse_response(response)
+                }, thinking)
             except Exception as e:
+                # 只有SDK不兼容时才回退到旧接口，429/5xx等错误交给重试策略处理
+                if not is_sdk_incompatible(e):
+                    raise
                 print(f"使用zai库提取PDF失败: {e}，尝试使用旧接口")
-                # 如果新接口失败，回退到旧接口
-                return self._extract_from_pdf_legacy(pdf_path)
+                return self._extract_from_pdf_legacy(pdf_path, api_key_obj)
         else:
             # 如果没有安装zai库，使用旧接口
             print("zai库未安装，使用旧接口提取PDF")
-            return self._extract_from_pdf_legacy(pdf_path)
+            return self._extract_from_pdf_legacy(pdf_path, api_key_obj)
     
-    def _extract_from_pdf_legacy(self, pdf_path: str) -> Dict[str, Any]:
+    def _extract_from_pdf_legacy(self, pdf_path: str, api_key_obj) -> Dict[str, Any]:
         """从PDF文件提取证书信息（旧接口，作为备用）"""
         if not ZHIPUAI_AVAILABLE:
             raise ImportError("未安装zhipuai库，无法提取PDF信息")
         
-        pdf_base = self.encode_file_base64(pdf_path)
+        pdf_content = self.encode_file_base64(pdf_path, "application/pdf")
         
-        api_key_obj = self._get_available_api_key()
-        client = ZhipuAI(api_key=api_key_obj.api_key)
+        client = client_pool.get_client(ZhipuAI, api_key_obj.api_key)
         
         prompt = api_key_obj.prompt if api_key_obj.prompt else self._get_prompt()
-        model = api_key_obj.model_name or 'glm-4v'
+        model = self.overrides['model'] or api_key_obj.model_name or 'glm-4v'
+        self._note_call(model=model, thinking=False, fallback=True, payload=(pdf_content, prompt))
+        self._report_stage(ExtractionJob.STAGE_CALLING)
         
         response = client.chat.completions.create(
             model=model,
@@ -273,7 +396,7 @@ advisor（指导教师）。
                         {
                             "type": "file",
                             "file": {
-                                "file_data": f"data:application/pdf;base64,{pdf_base}"
+                                "file_data": pdf_content
                             }
                         },
                         {
@@ -282,61 +405,267 @@ advisor（指导教师）。
                         }
                     ]
                 }
-            ]
+            ],
+            **self._request_kwargs(self._resolve_settings(api_key_obj))
         )
         
-        self._increment_usage_count(api_key_obj.key_id)
-        
         return self._parse_response(response)
     
-    def extract_certificate_info(self, file_path: str, file_type: str = "image") -> Dict[str, Any]:
+    def find_cached(self, file_md5: str) -> Dict[str, Any]:
+        """
+        按当前密钥对应的模型与提示词查询识别缓存，不调用API
+
+        Returns:
+            dict: 命中时返回识别结果，未命中或没有可用密钥时返回None
+        """
+        from flask_app.services.extraction_cache_service import ExtractionCacheService
+
+        if not file_md5:
+            return None
+        try:
+            api_key_obj = self._get_available_api_key()
+        except Exception:
+            return None
+        try:
+            return ExtractionCacheService.get(
+                file_md5, self._resolve_model(api_key_obj), self._resolve_prompt(api_key_obj)
+            )
+        finally:
+            api_key_pool.release(api_key_obj, used=False)
+
+    def extract_certificate_info(self, file_path: str, file_type: str = "image",
+                                 progress=None, file_data: bytes = None,
+                                 raise_errors: bool = False) -> Dict[str, Any]:
         """
         提取证书信息（统一入口）
         
+        PDF 先读取文本层按规则提取，必填字段齐全时直接返回；
+        否则按 (文件MD5, 模型, 提示词) 查询识别缓存，命中则不再调用API；
+        相同的并发请求合并为一次调用，共享识别结果。
+        文件MD5由服务器端确定（见 resolve_file_md5），不接受调用方传入。
+        
         Args:
             file_path: 文件路径
             file_type: 文件类型，"image" 或 "pdf"
+            progress: 识别阶段回调，依次传入 encoding / calling / parsed（ExtractionJob.STAGE_*）
+            file_data: 已在内存中的文件内容（如刚上传的文件），提供时预处理不再读取磁盘
+            raise_errors: 识别出错时抛出异常（后台识别任务据此标记失败），默认返回空结果
         
         Returns:
             提取的证书信息字典
         """
+        from flask_app.services.extraction_cache_service import ExtractionCacheService
+
+        self._progress = progress
+        self._file_data = file_data
         try:
+            self._report_stage(ExtractionJob.STAGE_ENCODING)
+            file_md5 = resolve_file_md5(file_path)
+            if file_md5 is None and file_data is not None:
+                file_md5 = hashlib.md5(file_data).hexdigest()
+
+            text_result = None
             if file_type == "pdf":
-                return self.extract_from_pdf(file_path)
-            else:
-                return self.extract_from_image(file_path)
+                text_result = self._extract_from_text_layer(file_path)
+                if text_result is not None and not TextLayerExtractor().missing_required(text_result):
+                    self._report_stage(ExtractionJob.STAGE_PARSED)
+                    return text_result
+
+            api_key_obj = self._get_available_api_key()
+            try:
+                model_name = self._resolve_model(api_key_obj)
+                prompt = self._resolve_prompt(api_key_obj)
+                cached = ExtractionCacheService.get(file_md5, model_name, prompt)
+            except Exception:
+                api_key_pool.release(api_key_obj, used=False)
+                raise
+            if cached is not None:
+                api_key_pool.release(api_key_obj, used=False)
+                self._report_stage(ExtractionJob.STAGE_PARSED)
+                return cached
+
+            used_keys = []
+
+            def extract(key, thinking):
+                used_keys.append(key)
+                if file_type == "pdf":
+                    return self.extract_from_pdf(file_path, key, file_md5, thinking)
+                return self.extract_from_image(file_path, key, file_md5, thinking)
+
+            # 密钥交给 _extract_tiered 后由其释放，其余情况在最后释放
+            key_handed_off = False
+
+            def extract_once():
+                nonlocal key_handed_off
+                # 其他进程可能正在识别同一文件，加锁后再查一次缓存
+                with file_lock(flight_key, timeout=flight_timeout):
+                    cached = ExtractionCacheService.get(file_md5, model_name, prompt)
+                    if cached is not None:
+                        return cached
+                    key_handed_off = True
+                    result = self._extract_tiered(extract, api_key_obj)
+                    # 重试时可能换用了其他密钥，按首次识别实际使用的密钥写入缓存
+                    key = used_keys[0] if used_keys else api_key_obj
+                    ExtractionCacheService.set(file_md5, self._resolve_model(key), self._resolve_prompt(key), result)
+                    return result
+
+            # 同一文件与提示词的并发请求只调用一次接口
+            flight_key = f"{file_md5}:{model_name}:{ExtractionCacheService.hash_prompt(prompt)}"
+            flight_timeout = current_app.config.get('AI_SINGLE_FLIGHT_TIMEOUT', 300)
+            try:
+                result, _ = extraction_flights.do(flight_key, extract_once, timeout=flight_timeout)
+            finally:
+                if not key_handed_off:
+                    api_key_pool.release(api_key_obj, used=False)
+            result = dict(result)
+            if text_result:
+                # 视觉模型未识别出的字段用文本层结果补全
+                for field, value in text_result.items():
+                    if value and not result.get(field):
+                        result[field] = value
+            self._report_stage(ExtractionJob.STAGE_PARSED)
+            return result
         except Exception as e:
             print(f"提取证书信息失败: {e}")
+            if raise_errors:
+                raise
             return self.EMPTY_RESULT.copy()
+        finally:
+            self._progress = None
+            self._file_data = None
+
+    def _report_stage(self, stage: str):
+        """通知识别阶段变化，回调出错不影响识别"""
+        if self._progress is None:
+            return
+        try:
+            self._progress(stage)
+        except Exception as e:
+            print(f"更新识别阶段失败: {e}")
+
+    def _extract_from_text_layer(self, pdf_path: str):
+        """
+        读取PDF文本层并按规则提取信息
+        
+        Returns:
+            dict: 提取结果；无文本层（扫描件）、未启用或读取失败时返回None
+        """
+        if not TextLayerExtractor.is_available():
+            return None
+        try:
+            text = TextLayerExtractor.extract_text(pdf_path, data=self._file_data)
+            if not TextLayerExtractor.has_text(text):
+                return None
+            extractor = TextLayerExtractor()
+            result, confidence = extractor.extract(text)
+            missing = extractor.missing_required(result)
+            if missing:
+                print(f"PDF文本层提取不完整（置信度 {confidence}），缺少字段 {missing}，调用视觉模型")
+            else:
+                print(f"PDF文本层提取成功（置信度 {confidence}），跳过视觉模型: {pdf_path}")
+            return result
+        except Exception as e:
+            print(f"读取PDF文本层失败: {e}")
+            return None
+    
+    def _extract_tiered(self, call, api_key_obj=None):
+        """
+        按思考模式识别
+        
+        auto 模式先关闭思考快速识别，AI_ESCALATION_REQUIRED_FIELDS 中有字段为空时
+        再开启思考重新识别，两次结果合并；其他模式只识别一次。每次识别都经过重试策略。
+        
+        Args:
+            call: 接收 (密钥, 是否开启思考) 并返回识别结果的函数
+            api_key_obj: 首次识别使用的密钥（已从密钥池获取），为空时自动获取
+        """
+        if api_key_obj is None:
+            api_key_obj = self._get_available_api_key()
+        try:
+            mode = self._resolve_settings(api_key_obj)['thinking']
+        except Exception:
+            api_key_pool.release(api_key_obj, used=False)
+            raise
+        
+        result = self._call_with_retry(lambda key: call(key, mode == 'enabled'), api_key_obj)
+        if mode != 'auto':
+            return result
+        
+        required = current_app.config.get('AI_ESCALATION_REQUIRED_FIELDS', [])
+        missing = [field for field in required if not result.get(field)]
+        if not missing:
+            return result
+        
+        print(f"快速识别缺少字段 {missing}，开启思考重新识别")
+        try:
+            escalated = dict(self._call_with_retry(lambda key: call(key, True)))
+        except Exception as e:
+            print(f"开启思考重新识别失败: {e}，使用快速识别结果")
+            return result
+        for field, value in result.items():
+            if value and not escalated.get(field):
+                escalated[field] = value
+        return escalated
+    
+    def _call_with_retry(self, call, api_key_obj=None):
+        """
+        按重试策略调用AI接口
+        
+        每次尝试都在密钥的限流名额内执行；429、5xx、网络错误和密钥失效
+        会计入该密钥的熔断器，退避等待后换用密钥池分配的密钥重试。
+        
+        Args:
+            call: 接收密钥并返回识别结果的函数
+            api_key_obj: 首次尝试使用的密钥（已从密钥池获取），为空时自动获取
+        """
+        policy = RetryPolicy.from_config()
+        failed_keys = set()
+        attempt = 0
+        while True:
+            attempt += 1
+            if api_key_obj is None:
+                api_key_obj = self._get_available_api_key(exclude=failed_keys)
+            called = False
+            outcome = ERROR_UNKNOWN
+            _call_info.current = {}
+            try:
+                # 超出密钥限流时排队等待，新旧接口共用同一个名额
+                with rate_limiter.limit(api_key_obj):
+                    called = True
+                    started = time.perf_counter()
+                    result = call(api_key_obj)
+                outcome = AICallLog.OUTCOME_OK if any(result.values()) else AICallLog.OUTCOME_EMPTY
+                circuit_breakers.record_success(api_key_obj.key_id)
+                return result
+            except Exception as e:
+                error_type = outcome = classify_error(e)
+                if called and error_type in BREAKER_ERRORS:
+                    circuit_breakers.record_failure(api_key_obj.key_id, error_type)
+                if not called or not policy.should_retry(e, attempt):
+                    raise
+                failed_keys.add(api_key_obj.key_id)
+                delay = policy.get_delay(attempt, e)
+                print(f"AI接口调用失败（{error_type}）: {e}，{delay:.1f} 秒后第 {attempt + 1} 次尝试")
+            finally:
+                info, _call_info.current = _call_info.current, None
+                if called:
+                    # 调用记录与调用次数都在内存中累加后批量写入
+                    latency = time.perf_counter() - started
+                    ai_call_recorder.record(api_key_obj.key_id, info.get('model') or api_key_obj.model_name,
+                                            outcome, latency,
+                                            thinking=info.get('thinking', False),
+                                            fallback=info.get('fallback', False),
+                                            usage=info.get('usage'), payload_bytes=info.get('payload_bytes'))
+                api_key_pool.release(api_key_obj, used=called)
+                api_key_obj = None
+            time.sleep(delay)
     
     def _parse_response(self, response) -> Dict[str, Any]:
-        """解析API响应（兼容新旧接口格式）"""
+        """解析API响应（兼容新旧接口格式），字段整理为 EMPTY_RESULT 结构"""
+        self._note_call(usage=get_usage(response))
         try:
-            # 处理新接口（zai库）的响应格式
-            if hasattr(response, 'choices') and len(response.choices) > 0:
-                message_obj = response.choices[0].message
-                # 新接口可能直接返回message对象或content属性
-                if hasattr(message_obj, 'content'):
-                    message = message_obj.content
-                elif isinstance(message_obj, str):
-                    message = message_obj
-                else:
-                    # 尝试获取文本内容
-                    message = str(message_obj)
-            else:
-                # 旧接口格式
-                message = response.choices[0].message.content
-            
-            # 尝试提取JSON内容
-            json_match = re.search(r'```json\s*([\s\S]*?)\s*```', message)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                json_str = message
-            
-            extracted_info = json.loads(json_str)
-            return extracted_info
-        except (json.JSONDecodeError, AttributeError, IndexError, TypeError) as e:
+            result = parse_certificate_response(response)
+        except (AttributeError, IndexError, TypeError) as e:
             print(f"解析响应失败: {e}")
-            print(f"响应内容: {response}")
-            return self.EMPTY_RESULT.copy()
+            result = None
+        return result if result is not None else self.EMPTY_RESULT.copy()
@@ -0,0 +1,215 @@
+"""
+本地模拟GLM接口服务器 - 用于压测与离线调试，不消耗真实API调用次数
+模拟 zai/zhipuai SDK 使用的 chat/completions 接口，可配置响应延迟分布、错误率与 429 限流
+用法: flask --app flask_app benchmark fake-server --port 8765
+      然后设置 AI_BASE_URL = 'http://127.0.0.1:8765/api/paas/v4'
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+import uuid
+
+
+# 模拟返回的证书信息
+FAKE_CERTIFICATE = {
+    "student_department": "计算机学院",
+    "competition_name": "全国大学生数学建模竞赛",
+    "student_id": "2021000001",
+    "student_name": "测试学生",
+    "award_category": "国家级",
+    "award_level": "一等奖",
+    "competition_type": "A类",
+    "organizer": "中国工业与应用数学学会",
+    "award_date": "2024-12-01",
+    "advisor": "测试教师"
+}
+
+
+class LatencyModel:
+    """
+    响应延迟分布
+
+    - fixed: 固定为 median 秒
+    - uniform: [low, high] 均匀分布
+    - lognormal: 中位数为 median、对数标准差为 sigma 的对数正态分布（接近真实接口的长尾）
+    """
+
+    DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+    def __init__(self, distribution='lognormal', median=2.0, sigma=0.5, low=None, high=None, rand=None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f'不支持的延迟分布: {distribution}')
+        self.distribution = distribution
+        self.median = median
+        self.sigma = sigma
+        self.low = median / 2 if low is None else low
+        self.high = median * 1.5 if high is None else high
+        self._rand = rand or random.Random()
+
+    def sample(self):
+        if self.distribution == 'fixed':
+            return self.median
+        if self.distribution == 'uniform':
+            return self._rand.uniform(self.low, self.high)
+        return self._rand.lognormvariate(0, self.sigma) * self.median
+
+
+class FakeGLMServer:
+    """
+    模拟GLM接口的HTTP服务器
+
+    在后台线程中运行，每个请求按延迟分布等待后返回；按 error_rate 返回 500，
+    按 rate_limit_rate 返回 429（带 Retry-After 响应头）。开启思考的请求延迟乘以
+    thinking_factor；关闭思考的请求按 fast_miss_rate 漏掉竞赛名称，用于模拟快速模式识别不全。
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, result=None, seed=None,
+                 thinking_factor=3.0, fast_miss_rate=0.0):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.result = result or FAKE_CERTIFICATE
+        self.thinking_factor = thinking_factor
+        self.fast_miss_rate = fast_miss_rate
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0, 'thinking': 0,
+                      'in_flight': 0, 'max_in_flight': 0}
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/api/paas/v4'
+
+    def start(self):
+        """在后台线程中启动"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-glm-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """在当前线程中运行，直到 KeyboardInterrupt"""
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.httpd.server_close()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _record(self, name, delta=1):
+        with self._lock:
+            self.stats[name] += delta
+            if name == 'in_flight':
+                self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+    def _decide(self, thinking=False):
+        """
+        按配置的概率决定本次请求的结果
+
+        Returns:
+            tuple: (ok / errors / rate_limited, 延迟秒数, 是否漏掉字段)
+        """
+        with self._lock:
+            roll = self._rand.random()
+            delay = self.latency.sample()
+            incomplete = not thinking and self._rand.random() < self.fast_miss_rate
+        if thinking:
+            delay *= self.thinking_factor
+        if roll < self.rate_limit_rate:
+            return 'rate_limited', 0.0, False
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 'errors', delay, False
+        return 'ok', delay, incomplete
+
+    def build_completion(self, model, incomplete=False):
+        """构造 chat/completions 响应体"""
+        result = dict(self.result, competition_name='') if incomplete else self.result
+        content = '```json\n' + json.dumps(result, ensure_ascii=False) + '\n```'
+        return {
+            'id': uuid.uuid4().hex,
+            'request_id': uuid.uuid4().hex,
+            'created': int(time.time()),
+            'model': model,
+            'object': 'chat.completion',
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content}
+            }],
+            'usage': {'prompt_tokens': 1000, 'completion_tokens': 120, 'total_tokens': 1120}
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'code': '404', 'message': 'Not Found'}})
+                    return
+                try:
+                    payload = json.loads(raw or b'{}')
+                except ValueError:
+                    self._send_json(400, {'error': {'code': '1210', 'message': '请求体不是有效的JSON'}})
+                    return
+
+                thinking = (payload.get('thinking') or {}).get('type') == 'enabled'
+                server._record('requests')
+                if thinking:
+                    server._record('thinking')
+                outcome, delay, incomplete = server._decide(thinking)
+                server._record('in_flight')
+                try:
+                    if delay:
+                        time.sleep(delay)
+                finally:
+                    server._record('in_flight', -1)
+                server._record(outcome)
+
+                if outcome == 'rate_limited':
+                    self._send_json(429, {'error': {'code': '1302', 'message': '请求频率过高'}},
+                                    {'Retry-After': str(server.retry_after)})
+                elif outcome == 'errors':
+                    self._send_json(500, {'error': {'code': '500', 'message': '服务内部错误'}})
+                else:
+                    self._send_json(200, server.build_completion(payload.get('model', ''), incomplete))
+
+        return Handler
@@ -0,0 +1,241 @@
+"""
+AI响应解析 - 从模型回复中提取证书信息JSON
+回复中常夹带思考过程、说明文字或代码块标记，这里逐个尝试可能的对象起点（不使用回溯正则），
+并将字段整理为 EMPTY_RESULT 的结构
+"""
+from typing import Dict, Any, Optional
+from flask import current_app, has_app_context
+import json
+import logging
+import os
+import re
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# 证书信息字段（与 CertificateExtractor.EMPTY_RESULT 一致）
+RESULT_FIELDS = (
+    "student_department",
+    "competition_name",
+    "student_id",
+    "student_name",
+    "award_category",
+    "award_level",
+    "competition_type",
+    "organizer",
+    "award_date",
+    "advisor",
+)
+
+# 模型偶尔返回的其他字段名 -> 标准字段名
+FIELD_ALIASES = {
+    "department": "student_department",
+    "college": "student_department",
+    "学院": "student_department",
+    "学生所在学院": "student_department",
+    "competition": "competition_name",
+    "竞赛项目": "competition_name",
+    "竞赛名称": "competition_name",
+    "student_no": "student_id",
+    "student_number": "student_id",
+    "学号": "student_id",
+    "name": "student_name",
+    "student": "student_name",
+    "学生姓名": "student_name",
+    "姓名": "student_name",
+    "category": "award_category",
+    "获奖类别": "award_category",
+    "level": "award_level",
+    "award": "award_level",
+    "获奖等级": "award_level",
+    "type": "competition_type",
+    "竞赛类型": "competition_type",
+    "主办单位": "organizer",
+    "date": "award_date",
+    "获奖日期": "award_date",
+    "advisors": "advisor",
+    "teacher": "advisor",
+    "指导教师": "advisor",
+    "指导老师": "advisor",
+}
+
+# 标准字段名与别名 -> 标准字段名
+_FIELD_MAP = dict(FIELD_ALIASES, **{field: field for field in RESULT_FIELDS})
+
+# 视为空值的字段内容
+_EMPTY_VALUES = frozenset(('null', 'NULL', 'None', 'none', 'N/A', 'n/a', '无', '未知', '-'))
+
+# 容错解析时最多修复的格式错误数
+MAX_REPAIRS = 5
+
+# 最多尝试的对象起点数，避免异常输入耗时过长
+MAX_CANDIDATES = 200
+
+_decoder = json.JSONDecoder()
+
+# JSON对象的开头：'{' 后（跳过空白）紧跟字段名或 '}'，可排除 {荣誉证书} 这类文字
+_OBJECT_START = re.compile(r'\{\s*["}]')
+
+
+def get_message_text(response) -> str:
+    """取出模型回复的文本内容（兼容新旧接口的响应对象与字典）"""
+    if isinstance(response, str):
+        return response
+    if isinstance(response, dict):
+        choices = response.get('choices') or []
+        message = choices[0].get('message', {}) if choices else {}
+        return message.get('content') or ''
+
+    message = response.choices[0].message
+    if isinstance(message, str):
+        return message
+    content = getattr(message, 'content', None)
+    return content if isinstance(content, str) else str(message)
+
+
+def get_usage(response) -> Dict[str, Optional[int]]:
+    """取出响应中的token用量（兼容响应对象与字典），没有时各项为None"""
+    usage = response.get('usage') if isinstance(response, dict) else getattr(response, 'usage', None)
+    result = {}
+    for name in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+        value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        result[name] = value if isinstance(value, int) else None
+    return result
+
+
+def _decode_at(text: str, start: int):
+    """
+    从 start 处的 '{' 解码JSON对象，无法解码时返回None
+
+    使用标准库的C解码器；遇到 } 或 ] 前多余的逗号（模型常见的格式错误）时
+    按解码器报告的出错位置删除该逗号后重试，不会改动字符串内容。
+    """
+    for _ in range(MAX_REPAIRS + 1):
+        try:
+            return _decoder.raw_decode(text, start)[0]
+        except json.JSONDecodeError as e:
+            if e.pos >= len(text) or text[e.pos] not in '}]':
+                return None
+            comma = text.rfind(',', start, e.pos)
+            if comma == -1 or text[comma + 1:e.pos].strip():
+                return None
+            text = text[:comma] + text[comma + 1:]
+        except RecursionError:
+            return None
+    return None
+
+
+def find_json_object(text: str, expected_keys=RESULT_FIELDS) -> Optional[dict]:
+    """
+    在文本中查找JSON对象
+
+    优先从最后一个 ```json 代码块开始查找（前面可能是思考过程），
+    返回第一个包含 expected_keys 中任一字段的对象；都不包含时返回第一个解码成功的对象。
+
+    Args:
+        text: 模型回复文本
+        expected_keys: 期望包含的字段，为空时返回第一个对象
+
+    Returns:
+        dict: 找到的对象，没有时返回None
+    """
+    if not text:
+        return None
+
+    fence = text.rfind('```json')
+    starts = (fence, 0) if fence > 0 else (0,)
+    fallback = None
+    for scan_from in starts:
+        match = _OBJECT_START.search(text, scan_from)
+        attempts = 0
+        while match and attempts < MAX_CANDIDATES:
+            attempts += 1
+            obj = _decode_at(text, match.start())
+            if isinstance(obj, dict):
+                if not expected_keys or _has_expected_key(obj, expected_keys):
+                    return obj
+                if fallback is None:
+                    fallback = obj
+            match = _OBJECT_START.search(text, match.start() + 1)
+    return fallback
+
+
+def _has_expected_key(obj: dict, expected_keys) -> bool:
+    for key in obj:
+        if key in expected_keys or FIELD_ALIASES.get(key) in expected_keys:
+            return True
+    # 结果包在一层对象里，如 {"certificate": {...}}
+    return any(isinstance(value, dict) and _has_expected_key(value, expected_keys) for value in obj.values())
+
+
+def _to_text(value) -> str:
+    """字段值统一为字符串，列表用逗号连接"""
+    if isinstance(value, str):
+        return value.strip()
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ', '.join(_to_text(item) for item in value if item not in (None, ''))
+    if isinstance(value, dict):
+        return ', '.join(_to_text(item) for item in value.values() if item not in (None, ''))
+    return str(value).strip()
+
+
+def normalize_result(data: dict) -> Dict[str, Any]:
+    """
+    将解析出的对象整理为 EMPTY_RESULT 结构
+
+    字段名按 FIELD_ALIASES 映射，多余字段丢弃，列表值转为逗号分隔的字符串，
+    空值（None、"null"、"无"）统一为空字符串。
+    """
+    result = dict.fromkeys(RESULT_FIELDS, '')
+    if not isinstance(data, dict):
+        return result
+
+    # 结果包在一层对象里时展开
+    if not any(key in _FIELD_MAP for key in data):
+        for value in data.values():
+            if isinstance(value, dict) and _has_expected_key(value, RESULT_FIELDS):
+                data = value
+                break
+
+    for key, value in data.items():
+        field = _FIELD_MAP.get(key)
+        if field is None and isinstance(key, str):
+            field = _FIELD_MAP.get(key.strip().lower())
+        if field is None or result[field]:
+            continue
+        text = _to_text(value)
+        result[field] = '' if text in _EMPTY_VALUES else text
+    return result
+
+
+def record_response(text: str, folder: str):
+    """保存模型回复原文，作为解析基准测试的语料"""
+    try:
+        os.makedirs(folder, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.txt"
+        with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+            f.write(text or '')
+    except OSError as e:
+        logger.warning(f"保存AI回复失败: {e}")
+
+
+def parse_certificate_response(response) -> Optional[Dict[str, Any]]:
+    """
+    解析模型回复为证书信息
+
+    Returns:
+        dict: EMPTY_RESULT 结构的结果，回复中没有JSON对象时返回None
+    """
+    text = get_message_text(response)
+    record_folder = current_app.config.get('AI_RESPONSE_RECORD_FOLDER') if has_app_context() else None
+    if record_folder:
+        record_response(text, record_folder)
+    data = find_json_object(text)
+    if data is None:
+        preview = text[:200].replace('\n', ' ') if text else ''
+        logger.warning(f"AI回复中未找到JSON（{len(text or '')} 字符）: {preview}")
+        return None
+    return normalize_result(data)
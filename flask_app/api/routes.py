@@ -1,12 +1,13 @@
 """
 API 路由
 """
-from flask import jsonify, request, send_file, abort, current_app
+from flask import jsonify, request, send_file, abort, current_app, Response, url_for
 from flask_login import login_required, current_user
 from flask_app.api import api_bp
 from flask_app.models import Dictionary
 import os
 import hashlib
+import json
 import time
 
 
@@ -52,6 +53,404 @@ def get_user_info():
     })
 
 
+def _serialize_extraction_job(job, user=None):
+    """将识别任务转换为JSON数据，user 默认为当前用户"""
+    from flask_app.services.extraction_job_service import ExtractionJobService
+    from flask_app.utils.certificate_utils import prepare_extracted_info
+    
+    data = {
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_display': job.status_display,
+        'stage': job.stage or job.STAGE_QUEUED,
+        'stage_display': job.stage_display,
+        'batch_id': job.batch_id,
+        'job_class': job.job_class,
+        'file_md5': job.file_md5,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S') if job.created_at else None,
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None,
+        'result': None,
+        'error': job.error
+    }
+    if job.status == job.STATUS_DONE:
+        data['result'] = prepare_extracted_info(ExtractionJobService.get_result(job), user)
+    return data
+
+
+def _deadline_response():
+    """非管理员用户已超过提交截止时间时返回403响应，否则返回None"""
+    from flask_app.models import SystemConfig
+    from datetime import datetime
+    
+    if current_user.role in ['admin', 'secretary']:
+        return None
+    deadline = SystemConfig.get_deadline()
+    if deadline and datetime.now() > deadline:
+        return jsonify({
+            'success': False,
+            'message': f'已超过证书提交截止时间（{SystemConfig.get_deadline_display()}），无法继续操作'
+        }), 403
+    return None
+
+
+@api_bp.route('/upload/precheck', methods=['POST'])
+@login_required
+def precheck_upload():
+    """
+    上传前按浏览器计算的MD5检查文件是否已存在（秒传）
+
+    已存在时返回持有文件的校验（随机数与文件中的一段），浏览器计算
+    MD5(随机数 + 该段内容) 后提交，无需上传文件内容。
+    """
+    from flask import session
+    from flask_app.services.blob_store import blob_store
+    import re
+
+    if not current_app.config.get('UPLOAD_PRECHECK_ENABLED', True):
+        return jsonify({'success': True, 'data': {'exists': False}})
+
+    data = request.get_json(silent=True) or {}
+    file_md5 = str(data.get('file_md5') or '').lower()
+    try:
+        file_size = int(data.get('file_size') or 0)
+    except (TypeError, ValueError):
+        file_size = 0
+    if not re.fullmatch(r'[0-9a-f]{32}', file_md5) or file_size <= 0:
+        return jsonify({'success': False, 'message': '参数错误'}), 400
+
+    # 检查截止时间（非管理员用户）
+    overdue = _deadline_response()
+    if overdue:
+        return overdue
+
+    if blob_store.find(file_md5, file_size) is None:
+        session.pop('upload_challenge', None)
+        return jsonify({'success': True, 'data': {'exists': False}})
+
+    challenge = blob_store.make_challenge(file_size)
+    session['upload_challenge'] = dict(
+        challenge,
+        file_md5=file_md5,
+        file_size=file_size,
+        expires=time.time() + current_app.config.get('UPLOAD_PRECHECK_TTL', 300)
+    )
+    return jsonify({
+        'success': True,
+        'data': {'exists': True, 'challenge': challenge}
+    })
+
+
+def _serialize_upload_session(upload):
+    """序列化分片上传会话"""
+    from flask_app.services.chunked_upload_service import ChunkedUploadService
+    
+    return {
+        'upload_id': upload.upload_id,
+        'file_name': upload.file_name,
+        'file_size': upload.file_size,
+        'file_md5': upload.file_md5,
+        'received': upload.received,
+        'progress': upload.progress,
+        'status': upload.status,
+        'file_id': upload.file_id,
+        'chunk_size': ChunkedUploadService.chunk_size(),
+        'expires_at': upload.expires_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'url': url_for('api.get_upload_session', upload_id=upload.upload_id)
+    }
+
+
+@api_bp.route('/uploads', methods=['POST'])
+@login_required
+def create_upload_session():
+    """创建分片上传会话（相同文件有未完成的会话时返回该会话，从已上传的位置继续）"""
+    from flask_app.services.chunked_upload_service import ChunkedUploadService, ChunkedUploadError
+    
+    if not current_app.config.get('UPLOAD_CHUNKED_ENABLED', True):
+        return jsonify({'success': False, 'message': '未开启分片上传'}), 404
+    
+    overdue = _deadline_response()
+    if overdue:
+        return overdue
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        file_size = int(data.get('file_size') or 0)
+    except (TypeError, ValueError):
+        file_size = 0
+    try:
+        upload = ChunkedUploadService.create(
+            user_id=current_user.user_id,
+            file_name=str(data.get('file_name') or ''),
+            file_size=file_size,
+            file_md5=str(data.get('file_md5') or '')
+        )
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
+    return jsonify({
+        'success': True,
+        'data': _serialize_upload_session(upload)
+    }), 201
+
+
+@api_bp.route('/uploads/<string:upload_id>')
+@login_required
+def get_upload_session(upload_id):
+    """查询分片上传进度（断线重连后从 received 继续上传）"""
+    from flask_app.services.chunked_upload_service import ChunkedUploadService
+    
+    upload = ChunkedUploadService.get(upload_id, current_user.user_id)
+    if not upload:
+        return jsonify({'success': False, 'message': '上传不存在或已过期'}), 404
+    return jsonify({
+        'success': True,
+        'data': _serialize_upload_session(upload)
+    })
+
+
+@api_bp.route('/uploads/<string:upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """上传一个分片：请求体为分片内容，offset 参数为分片在文件中的起始位置"""
+    from flask_app.services.chunked_upload_service import ChunkedUploadService, ChunkedUploadError
+    
+    upload = ChunkedUploadService.get(upload_id, current_user.user_id)
+    if not upload:
+        return jsonify({'success': False, 'message': '上传不存在或已过期'}), 404
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'message': '缺少分片位置'}), 400
+    try:
+        ChunkedUploadService.write_chunk(upload, offset, request.stream, request.content_length)
+    except ChunkedUploadError as e:
+        return jsonify({
+            'success': False,
+            'message': e.message,
+            'data': _serialize_upload_session(upload)
+        }), e.status
+    return jsonify({
+        'success': True,
+        'data': _serialize_upload_session(upload)
+    })
+
+
+@api_bp.route('/uploads/<string:upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload_session(upload_id):
+    """完成分片上传：校验文件MD5，保存文件并创建文件记录"""
+    from flask_app.services.chunked_upload_service import ChunkedUploadService, ChunkedUploadError
+    
+    upload = ChunkedUploadService.get(upload_id, current_user.user_id)
+    if not upload:
+        return jsonify({'success': False, 'message': '上传不存在或已过期'}), 404
+    try:
+        upload = ChunkedUploadService.finalize(upload)
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
+    return jsonify({
+        'success': True,
+        'data': _serialize_upload_session(upload)
+    })
+
+
+@api_bp.route('/extraction/jobs', methods=['POST'])
+@login_required
+def create_extraction_job():
+    """创建AI识别任务（后台异步执行，立即返回任务ID）"""
+    from flask_app.models import Certificate, File
+    from flask_app.services.extraction_job_service import ExtractionJobService
+    from flask_app.utils.file_utils import get_file_type, resolve_file_md5
+    
+    data = request.get_json(silent=True) or request.form
+    file_path = data.get('file_path', '')
+    
+    # 检查截止时间（非管理员用户）
+    overdue = _deadline_response()
+    if overdue:
+        return overdue
+    
+    if not file_path or not os.path.isfile(file_path):
+        return jsonify({'success': False, 'message': '文件不存在，请重新上传'}), 404
+    
+    # 只能识别自己上传的文件（管理员除外）
+    if current_user.role != 'admin':
+        is_owner = File.query.filter_by(file_path=file_path, user_id=current_user.user_id).first() or \
+            Certificate.query.filter_by(file_path=file_path, submitter_id=current_user.user_id).first()
+        if not is_owner:
+            return jsonify({'success': False, 'message': '您没有权限识别此文件'}), 403
+    
+    # 上传时已开始识别的文件直接返回已有任务
+    job = ExtractionJobService.find_active_job(current_user.user_id, file_path)
+    if job:
+        return jsonify({
+            'success': True,
+            'data': _serialize_extraction_job(job)
+        }), 202
+    
+    if not ExtractionJobService.can_enqueue(current_user.user_id):
+        return jsonify({'success': False, 'message': '您有多个证书正在识别，请等待识别完成后再试'}), 429
+    
+    # 识别缓存与相同文件的识别结果都以MD5为键，使用服务器端的MD5，不使用客户端提交的值
+    job = ExtractionJobService.enqueue(
+        user_id=current_user.user_id,
+        file_path=file_path,
+        file_md5=resolve_file_md5(file_path),
+        file_type=get_file_type(file_path)
+    )
+    return jsonify({
+        'success': True,
+        'data': _serialize_extraction_job(job)
+    }), 202
+
+
+@api_bp.route('/extraction/jobs/<string:job_id>')
+@login_required
+def get_extraction_job(job_id):
+    """查询AI识别任务状态及结果"""
+    from flask_app.services.extraction_job_service import ExtractionJobService
+    
+    job = ExtractionJobService.get_job(job_id, user_id=current_user.user_id)
+    if not job:
+        return jsonify({'success': False, 'message': '识别任务不存在'}), 404
+    
+    return jsonify({
+        'success': True,
+        'data': _serialize_extraction_job(job)
+    })
+
+
+@api_bp.route('/extraction/queue')
+@login_required
+def get_extraction_queue():
+    """识别队列统计：各类任务的排队数与等待时间、各学院排队数（仅管理员）"""
+    from flask_app.services.extraction_job_service import ExtractionJobService
+    
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': '只有管理员可以查看识别队列'}), 403
+    
+    window = request.args.get('window', 60, type=int)
+    return jsonify({
+        'success': True,
+        'data': ExtractionJobService.queue_stats(window_minutes=max(1, min(window, 24 * 60)))
+    })
+
+
+def _load_event_jobs(user_id, job_id=None, batch_id=None, since=None, changed=None):
+    """
+    查询进度推送连接关注的任务
+
+    Args:
+        job_id / batch_id: 只关注单个任务或批次，都为空时关注该用户全部未完成的任务
+        since: 连接建立时间，之后结束的任务也会推送
+        changed: 收到通知的任务ID，为空时查询全部关注的任务
+    """
+    from flask_app.models import ExtractionJob
+    from sqlalchemy import or_
+
+    query = ExtractionJob.query.filter_by(user_id=user_id)
+    if job_id:
+        query = query.filter_by(job_id=job_id)
+    elif batch_id:
+        query = query.filter_by(batch_id=batch_id)
+    else:
+        query = query.filter(or_(
+            ExtractionJob.status.in_([ExtractionJob.STATUS_QUEUED, ExtractionJob.STATUS_RUNNING]),
+            ExtractionJob.finished_at >= since
+        ))
+    if changed:
+        query = query.filter(ExtractionJob.job_id.in_(changed))
+    return query.order_by(ExtractionJob.created_at.asc()).all()
+
+
+@api_bp.route('/extraction/events')
+@login_required
+def stream_extraction_events():
+    """
+    以 Server-Sent Events 推送当前用户识别任务的状态与阶段变化
+
+    参数 job_id / batch_id 限定推送范围，只关注单个任务时任务结束后关闭连接。
+    每条事件为 event: job，data 与任务查询接口的 data 相同；空闲时定时发送注释行保活，
+    连接超过 JOB_EVENTS_MAX_DURATION 后关闭，由浏览器自动重连。
+    连接等待期间不持有请求上下文和数据库连接，生产环境建议使用 gunicorn -k gevent 部署。
+    """
+    from flask_app import db
+    from flask_app.models import ExtractionJob, User
+    from flask_app.services.job_events import job_events
+    from datetime import datetime
+
+    app = current_app._get_current_object()
+    config = app.config
+    user_id = current_user.user_id
+    job_id = request.args.get('job_id') or None
+    batch_id = request.args.get('batch_id') or None
+    if job_id and not ExtractionJob.query.filter_by(job_id=job_id, user_id=user_id).count():
+        return jsonify({'success': False, 'message': '识别任务不存在'}), 404
+
+    subscription = job_events.subscribe(user_id)
+    if subscription is None:
+        return jsonify({'success': False, 'message': '进度推送连接数已满，请稍后重试'}), 503
+
+    heartbeat = config.get('JOB_EVENTS_HEARTBEAT', 15)
+    poll_interval = config.get('JOB_EVENTS_POLL_INTERVAL', 3)
+    max_duration = config.get('JOB_EVENTS_MAX_DURATION', 300)
+    retry_ms = config.get('JOB_EVENTS_RETRY', 3000)
+
+    def generate():
+        connected_at = datetime.now()
+        started = time.monotonic()
+        last_sent = started
+        sent = {}  # job_id -> (status, stage)
+        changed = None
+        try:
+            yield f'retry: {retry_ms}\n\n'
+            while True:
+                events = []
+                watching = False
+                with app.app_context():
+                    try:
+                        # 流式响应不在请求上下文中，显式传入用户
+                        user = None
+                        for job in _load_event_jobs(user_id, job_id, batch_id, connected_at, changed):
+                            watching = watching or not job.is_finished
+                            state = (job.status, job.stage)
+                            if sent.get(job.job_id) == state:
+                                continue
+                            sent[job.job_id] = state
+                            if user is None:
+                                user = db.session.get(User, user_id)
+                            data = json.dumps(_serialize_extraction_job(job, user), ensure_ascii=False)
+                            events.append(f'event: job\ndata: {data}\n\n')
+                        if changed:
+                            # 只查询了有变化的任务，是否还有未完成的任务以已推送的状态为准
+                            watching = any(status not in (ExtractionJob.STATUS_DONE, ExtractionJob.STATUS_FAILED)
+                                           for status, _ in sent.values())
+                    finally:
+                        db.session.remove()
+
+                now = time.monotonic()
+                if events:
+                    last_sent = now
+                    yield ''.join(events)
+                elif now - last_sent >= heartbeat:
+                    last_sent = now
+                    yield ': ping\n\n'
+
+                if job_id and sent and not watching:
+                    break  # 单个任务已结束
+                if now - started >= max_duration:
+                    break
+
+                # 有未完成的任务时定时查询数据库，兜底其他进程中的变化
+                changed = subscription.wait(poll_interval if watching else heartbeat) or None
+        finally:
+            job_events.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭 nginx 缓冲
+    })
+
+
 @api_bp.route('/certificate/file/<string:cert_id>')
 @login_required
 def get_certificate_file(cert_id):
@@ -62,17 +461,8 @@ def get_certificate_file(cert_id):
     cert = Certificate.query.get_or_404(cert_id)
     
     # 检查权限：学生只能查看自己的证书，教师可以查看自己指导的学生证书，管理员和教学秘书可以查看所有（教学秘书只能查看本院）
-    if current_user.role == 'student':
-        if cert.submitter_id != current_user.user_id:
-            abort(403)
-    elif current_user.role == 'teacher':
-        if cert.submitter_id != current_user.user_id and cert.advisor_id != current_user.account_id:
-            abort(403)
-    elif current_user.role == 'secretary':
-        # 教学秘书只能查看本院证书
-        if cert.department != current_user.department:
-            abort(403)
-    # 管理员可以查看所有证书
+    if not _can_access_certificate_file(cert):
+        abort(403)
     
     if not cert.file_path or not os.path.exists(cert.file_path):
         abort(404)
@@ -81,34 +471,86 @@ def get_certificate_file(cert_id):
     is_image = cert.file_path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif'))
     
     # 检查Referer，防止直接URL访问图片
+    if is_image:
+        _check_image_referer()
+    
+    return _protected_file_response(cert.file_path, etag=_file_etag(cert.file_path, cert.file_md5))
+
+
+@api_bp.route('/certificate/thumbnail/<string:cert_id>/<string:size>')
+@login_required
+def get_certificate_thumbnail(cert_id, size):
+    """获取证书缩略图（size：thumb 用于列表页，preview 用于详情页），权限与证书文件相同"""
+    from flask_app.models import Certificate
+    from flask_app.utils.thumbnail_utils import get_thumbnail, get_thumbnail_options
+    
+    cert = Certificate.query.get_or_404(cert_id)
+    if not _can_access_certificate_file(cert):
+        abort(403)
+    if size not in get_thumbnail_options()['sizes']:
+        abort(404)
+    if not cert.file_path or not os.path.exists(cert.file_path):
+        abort(404)
+    
+    _check_image_referer()
+    
+    thumbnail = get_thumbnail(cert.file_path, size, cert.file_md5)
+    if thumbnail is None:
+        # 无法生成缩略图：图片返回原图，PDF返回404由页面显示图标
+        if cert.file_path.lower().endswith('.pdf'):
+            abort(404)
+        return _protected_file_response(cert.file_path, etag=_file_etag(cert.file_path, cert.file_md5))
+    path, mimetype = thumbnail
+    # 缩略图文件名包含MD5、尺寸与质量
+    return _protected_file_response(path, mimetype, etag=os.path.basename(path))
+
+
+def _check_image_referer():
+    """检查Referer，防止直接URL访问图片（复制链接打开或被其他网站引用）"""
     referer = request.headers.get('Referer', '')
     host = request.headers.get('Host', '')
     
-    if is_image:
-        # 对于图片请求，检查Referer
-        # 如果Referer存在，必须来自我们的域名
-        if referer:
-            if not (referer.startswith(f'http://{host}') or referer.startswith(f'https://{host}')):
-                abort(403)
-        else:
-            # 如果没有Referer，检查是否是浏览器直接访问
-            # 通过检查Accept头来判断：直接访问时Accept通常不包含image/*
-            accept_header = request.headers.get('Accept', '')
-            # 如果Accept头不包含image，可能是直接访问（复制链接打开）
-            if 'image' not in accept_header.lower():
-                abort(403)
-    
-    # 设置安全响应头，防止图片被嵌入到其他网站
-    response = send_file(cert.file_path)
+    # 如果Referer存在，必须来自我们的域名
+    if referer:
+        if not (referer.startswith(f'http://{host}') or referer.startswith(f'https://{host}')):
+            abort(403)
+    else:
+        # 如果没有Referer，检查是否是浏览器直接访问
+        # 通过检查Accept头来判断：直接访问时Accept通常不包含image/*
+        accept_header = request.headers.get('Accept', '')
+        # 如果Accept头不包含image，可能是直接访问（复制链接打开）
+        if 'image' not in accept_header.lower():
+            abort(403)
+
+
+def _file_etag(path, file_md5=None):
+    """
+    文件的强ETag：按内容存放的文件取文件名中的MD5，否则使用记录中的MD5
+
+    Returns:
+        str: ETag，没有可用的MD5时返回None（由 send_file 按修改时间与大小生成）
+    """
+    from flask_app.services.blob_store import blob_store
+    
+    key = blob_store.parse_key(path)
+    if key is not None:
+        return key[:32]
+    return file_md5 or None
+
+
+def _protected_file_response(path, mimetype=None, etag=None):
+    """
+    发送证书文件，设置安全响应头，防止图片被嵌入到其他网站
+    
+    证书文件内容不会改变，以MD5作为ETag：浏览器可以缓存，但每次使用前须向服务器确认
+    （仍经过权限与Referer检查），未变化时返回304；PDF等大文件支持Range分段下载。
+    """
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag or True)
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['X-Frame-Options'] = 'DENY'
     response.headers['Content-Security-Policy'] = "default-src 'self'"
-    # 防止右键复制链接直接访问
-    if is_image:
-        response.headers['Cache-Control'] = 'private, no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-    
+    # 只允许浏览器私有缓存，不允许代理缓存；每次使用前重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
     return response
 
 
@@ -140,14 +582,71 @@ def get_uploaded_file_public(token, file_path):
     return _get_uploaded_file_internal(file_path, require_auth=False)
 
 
-def _get_uploaded_file_internal(file_path: str, require_auth: bool = True):
+def _can_access_certificate_file(cert):
+    """当前用户能否查看证书的文件"""
+    from flask_login import current_user
+    
+    if current_user.role == 'student':
+        return cert.submitter_id == current_user.user_id
+    if current_user.role == 'teacher':
+        return cert.submitter_id == current_user.user_id or cert.advisor_id == current_user.account_id
+    if current_user.role == 'secretary':
+        return cert.department == current_user.department
+    # 管理员可以访问所有文件
+    return True
+
+
+def _can_access_file_record(file_record):
+    """当前用户能否查看上传记录的文件"""
+    from flask_app import db
+    from flask_app.models import User
+    from flask_login import current_user
+    
+    # 只能访问自己的文件，或者管理员/教学秘书可以访问
+    if current_user.role == 'student':
+        return file_record.user_id == current_user.user_id
+    if current_user.role == 'secretary':
+        # 教学秘书可以访问本院用户的文件
+        file_owner = db.session.get(User, file_record.user_id)
+        return not file_owner or file_owner.department == current_user.department
+    # 管理员和教师可以访问所有文件
+    return True
+
+
+def _can_access_upload(full_path):
     """
-    安全访问上传的文件
-    通过相对路径访问，防止路径遍历攻击
+    当前用户能否访问上传的文件
+    
+    按内容存放的文件（blobs/ab/cd/<MD5>.ext）可能被多条证书或上传记录引用，
+    按 MD5 索引查找，有任意一条可访问即可；旧目录结构的文件按路径查找。
+    找不到关联记录时只有管理员可以访问。
     """
     from flask_app.models import Certificate, File
+    from flask_app.services.blob_store import blob_store
     from flask_login import current_user
     
+    key = blob_store.parse_key(full_path)
+    if key is not None:
+        certs = Certificate.query.filter_by(file_md5=key[:32]).all()
+        records = File.query.filter_by(file_md5=key[:32]).all()
+    else:
+        certs = Certificate.query.filter_by(file_path=full_path).limit(1).all()
+        records = [] if certs else File.query.filter_by(file_path=full_path).limit(1).all()
+    
+    if certs and any(_can_access_certificate_file(cert) for cert in certs):
+        return True
+    if records and any(_can_access_file_record(record) for record in records):
+        return True
+    if certs or records:
+        return False
+    return current_user.role == 'admin'
+
+
+def _get_uploaded_file_internal(file_path: str, require_auth: bool = True):
+    """
+    安全访问上传的文件
+    通过相对路径访问，防止路径遍历攻击
+    """
     # 获取上传文件夹配置
     upload_folder = current_app.config.get('UPLOAD_FOLDER')
     if not upload_folder:
@@ -173,74 +672,22 @@ def _get_uploaded_file_internal(file_path: str, require_auth: bool = True):
             abort(404)
         
         # 如果需要认证，检查权限
-        if require_auth:
-            # 检查权限：通过文件路径查找关联的证书或文件记录
-            # 方法1：通过证书查找
-            cert = Certificate.query.filter_by(file_path=full_path).first()
-            if cert:
-                # 检查权限
-                if current_user.role == 'student':
-                    if cert.submitter_id != current_user.user_id:
-                        abort(403)
-                elif current_user.role == 'teacher':
-                    if cert.submitter_id != current_user.user_id and cert.advisor_id != current_user.account_id:
-                        abort(403)
-                elif current_user.role == 'secretary':
-                    if cert.department != current_user.department:
-                        abort(403)
-                # 管理员可以访问所有文件
-            else:
-                # 方法2：通过文件记录查找
-                file_record = File.query.filter_by(file_path=full_path).first()
-                if file_record:
-                    # 检查权限：只能访问自己的文件，或者管理员/教学秘书可以访问
-                    if current_user.role == 'student':
-                        if file_record.user_id != current_user.user_id:
-                            abort(403)
-                    elif current_user.role == 'secretary':
-                        # 教学秘书可以访问本院用户的文件
-                        from flask_app.models import User
-                        file_owner = User.query.get(file_record.user_id)
-                        if file_owner and file_owner.department != current_user.department:
-                            abort(403)
-                    # 管理员和教师可以访问所有文件
-                else:
-                    # 如果找不到关联记录，只有管理员可以访问
-                    if current_user.role != 'admin':
-                        abort(403)
+        if require_auth and not _can_access_upload(full_path):
+            abort(403)
         
         # 检查是否是图片文件
         is_image = full_path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif'))
         
         # 对于需要认证的请求，检查Referer防止直接URL访问图片
         if require_auth and is_image:
-            referer = request.headers.get('Referer', '')
-            host = request.headers.get('Host', '')
-            
-            # 对于图片请求，检查Referer
-            # 如果Referer存在，必须来自我们的域名
-            if referer:
-                if not (referer.startswith(f'http://{host}') or referer.startswith(f'https://{host}')):
-                    abort(403)
-            else:
-                # 如果没有Referer，检查是否是浏览器直接访问
-                accept_header = request.headers.get('Accept', '')
-                # 如果Accept头不包含image，可能是直接访问（复制链接打开）
-                if 'image' not in accept_header.lower():
-                    abort(403)
+            _check_image_referer()
         
-        # 设置安全响应头
-        response = send_file(full_path)
-        response.headers['X-Content-Type-Options'] = 'nosniff'
         if require_auth:
-            response.headers['X-Frame-Options'] = 'DENY'
-            response.headers['Content-Security-Policy'] = "default-src 'self'"
-            # 防止右键复制链接直接访问
-            if is_image:
-                response.headers['Cache-Control'] = 'private, no-cache, no-store, must-revalidate'
-                response.headers['Pragma'] = 'no-cache'
-                response.headers['Expires'] = '0'
+            return _protected_file_response(full_path, etag=_file_etag(full_path))
         
+        # 设置安全响应头
+        response = send_file(full_path, conditional=True, etag=_file_etag(full_path) or True)
+        response.headers['X-Content-Type-Options'] = 'nosniff'
         return response
         
     except (ValueError, OSError):
@@ -0,0 +1,209 @@
+"""
+PDF 文本层证书信息提取器
+主办方直接生成的电子证书PDF带有文本层，按规则提取字段，无需调用视觉模型
+"""
+from typing import Dict, Any, Tuple
+import re
+
+try:
+    import pymupdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    try:
+        import fitz as pymupdf  # 旧版本 PyMuPDF
+        PYMUPDF_AVAILABLE = True
+    except ImportError:
+        PYMUPDF_AVAILABLE = False
+        pymupdf = None
+
+from flask import current_app
+
+from flask_app.utils.date_utils import parse_award_date
+
+
+# 中文数字（用于“二〇二四年十二月”这类日期）
+CHINESE_DIGITS = {'〇': 0, '零': 0, 'O': 0, '○': 0, '一': 1, '二': 2, '三': 3, '四': 4,
+                  '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+# 字典未配置时使用的默认选项（较长的写在前面，优先匹配）
+DEFAULT_AWARD_LEVELS = ['特等奖', '一等奖', '二等奖', '三等奖', '金奖', '银奖', '铜奖', '优秀奖']
+DEFAULT_AWARD_CATEGORIES = {
+    '国家级': ['国家级', '全国', '国际'],
+    '省级': ['省级'],
+    '校级': ['校级'],
+}
+
+NAME = r'[一-龥·]{2,6}'
+
+PATTERNS = {
+    'student_id': re.compile(r'学\s*号\s*[:：]?\s*([0-9A-Za-z]{6,20})'),
+    'student_name': re.compile(
+        r'(?:姓\s*名|获奖者|获奖人|获奖学生)\s*[:：]?\s*(' + NAME + r')'
+    ),
+    'student_name_greeting': re.compile(r'(?:^|\n)\s*(' + NAME + r')\s*同\s*学'),
+    'advisor': re.compile(r'指\s*导\s*(?:教\s*师|老\s*师)\s*[:：]?\s*((?:' + NAME + r')(?:\s*[、,，/ ]\s*' + NAME + r')*)'),
+    'organizer': re.compile(r'(?:主\s*办\s*单\s*位|主\s*办\s*方)\s*[:：]?\s*([^\n]{4,60})'),
+    'organizer_line': re.compile(r'(?:^|\n)\s*([^\n]{4,40}(?:组委会|委员会|学会|协会|教育厅|教育部))\s*(?=\n|$)'),
+    'competition_quoted': re.compile(r'[《“"「]([^》”"」\n]{4,60}?(?:大赛|竞赛|挑战赛|锦标赛|比赛|赛))[》”"」]'),
+    'competition': re.compile(r'(?:在|于|荣获|参加)\s*([^\n，,。在于]{4,60}?(?:大赛|竞赛|挑战赛|锦标赛|比赛))'),
+    'date': re.compile(r'(\d{4})\s*[年\-/.]\s*(\d{1,2})\s*(?:[月\-/.]\s*(\d{1,2})\s*日?|月)'),
+    'chinese_date': re.compile(r'([〇零O○一二三四五六七八九]{4})\s*年\s*([一二三四五六七八九十]{1,3})\s*月'
+                               r'(?:\s*([一二三四五六七八九十]{1,3})\s*日)?'),
+}
+
+
+def _chinese_number(text):
+    """将“十二”“二十一”等中文数字转换为整数"""
+    if not text:
+        return None
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return (CHINESE_DIGITS.get(tens, 1) if tens else 1) * 10 + (CHINESE_DIGITS.get(ones, 0) if ones else 0)
+    return CHINESE_DIGITS.get(text)
+
+
+class TextLayerExtractor:
+    """基于PDF文本层的规则提取器"""
+
+    EMPTY_RESULT = {
+        "student_department": "",
+        "competition_name": "",
+        "student_id": "",
+        "student_name": "",
+        "award_category": "",
+        "award_level": "",
+        "competition_type": "",
+        "organizer": "",
+        "award_date": "",
+        "advisor": ""
+    }
+
+    # 默认必填字段，全部提取到时不再调用视觉模型
+    DEFAULT_REQUIRED_FIELDS = ['student_name', 'competition_name', 'award_level', 'award_date']
+
+    def __init__(self, options=None):
+        """
+        Args:
+            options: 字典选项 {'学院': [...], '获奖类别': [...], '获奖等级': [...], '竞赛类型': [...]}，
+                     默认从 Dictionary 表读取
+        """
+        if options is None:
+            options = self._load_dictionary_options()
+        self.options = options
+
+    @staticmethod
+    def _load_dictionary_options():
+        from flask_app.models import Dictionary
+        return {name: Dictionary.get_values(name) for name in ['学院', '获奖类别', '获奖等级', '竞赛类型']}
+
+    @staticmethod
+    def is_available():
+        return PYMUPDF_AVAILABLE and current_app.config.get('AI_TEXT_LAYER_ENABLED', True)
+
+    @staticmethod
+    def get_required_fields():
+        return current_app.config.get('AI_TEXT_LAYER_REQUIRED_FIELDS', TextLayerExtractor.DEFAULT_REQUIRED_FIELDS)
+
+    @staticmethod
+    def extract_text(pdf_path: str, max_pages: int = None, data: bytes = None) -> str:
+        """读取PDF前几页（默认 AI_PDF_MAX_PAGES）的文本层，扫描件返回空字符串；提供 data 时从内存读取"""
+        if max_pages is None:
+            max_pages = max(1, int(current_app.config.get('AI_PDF_MAX_PAGES', 4)))
+        parts = []
+        document = pymupdf.open(stream=data, filetype='pdf') if data is not None else pymupdf.open(pdf_path)
+        with document:
+            for index in range(min(document.page_count, max_pages)):
+                parts.append(document[index].get_text())
+        return '\n'.join(parts)
+
+    @staticmethod
+    def has_text(text: str) -> bool:
+        """文本层字符数是否足够（扫描件通常没有或只有少量文字）"""
+        min_chars = current_app.config.get('AI_TEXT_LAYER_MIN_CHARS', 20)
+        return len(re.sub(r'\s+', '', text or '')) >= min_chars
+
+    @staticmethod
+    def _match_option(text: str, values) -> str:
+        """在文本中查找字典值，优先匹配最长的值"""
+        compact = re.sub(r'\s+', '', text)
+        for value in sorted((v for v in values if v), key=len, reverse=True):
+            if value in compact:
+                return value
+        return ''
+
+    def _match_award_category(self, text: str) -> str:
+        compact = re.sub(r'\s+', '', text)
+        matched = self._match_option(compact, self.options.get('获奖类别', []))
+        if matched:
+            return matched
+        for category, keywords in DEFAULT_AWARD_CATEGORIES.items():
+            if any(keyword in compact for keyword in keywords):
+                return category
+        return ''
+
+    @staticmethod
+    def _match_date(text: str) -> str:
+        """提取获奖日期，取文本中最后出现的日期（落款日期）"""
+        candidates = []
+        for match in PATTERNS['date'].finditer(text):
+            year, month, day = match.groups()
+            candidates.append((match.start(), f"{year}-{int(month):02d}-{int(day or 1):02d}"))
+        for match in PATTERNS['chinese_date'].finditer(text):
+            year = ''.join(str(CHINESE_DIGITS.get(c, '')) for c in match.group(1))
+            month = _chinese_number(match.group(2))
+            day = _chinese_number(match.group(3)) or 1
+            if len(year) == 4 and month:
+                candidates.append((match.start(), f"{year}-{month:02d}-{day:02d}"))
+
+        for _, value in sorted(candidates, reverse=True):
+            try:
+                parsed = parse_award_date(value)
+            except ValueError:
+                parsed = None
+            if parsed:
+                return parsed.strftime('%Y-%m-%d')
+        return ''
+
+    @staticmethod
+    def _search(name: str, text: str) -> str:
+        match = PATTERNS[name].search(text)
+        return match.group(1).strip() if match else ''
+
+    def extract(self, text: str) -> Tuple[Dict[str, Any], float]:
+        """
+        从证书文本提取信息
+
+        Returns:
+            tuple: (与 EMPTY_RESULT 相同结构的结果, 置信度0~1)
+        """
+        result = self.EMPTY_RESULT.copy()
+        if not text or not text.strip():
+            return result, 0.0
+
+        result['student_department'] = self._match_option(text, self.options.get('学院', []))
+        result['award_level'] = self._match_option(text, self.options.get('获奖等级', []) or DEFAULT_AWARD_LEVELS) \
+            or self._match_option(text, DEFAULT_AWARD_LEVELS)
+        result['award_category'] = self._match_award_category(text)
+        result['competition_type'] = self._match_option(text, self.options.get('竞赛类型', []))
+        result['student_id'] = self._search('student_id', text)
+        result['student_name'] = self._search('student_name', text) or self._search('student_name_greeting', text)
+        result['advisor'] = re.sub(r'\s*[、,，/ ]\s*', '、', self._search('advisor', text))
+        result['organizer'] = self._search('organizer', text) or self._search('organizer_line', text)
+        result['competition_name'] = self._search('competition_quoted', text) or self._search('competition', text)
+        result['award_date'] = self._match_date(text)
+
+        required = self.get_required_fields()
+        filled_required = sum(1 for field in required if result.get(field))
+        filled_total = sum(1 for value in result.values() if value)
+        # 必填字段占主要权重，其余字段作为补充
+        confidence = 0.8 * filled_required / len(required) + 0.2 * filled_total / len(result) if required \
+            else filled_total / len(result)
+        return result, round(confidence, 2)
+
+    def missing_required(self, result: Dict[str, Any]):
+        """返回未提取到的必填字段"""
+        return [field for field in self.get_required_fields() if not result.get(field)]
+
+    def extract_from_pdf(self, pdf_path: str) -> Tuple[Dict[str, Any], float]:
+        """读取PDF文本层并提取信息"""
+        return self.extract(self.extract_text(pdf_path))
@@ -0,0 +1,966 @@
+"""
+命令行工具
+用法: flask --app flask_app benchmark preprocess <图片或目录>
+      flask --app flask_app benchmark encode <文件>
+      flask --app flask_app benchmark fake-server --port 8765
+      flask --app flask_app benchmark extract --users 8 --requests 40
+      flask --app flask_app benchmark single-flight --callers 16 --processes 4
+      flask --app flask_app benchmark parse [回复语料目录]
+      flask --app flask_app benchmark schedule --policy both
+      flask --app flask_app reextract run --status approved
+      flask --app flask_app reextract list
+      flask --app flask_app reextract show <run_id>
+      flask --app flask_app blobs migrate
+      flask --app flask_app blobs gc
+"""
+import base64
+import hashlib
+import json
+import math
+import heapq
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+benchmark_cli = AppGroup('benchmark', help='AI识别相关性能测试')
+reextract_cli = AppGroup('reextract', help='修改提示词后重新识别历史证书并对比结果')
+blobs_cli = AppGroup('blobs', help='按内容存放的证书文件存储')
+
+
+def _collect_images(paths):
+    """展开目录，返回其中的图片文件"""
+    from flask_app.utils.image_utils import IMAGE_MIME_TYPES
+
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_MIME_TYPES:
+                        images.append(os.path.join(root, name))
+        elif os.path.splitext(path)[1].lower() in IMAGE_MIME_TYPES:
+            images.append(path)
+    return images
+
+
+def _base64_size(size):
+    """base64 编码后的长度"""
+    return (size + 2) // 3 * 4
+
+
+def _format_size(size):
+    if size >= 1024 * 1024:
+        return f'{size / 1024 / 1024:.2f}MB'
+    return f'{size / 1024:.1f}KB'
+
+
+def _timed_extract(extractor, image_path, preprocess):
+    """调用一次AI识别（不经过识别缓存），返回耗时（秒）"""
+    current_app.config['AI_IMAGE_PREPROCESS_ENABLED'] = preprocess
+    started = time.perf_counter()
+    extractor.extract_from_image(image_path)
+    return time.perf_counter() - started
+
+
+@benchmark_cli.command('preprocess')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--call-api', is_flag=True, help='同时调用AI接口对比识别耗时（会消耗API调用次数）')
+def benchmark_preprocess(paths, call_api):
+    """对比图片预处理前后的请求体积与识别耗时"""
+    from flask_app.api.certificate_extractor import CertificateExtractor
+    from flask_app.utils.image_utils import preprocess_image
+
+    images = _collect_images(paths)
+    if not images:
+        click.echo('未找到图片文件')
+        return
+
+    config = current_app.config
+    saved = {k: config.get(k) for k in ('AI_IMAGE_CACHE_FOLDER', 'AI_IMAGE_PREPROCESS_ENABLED')}
+    cache_dir = tempfile.mkdtemp(prefix='ai_images_')
+    config['AI_IMAGE_CACHE_FOLDER'] = cache_dir
+    config['AI_IMAGE_PREPROCESS_ENABLED'] = True
+
+    rows = []
+    try:
+        for image_path in images:
+            original_size = os.path.getsize(image_path)
+            started = time.perf_counter()
+            derived_path, _ = preprocess_image(image_path)
+            preprocess_ms = (time.perf_counter() - started) * 1000
+            row = {
+                'name': os.path.basename(image_path),
+                'original': _base64_size(original_size),
+                'derived': _base64_size(os.path.getsize(derived_path)),
+                'preprocess_ms': preprocess_ms,
+            }
+            if call_api:
+                extractor = CertificateExtractor()
+                row['latency_before'] = _timed_extract(extractor, image_path, False)
+                row['latency_after'] = _timed_extract(extractor, image_path, True)
+            rows.append(row)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                config.pop(key, None)
+            else:
+                config[key] = value
+
+    header = f"{'文件':<32}{'原始请求体':>12}{'预处理后':>12}{'压缩比':>8}{'预处理耗时':>12}"
+    if call_api:
+        header += f"{'识别耗时(前)':>14}{'识别耗时(后)':>14}"
+    click.echo(header)
+    for row in rows:
+        line = (f"{row['name'][:30]:<32}{_format_size(row['original']):>12}"
+                f"{_format_size(row['derived']):>12}{row['derived'] / row['original']:>8.0%}"
+                f"{row['preprocess_ms']:>10.0f}ms")
+        if call_api:
+            line += f"{row['latency_before']:>13.2f}s{row['latency_after']:>13.2f}s"
+        click.echo(line)
+
+    total_original = sum(r['original'] for r in rows)
+    total_derived = sum(r['derived'] for r in rows)
+    click.echo(f'\n共 {len(rows)} 张图片，base64 请求体 {_format_size(total_original)} -> '
+               f'{_format_size(total_derived)}（{total_derived / total_original:.0%}）')
+    click.echo(f"预处理耗时中位数 {statistics.median(r['preprocess_ms'] for r in rows):.0f}ms")
+    if call_api:
+        click.echo(f"识别耗时中位数 {statistics.median(r['latency_before'] for r in rows):.2f}s -> "
+                   f"{statistics.median(r['latency_after'] for r in rows):.2f}s")
+
+
+def _encode_inline(file_path, mime_type):
+    """改造前的编码方式：整体读入、编码、解码，调用期间同时持有 base64 字符串和拼接后的 data URI"""
+    with open(file_path, 'rb') as f:
+        encoded = base64.b64encode(f.read()).decode('utf-8')
+    return encoded, f'data:{mime_type};base64,{encoded}'
+
+
+def _measure_memory(func, *args):
+    """
+    返回 (耗时秒, 内存峰值字节数, 调用结束后仍持有的字节数)，由 tracemalloc 统计
+    """
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        retained, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, retained
+
+
+@benchmark_cli.command('encode')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--call-api', is_flag=True, help='同时统计完整识别过程的内存峰值（会消耗API调用次数）')
+def benchmark_encode(paths, call_api):
+    """对比整体编码与分块编码 base64 data URI 的内存峰值"""
+    from flask_app.api.certificate_extractor import CertificateExtractor
+    from flask_app.utils.file_utils import encode_file_base64, get_file_type
+    from flask_app.utils.image_utils import get_image_mime_type
+
+    header = (f"{'文件':<28}{'大小':>10}{'峰值(前/后)':>22}"
+              f"{'请求期间持有(前/后)':>24}{'耗时(前/后)':>18}")
+    if call_api:
+        header += f"{'识别峰值':>12}"
+    click.echo(header)
+
+    for path in paths:
+        file_type = get_file_type(path)
+        mime_type = 'application/pdf' if file_type == 'pdf' else get_image_mime_type(path)
+        inline_time, inline_peak, inline_retained = _measure_memory(_encode_inline, path, mime_type)
+        stream_time, stream_peak, stream_retained = _measure_memory(encode_file_base64, path, mime_type)
+
+        line = (f"{os.path.basename(path)[:26]:<28}{_format_size(os.path.getsize(path)):>10}"
+                f"{_format_size(inline_peak) + '/' + _format_size(stream_peak):>22}"
+                f"{_format_size(inline_retained) + '/' + _format_size(stream_retained):>24}"
+                f"{inline_time * 1000:>10.1f}/{stream_time * 1000:.1f}ms")
+        if call_api:
+            extractor = CertificateExtractor()
+            extract = extractor.extract_from_pdf if file_type == 'pdf' else extractor.extract_from_image
+            _, extract_peak, _ = _measure_memory(extract, path)
+            line += f"{_format_size(extract_peak):>12}"
+        click.echo(line)
+
+
+def _latency_options(func):
+    """模拟服务器的延迟与错误注入参数"""
+    options = [
+        click.option('--latency', type=click.Choice(['fixed', 'uniform', 'lognormal']), default='lognormal',
+                     show_default=True, help='响应延迟分布'),
+        click.option('--median', type=float, default=2.0, show_default=True, help='延迟中位数（秒）'),
+        click.option('--sigma', type=float, default=0.5, show_default=True, help='对数正态分布的对数标准差'),
+        click.option('--error-rate', type=float, default=0.0, show_default=True, help='返回500的比例'),
+        click.option('--rate-limit-rate', type=float, default=0.0, show_default=True, help='返回429的比例'),
+        click.option('--seed', type=int, default=None, help='随机数种子'),
+        click.option('--thinking-factor', type=float, default=3.0, show_default=True,
+                     help='开启思考的请求延迟倍数'),
+        click.option('--fast-miss-rate', type=float, default=0.0, show_default=True,
+                     help='关闭思考时返回不完整结果的比例'),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def _create_fake_server(host, port, latency, median, sigma, error_rate, rate_limit_rate, seed,
+                        thinking_factor, fast_miss_rate):
+    from flask_app.api.fake_glm_server import FakeGLMServer, LatencyModel
+
+    return FakeGLMServer(
+        host=host, port=port,
+        latency=LatencyModel(latency, median=median, sigma=sigma),
+        error_rate=error_rate, rate_limit_rate=rate_limit_rate, seed=seed,
+        thinking_factor=thinking_factor, fast_miss_rate=fast_miss_rate
+    )
+
+
+@benchmark_cli.command('fake-server')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=8765, show_default=True)
+@_latency_options
+def benchmark_fake_server(host, port, latency, median, sigma, error_rate, rate_limit_rate, seed,
+                          thinking_factor, fast_miss_rate):
+    """启动本地模拟GLM接口服务器（配合 AI_BASE_URL 使用）"""
+    server = _create_fake_server(host, port, latency, median, sigma, error_rate, rate_limit_rate, seed,
+                                 thinking_factor, fast_miss_rate)
+    click.echo(f'模拟GLM接口已启动: {server.base_url}')
+    click.echo(f'设置环境变量 AI_BASE_URL={server.base_url} 后启动应用即可使用，Ctrl+C 退出')
+    server.serve_forever()
+    click.echo(f'请求统计: {server.stats}')
+
+
+def _percentile(values, percent):
+    """最近秩法计算百分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _make_sample_files(folder, count, sample=None):
+    """
+    生成压测用的证书文件，每个文件内容不同，避免命中识别缓存
+
+    Returns:
+        list: [(文件路径, MD5)]
+    """
+    from PIL import Image, ImageDraw
+
+    files = []
+    for index in range(count):
+        marker = uuid.uuid4().hex
+        if sample:
+            path = os.path.join(folder, f'{index}_{os.path.basename(sample)}')
+            shutil.copyfile(sample, path)
+            # 在文件末尾追加随机字节，图片与PDF解析时都会忽略
+            with open(path, 'ab') as f:
+                f.write(f'\n%{marker}\n'.encode('ascii'))
+        else:
+            path = os.path.join(folder, f'{index}.jpg')
+            image = Image.new('RGB', (1600, 1130), (255, 255, 255))
+            draw = ImageDraw.Draw(image)
+            draw.rectangle((40, 40, 1560, 1090), outline=(180, 30, 30), width=12)
+            draw.text((200, 500), f'CERTIFICATE {marker}', fill=(0, 0, 0))
+            image.save(path, 'JPEG', quality=90)
+        with open(path, 'rb') as f:
+            files.append((path, hashlib.md5(f.read()).hexdigest()))
+    return files
+
+
+_FILLED_FIELD = re.compile(r'id="competition_name"[^>]*?value="([^"]*)"')
+
+
+def _run_extract_requests(app, user, files, users):
+    """
+    N 个并发用户通过证书上传页面的 extract 操作识别文件
+
+    Returns:
+        tuple: ([(耗时秒, 是否成功)], 总耗时秒)
+    """
+    from flask import url_for
+
+    with app.test_request_context():
+        url = url_for('cert_upload.index')
+
+    lock = threading.Lock()
+    pending = list(files)
+    results = []
+
+    def run_user():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = user.get_id()
+            session['_fresh'] = True
+        while True:
+            with lock:
+                if not pending:
+                    return
+                file_path, file_md5 = pending.pop()
+            started = time.perf_counter()
+            response = client.post(url, data={'action': 'extract', 'file_path': file_path, 'file_md5': file_md5})
+            elapsed = time.perf_counter() - started
+            # 识别成功时竞赛名称输入框会被填充
+            match = _FILLED_FIELD.search(response.get_data(as_text=True))
+            ok = response.status_code == 200 and bool(match and match.group(1).strip())
+            with lock:
+                results.append((elapsed, ok))
+
+    threads = [threading.Thread(target=run_user) for _ in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+@benchmark_cli.command('extract')
+@click.option('--users', type=int, default=4, show_default=True, help='并发用户数')
+@click.option('--requests', 'total', type=int, default=20, show_default=True, help='识别请求总数')
+@click.option('--account', default=None, help='发起请求的管理员账号，默认第一个管理员')
+@click.option('--file', 'sample', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='样例证书文件，默认生成合成图片')
+@click.option('--base-url', default=None, help='使用已启动的模拟服务器地址')
+@click.option('--real', is_flag=True, help='调用配置中的真实接口（会消耗API调用次数）')
+@click.option('--thinking', type=click.Choice(['auto', 'disabled', 'enabled']), default=None,
+              help='思考模式（未单独设置思考模式的密钥生效），默认使用系统配置')
+@_latency_options
+def benchmark_extract(users, total, account, sample, base_url, real, thinking,
+                      latency, median, sigma, error_rate, rate_limit_rate, seed, thinking_factor, fast_miss_rate):
+    """端到端识别压测：统计吞吐量与 p50/p95/p99 延迟"""
+    from flask_app.models import User
+    from flask_app.services.api_key_pool import api_key_pool
+
+    app = current_app._get_current_object()
+    if account:
+        user = User.query.filter_by(account_id=account).first()
+    else:
+        user = User.query.filter_by(role='admin').order_by(User.created_at).first()
+    if user is None:
+        click.echo('未找到发起请求的账号')
+        return
+    api_key_pool.load()
+    if not api_key_pool.stats():
+        click.echo('没有可用的API密钥，请先在后台添加（使用模拟服务器时密钥内容任意）')
+        return
+
+    server = None
+    if not real and not base_url:
+        server = _create_fake_server('127.0.0.1', 0, latency, median, sigma, error_rate, rate_limit_rate, seed,
+                                     thinking_factor, fast_miss_rate)
+        server.start()
+        base_url = server.base_url
+
+    config = app.config
+    saved = {k: config.get(k) for k in ('AI_BASE_URL', 'WTF_CSRF_ENABLED', 'AI_THINKING_MODE')}
+    if not real:
+        config['AI_BASE_URL'] = base_url
+    if thinking:
+        config['AI_THINKING_MODE'] = thinking
+    # 压测客户端直接提交表单，不经过页面获取CSRF令牌
+    config['WTF_CSRF_ENABLED'] = False
+
+    folder = tempfile.mkdtemp(prefix='extract_benchmark_')
+    try:
+        files = _make_sample_files(folder, total, sample)
+        click.echo(f"{'真实接口' if real else '模拟接口 ' + base_url}，{users} 个并发用户，{total} 个请求，"
+                   f"思考模式 {config.get('AI_THINKING_MODE')}")
+        results, wall_time = _run_extract_requests(app, user, files, users)
+    finally:
+        for key, value in saved.items():
+            config[key] = value
+        shutil.rmtree(folder, ignore_errors=True)
+        if server is not None:
+            server.stop()
+
+    latencies = [elapsed for elapsed, _ in results]
+    succeeded = sum(1 for _, ok in results if ok)
+    click.echo(f'成功 {succeeded}/{len(results)}，总耗时 {wall_time:.2f}s，吞吐量 {len(results) / wall_time:.2f} 请求/秒')
+    click.echo(f'延迟 p50 {_percentile(latencies, 50):.2f}s  p95 {_percentile(latencies, 95):.2f}s  '
+               f'p99 {_percentile(latencies, 99):.2f}s  最大 {max(latencies):.2f}s  '
+               f'平均 {statistics.mean(latencies):.2f}s')
+    if server is not None:
+        stats = server.stats
+        click.echo(f"模拟接口收到 {stats['requests']} 个请求：成功 {stats['ok']}，500 {stats['errors']}，"
+                   f"429 {stats['rate_limited']}，开启思考 {stats['thinking']}，最大并发 {stats['max_in_flight']}")
+
+
+class _FakeUpstream:
+    """模拟AI接口：记录调用次数，等待指定时间后返回结果或抛出异常"""
+
+    def __init__(self, delay, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'student_name': '张三'}
+
+
+def _run_flight_threads(callers, upstream, timeout):
+    """
+    多个线程同时以同一 key 调用 SingleFlight
+
+    Returns:
+        list: 每个调用方的 (结果, 是否共享结果, 异常)
+    """
+    from flask_app.services.single_flight import SingleFlight
+
+    flights = SingleFlight()
+    barrier = threading.Barrier(callers)
+    lock = threading.Lock()
+    outcomes = []
+
+    def run():
+        barrier.wait()
+        try:
+            result, shared = flights.do('benchmark', upstream, timeout=timeout)
+            outcome = (result, shared, None)
+        except Exception as e:
+            outcome = (None, False, e)
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=run) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if flights.in_flight():
+        raise click.ClickException('调用结束后仍有未清理的合并请求')
+    return outcomes
+
+
+def _flight_process(lock_folder, cache_path, calls_path, delay, start):
+    """
+    子进程：与 extract_certificate_info 相同，加文件锁后先查缓存，未命中时调用接口并写入缓存
+
+    调用接口的进程把自己的进程号追加到 calls_path，由父进程统计调用次数。
+    """
+    from flask import Flask
+    from flask_app.services.single_flight import file_lock
+
+    app = Flask(__name__)
+    app.config['AI_LOCK_FOLDER'] = lock_folder
+    start.wait()
+    with app.app_context():
+        with file_lock('benchmark', timeout=delay * 50):
+            if os.path.exists(cache_path):
+                return
+            with open(calls_path, 'a', encoding='utf-8') as f:
+                f.write(f'{os.getpid()}\n')
+            time.sleep(delay)
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                f.write('张三')
+
+
+@benchmark_cli.command('single-flight')
+@click.option('--callers', type=int, default=16, show_default=True, help='同一进程内的并发调用方数')
+@click.option('--processes', type=int, default=4, show_default=True, help='并发进程数（0 表示不测试跨进程）')
+@click.option('--delay', type=float, default=0.2, show_default=True, help='模拟接口耗时（秒）')
+def benchmark_single_flight(callers, processes, delay):
+    """相同识别请求合并的并发检查：N 个调用方只调用一次接口，接口异常传递给全部等待方"""
+    failures = []
+
+    upstream = _FakeUpstream(delay)
+    started = time.perf_counter()
+    outcomes = _run_flight_threads(callers, upstream, timeout=delay * 50)
+    elapsed = time.perf_counter() - started
+    errors = [error for _, _, error in outcomes if error is not None]
+    shared = sum(1 for _, is_shared, _ in outcomes if is_shared)
+    click.echo(f'线程：{callers} 个调用方，接口调用 {upstream.calls} 次，共享结果 {shared} 个，耗时 {elapsed:.2f}s')
+    if upstream.calls != 1:
+        failures.append(f'线程并发时接口调用了 {upstream.calls} 次，应为 1 次')
+    if errors or shared != callers - 1 or any(result != {'student_name': '张三'} for result, _, _ in outcomes):
+        failures.append('线程并发时部分调用方没有得到 leader 的结果')
+
+    leader_error = RuntimeError('模拟接口返回500')
+    upstream = _FakeUpstream(delay, error=leader_error)
+    outcomes = _run_flight_threads(callers, upstream, timeout=delay * 50)
+    propagated = sum(1 for _, _, error in outcomes if error is leader_error)
+    click.echo(f'线程（接口出错）：{callers} 个调用方，接口调用 {upstream.calls} 次，收到 leader 异常 {propagated} 个')
+    if upstream.calls != 1:
+        failures.append(f'接口出错时调用了 {upstream.calls} 次，应为 1 次')
+    if propagated != callers:
+        failures.append(f'leader 的异常只传递给了 {propagated}/{callers} 个调用方')
+
+    if processes:
+        folder = tempfile.mkdtemp(prefix='single_flight_')
+        try:
+            cache_path = os.path.join(folder, 'cache')
+            calls_path = os.path.join(folder, 'calls')
+            lock_folder = os.path.join(folder, 'locks')
+            start = multiprocessing.Event()
+            workers = [
+                multiprocessing.Process(
+                    target=_flight_process, args=(lock_folder, cache_path, calls_path, delay, start)
+                ) for _ in range(processes)
+            ]
+            for worker in workers:
+                worker.start()
+            started = time.perf_counter()
+            start.set()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+            calls = 0
+            if os.path.exists(calls_path):
+                with open(calls_path, encoding='utf-8') as f:
+                    calls = len(f.read().split())
+            crashed = sum(1 for worker in workers if worker.exitcode != 0)
+            locks_left = os.listdir(lock_folder) if os.path.isdir(lock_folder) else []
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        click.echo(f'进程：{processes} 个进程，接口调用 {calls} 次，异常退出 {crashed} 个，耗时 {elapsed:.2f}s')
+        if calls != 1:
+            failures.append(f'跨进程并发时接口调用了 {calls} 次，应为 1 次')
+        if crashed:
+            failures.append(f'{crashed} 个进程异常退出')
+        if locks_left:
+            failures.append(f'残留 {len(locks_left)} 个锁文件')
+
+    if failures:
+        raise click.ClickException('；'.join(failures))
+    click.echo('检查通过')
+
+
+def _sample_responses():
+    """内置的模型回复样例，覆盖常见的格式问题"""
+    from flask_app.api.fake_glm_server import FAKE_CERTIFICATE
+
+    body = json.dumps(FAKE_CERTIFICATE, ensure_ascii=False, indent=2)
+    thinking = ('我先观察证书的版式，标题写着{荣誉证书}，下方是获奖者信息。'
+                '需要注意日期格式为 YYYY-MM-DD，若只有年月则取一号。' * 40)
+    with_list = dict(FAKE_CERTIFICATE, advisor=['张老师', '李老师'])
+    return [
+        body,
+        f'```json\n{body}\n```',
+        f'{thinking}\n\n```json\n{body}\n```',
+        f'根据证书内容，提取结果如下：\n{body}\n以上信息仅供参考。',
+        body.replace('"测试教师"', '"测试教师",'),
+        json.dumps({'certificate': FAKE_CERTIFICATE}, ensure_ascii=False),
+        json.dumps(with_list, ensure_ascii=False),
+        f'{thinking}\n{{"note": "示例"}}\n{body}',
+    ]
+
+
+def _legacy_parse(message):
+    """改造前的解析方式：正则提取代码块后整体 json.loads"""
+    json_match = re.search(r'```json\s*([\s\S]*?)\s*```', message)
+    json_str = json_match.group(1) if json_match else message
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        return None
+
+
+def _load_responses(paths):
+    """读取录制的回复语料（AI_RESPONSE_RECORD_FOLDER 中的文本文件）"""
+    responses = []
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names)]
+        for file_path in files:
+            with open(file_path, encoding='utf-8') as f:
+                responses.append(f.read())
+    return responses
+
+
+def _time_parser(parse, responses, rounds):
+    """返回 (成功解析数, 每次解析平均耗时微秒)"""
+    succeeded = sum(1 for text in responses if parse(text))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in responses:
+            parse(text)
+    elapsed = time.perf_counter() - started
+    return succeeded, elapsed / (rounds * len(responses)) * 1e6
+
+
+@benchmark_cli.command('parse')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True))
+@click.option('--rounds', type=int, default=200, show_default=True, help='重复解析轮数')
+def benchmark_parse(paths, rounds):
+    """对比新旧响应解析的成功率与耗时，默认使用内置样例"""
+    from flask_app.api.response_parser import find_json_object, normalize_result
+
+    responses = _load_responses(paths) if paths else _sample_responses()
+    if not responses:
+        click.echo('没有可用的回复语料')
+        return
+
+    def parse(text):
+        data = find_json_object(text)
+        return normalize_result(data) if data is not None else None
+
+    legacy_ok, legacy_us = _time_parser(_legacy_parse, responses, rounds)
+    find_ok, find_us = _time_parser(find_json_object, responses, rounds)
+    new_ok, new_us = _time_parser(parse, responses, rounds)
+    click.echo(f'共 {len(responses)} 条回复，平均 {statistics.mean(len(t) for t in responses):.0f} 字符')
+    click.echo(f"{'解析方式':<16}{'成功':>8}{'平均耗时':>14}")
+    click.echo(f"{'改造前':<16}{legacy_ok:>6}/{len(responses)}{legacy_us:>12.1f}us")
+    click.echo(f"{'改造后(查找JSON)':<16}{find_ok:>6}/{len(responses)}{find_us:>12.1f}us")
+    click.echo(f"{'改造后(含字段整理)':<16}{new_ok:>6}/{len(responses)}{new_us:>12.1f}us")
+
+
+def _schedule_scenario(rand, departments, bulk, other_bulk, reprocess, interactive, duration):
+    """
+    生成模拟的任务到达序列：第一个学院开始时提交大批量上传，其他学院稍后提交小批量，
+    管理员同时重新识别历史证书，学生的单张上传在整个时段内随机到达
+
+    Returns:
+        list: [(到达秒数, 任务类别, 学院, 角色), ...]，按到达时间排序
+    """
+    from flask_app.services.extraction_scheduler import CLASS_BULK, CLASS_INTERACTIVE, CLASS_REPROCESS
+
+    names = [f'学院{i + 1}' for i in range(departments)]
+    arrivals = [(0.0, CLASS_BULK, names[0], 'secretary') for _ in range(bulk)]
+    for index, name in enumerate(names[1:], start=1):
+        arrivals += [(index * 30.0, CLASS_BULK, name, 'secretary') for _ in range(other_bulk)]
+    arrivals += [(0.0, CLASS_REPROCESS, None, 'admin') for _ in range(reprocess)]
+    arrivals += [(rand.uniform(0, duration), CLASS_INTERACTIVE, rand.choice(names), 'student')
+                 for _ in range(interactive)]
+    return sorted(arrivals, key=lambda item: item[0])
+
+
+def _simulate_schedule(arrivals, policy, workers, bulk_limit, latency, config, deadline_hours):
+    """
+    离散事件模拟识别队列，排队与领取规则与 ExtractionJobService.claim_next 相同
+
+    Args:
+        policy: priority 使用 extraction_scheduler 的优先级与学院公平调度，fifo 为改造前的先到先得
+        latency: 每个任务的识别耗时分布（与模拟GLM接口相同的 LatencyModel）
+
+    Returns:
+        list: 已完成的任务 [{'job_class', 'department', 'wait', 'finished'}, ...]
+    """
+    from flask_app.services.extraction_scheduler import (
+        CLASS_INTERACTIVE, ExtractionScheduler, QueueGroup, SimulatedClock
+    )
+
+    clock = SimulatedClock()
+    start = clock.now()
+    scheduler = ExtractionScheduler(clock=clock, config=config)
+    deadline = start + timedelta(hours=deadline_hours)
+    pending = list(arrivals)
+    queue, running, finished = [], [], []
+    sequence = 0
+
+    def pick():
+        running_bulk = sum(1 for _, _, job in running if job['job_class'] != CLASS_INTERACTIVE)
+        eligible = [job for job in queue
+                    if running_bulk < bulk_limit or job['job_class'] == CLASS_INTERACTIVE]
+        if not eligible:
+            return None
+        if policy == 'fifo':
+            return min(eligible, key=lambda job: job['seq'])
+        groups = {}
+        for job in eligible:
+            key = (job['priority'], job['department'])
+            oldest, count = groups.get(key, (job['created_at'], 0))
+            groups[key] = (min(oldest, job['created_at']), count + 1)
+        by_department = {}
+        for _, _, job in running:
+            by_department[job['department']] = by_department.get(job['department'], 0) + 1
+        group = scheduler.choose([QueueGroup(p, d, oldest, count) for (p, d), (oldest, count) in groups.items()],
+                                 by_department)
+        return min((job for job in eligible
+                    if job['priority'] == group.priority and job['department'] == group.department),
+                   key=lambda job: job['seq'])
+
+    while pending or queue or running:
+        now = clock.now()
+        while pending and start + timedelta(seconds=pending[0][0]) <= now:
+            _, job_class, department, role = pending.pop(0)
+            queue.append({'seq': sequence, 'job_class': job_class, 'department': department, 'created_at': now,
+                          'priority': scheduler.priority_for(job_class, role=role, deadline=deadline)})
+            sequence += 1
+        while len(running) < workers:
+            job = pick()
+            if job is None:
+                break
+            queue.remove(job)
+            job['wait'] = (now - job['created_at']).total_seconds()
+            heapq.heappush(running, (now + timedelta(seconds=latency.sample()), job['seq'], job))
+
+        next_times = [finish for finish, _, _ in running[:1]]
+        if pending:
+            next_times.append(start + timedelta(seconds=pending[0][0]))
+        if not next_times:
+            break
+        clock.set(min(next_times))
+        while running and running[0][0] <= clock.now():
+            _, _, job = heapq.heappop(running)
+            job['finished'] = (clock.now() - start).total_seconds()
+            finished.append(job)
+    return finished
+
+
+def _wait_summary(jobs):
+    waits = [job['wait'] for job in jobs]
+    return (f"{len(waits):>6}{_percentile(waits, 50):>10.1f}{_percentile(waits, 95):>10.1f}"
+            f"{max(waits):>10.1f}")
+
+
+@benchmark_cli.command('schedule')
+@click.option('--policy', type=click.Choice(['priority', 'fifo', 'both']), default='both', show_default=True,
+              help='调度策略，both 依次模拟两种策略便于对比')
+@click.option('--workers', type=int, default=None, help='识别工作线程数，默认 EXTRACTION_WORKER_COUNT')
+@click.option('--departments', type=int, default=4, show_default=True, help='学院数')
+@click.option('--bulk', type=int, default=200, show_default=True, help='第一个学院批量上传的证书数')
+@click.option('--other-bulk', type=int, default=20, show_default=True, help='其他学院各自批量上传的证书数')
+@click.option('--reprocess', type=int, default=100, show_default=True, help='管理员重新识别的证书数')
+@click.option('--interactive', type=int, default=60, show_default=True, help='学生单张上传的证书数')
+@click.option('--duration', type=float, default=600, show_default=True, help='单张上传到达的时间范围（秒）')
+@click.option('--deadline-hours', type=float, default=12, show_default=True, help='模拟开始时距提交截止的小时数')
+@click.option('--latency', type=click.Choice(['fixed', 'uniform', 'lognormal']), default='lognormal',
+              show_default=True, help='识别耗时分布')
+@click.option('--median', type=float, default=2.0, show_default=True, help='识别耗时中位数（秒）')
+@click.option('--sigma', type=float, default=0.5, show_default=True, help='对数正态分布的对数标准差')
+@click.option('--seed', type=int, default=1, show_default=True, help='随机数种子')
+def benchmark_schedule(policy, workers, departments, bulk, other_bulk, reprocess, interactive, duration,
+                       deadline_hours, latency, median, sigma, seed):
+    """用模拟时钟模拟识别队列调度，对比各类任务与各学院的排队时间"""
+    from flask_app.api.fake_glm_server import LatencyModel
+    from flask_app.services.extraction_scheduler import CLASS_BULK, JOB_CLASSES
+
+    config = current_app.config
+    workers = workers or config.get('EXTRACTION_WORKER_COUNT', 4)
+    bulk_limit = config.get('BULK_EXTRACTION_CONCURRENCY', 3)
+    arrivals = _schedule_scenario(random.Random(seed), max(1, departments), bulk, other_bulk, reprocess,
+                                  interactive, duration)
+    click.echo(f'{len(arrivals)} 个任务，{workers} 个工作线程（批量任务最多 {bulk_limit} 个），'
+               f'识别耗时 {latency} 中位数 {median}s，距截止 {deadline_hours} 小时')
+
+    for name in (['priority', 'fifo'] if policy == 'both' else [policy]):
+        model = LatencyModel(latency, median=median, sigma=sigma, rand=random.Random(seed))
+        jobs = _simulate_schedule(arrivals, name, workers, bulk_limit, model, config, deadline_hours)
+        click.echo(f"\n[{name}] 全部完成用时 {max(job['finished'] for job in jobs):.1f}s")
+        click.echo(f"{'任务类别':<14}{'数量':>6}{'p50等待':>10}{'p95等待':>10}{'最大等待':>10}")
+        for job_class in JOB_CLASSES:
+            selected = [job for job in jobs if job['job_class'] == job_class]
+            if selected:
+                click.echo(f'{job_class:<14}{_wait_summary(selected)}')
+        click.echo('按学院（批量上传）:')
+        for department in sorted({job['department'] for job in jobs if job['department']}):
+            selected = [job for job in jobs
+                        if job['department'] == department and job['job_class'] == CLASS_BULK]
+            if selected:
+                click.echo(f'{department:<14}{_wait_summary(selected)}')
+
+
+def _reextract_batch(run, certs, concurrency, poll_interval, yield_to_interactive):
+    """
+    重新识别一批证书，同时排队的任务不超过 concurrency 个
+
+    有单张上传的任务在排队时暂停提交新任务，把工作线程让给用户。
+
+    Returns:
+        list: [(证书, 识别结果)]，顺序与 certs 相同
+    """
+    from flask_app import db
+    from flask_app.services.extraction_job_service import ExtractionJobService
+    from flask_app.services.extraction_scheduler import CLASS_INTERACTIVE
+    from flask_app.services.reextraction_service import ReextractionService
+
+    pending = list(certs)
+    outstanding = {}  # job_id -> cert_id
+    results = {}
+    while pending or outstanding:
+        while pending and len(outstanding) < concurrency:
+            if yield_to_interactive and ExtractionJobService.count_queued(CLASS_INTERACTIVE):
+                break
+            cert = pending.pop(0)
+            job = ReextractionService.enqueue(run, cert)
+            if job is None:
+                results[cert.cert_id] = None
+            else:
+                outstanding[job.job_id] = cert.cert_id
+        if not outstanding and not pending:
+            break
+        time.sleep(poll_interval)
+        for job_id, result in ReextractionService.poll_results(outstanding).items():
+            results[outstanding.pop(job_id)] = result
+        db.session.rollback()  # 结束读事务，下次查询能看到工作线程提交的结果
+    return [(cert, results.get(cert.cert_id)) for cert in certs]
+
+
+@reextract_cli.command('run')
+@click.option('--status', default=None, help='只识别该状态的证书，如 approved')
+@click.option('--department', default=None, help='只识别该学院的证书')
+@click.option('--since', default=None, help='只识别该日期（YYYY-MM-DD）之后提交的证书')
+@click.option('--resume', 'resume_id', default=None, help='从断点继续之前中断的任务')
+@click.option('--account', default=None, help='发起识别的管理员账号，默认第一个管理员')
+@click.option('--batch-size', type=int, default=50, show_default=True, help='每批读取的证书数，每批结束后保存断点')
+@click.option('--concurrency', type=int, default=2, show_default=True, help='同时排队或识别的任务数')
+@click.option('--poll-interval', type=float, default=1.0, show_default=True, help='查询任务结果的间隔（秒）')
+@click.option('--no-yield', is_flag=True, help='有单张上传排队时也继续提交任务')
+@click.option('--local', is_flag=True, help='在本进程中启动识别工作线程（应用未运行后台识别时使用）')
+def reextract_run(status, department, since, resume_id, account, batch_size, concurrency, poll_interval,
+                  no_yield, local):
+    """按当前提示词重新识别历史证书，将不一致的字段写入对比表（不修改证书）"""
+    from flask_app import db
+    from flask_app.api.certificate_extractor import CertificateExtractor
+    from flask_app.models import ReextractionRun, User
+    from flask_app.services.extraction_worker import extraction_workers
+    from flask_app.services.reextraction_service import ReextractionService
+
+    if resume_id:
+        run = ReextractionService.get_run(resume_id)
+        if run is None:
+            click.echo(f'重新识别任务不存在: {resume_id}')
+            return
+        if run.status == ReextractionRun.STATUS_DONE:
+            click.echo('该任务已完成')
+            return
+        run.status = ReextractionRun.STATUS_RUNNING
+        db.session.commit()
+    else:
+        if since:
+            try:
+                datetime.strptime(since, '%Y-%m-%d')
+            except ValueError:
+                click.echo('--since 格式应为 YYYY-MM-DD')
+                return
+        if account:
+            user = User.query.filter_by(account_id=account, role='admin').first()
+        else:
+            user = User.query.filter_by(role='admin').order_by(User.created_at).first()
+        if user is None:
+            click.echo('未找到发起识别的管理员账号')
+            return
+        run = ReextractionService.start_run(
+            user.user_id, {'status': status, 'department': department, 'since': since},
+            prompt=CertificateExtractor()._get_prompt()
+        )
+    click.echo(f'重新识别任务 {run.run_id}：共 {run.total} 个证书，已处理 {run.processed}')
+
+    app = current_app._get_current_object()
+    if local:
+        extraction_workers.start(app)
+    try:
+        while True:
+            certs = ReextractionService.next_batch(run, batch_size)
+            if not certs:
+                ReextractionService.finish(run)
+                break
+            outcomes = _reextract_batch(run, certs, max(1, concurrency), poll_interval, not no_yield)
+            ReextractionService.record_batch(run, outcomes)
+            click.echo(f'已处理 {run.processed}/{run.total}，不一致 {run.changed}，失败 {run.failed}')
+    except KeyboardInterrupt:
+        ReextractionService.finish(run, ReextractionRun.STATUS_STOPPED)
+        click.echo(f'已中断，使用 --resume {run.run_id} 从断点继续')
+        return
+    finally:
+        if local:
+            extraction_workers.stop(timeout=5)
+    click.echo(f'完成：不一致 {run.changed}，失败 {run.failed}；查看对比结果: flask reextract show {run.run_id}')
+
+
+@reextract_cli.command('list')
+@click.option('--limit', type=int, default=20, show_default=True)
+def reextract_list(limit):
+    """列出重新识别任务"""
+    from flask_app.models import ReextractionRun
+
+    runs = ReextractionRun.query.order_by(ReextractionRun.started_at.desc()).limit(limit).all()
+    if not runs:
+        click.echo('暂无重新识别任务')
+        return
+    for run in runs:
+        click.echo(f"{run.run_id}  {run.started_at:%Y-%m-%d %H:%M}  {run.status_display:<4}  "
+                   f"{run.processed}/{run.total}  不一致 {run.changed}  失败 {run.failed}  {run.filters or ''}")
+
+
+@reextract_cli.command('show')
+@click.argument('run_id')
+@click.option('--field', default=None, help='只显示该字段')
+@click.option('--limit', type=int, default=50, show_default=True, help='最多显示的不一致记录数')
+def reextract_show(run_id, field, limit):
+    """显示重新识别任务的对比结果"""
+    from flask_app.models import ReextractionDiff
+    from flask_app.services.reextraction_service import ReextractionService
+
+    run = ReextractionService.get_run(run_id)
+    if run is None:
+        click.echo(f'重新识别任务不存在: {run_id}')
+        return
+    click.echo(f'{run.status_display}，已处理 {run.processed}/{run.total}，不一致 {run.changed}，失败 {run.failed}')
+    for name, count in ReextractionService.field_summary(run_id):
+        click.echo(f'  {name:<18}{count:>6}')
+
+    query = ReextractionDiff.query.filter_by(run_id=run_id)
+    if field:
+        query = query.filter_by(field=field)
+    for diff in query.order_by(ReextractionDiff.diff_id.asc()).limit(limit).all():
+        click.echo(f'{diff.cert_id}  {diff.field}: {diff.current_value!r} -> {diff.new_value!r}')
+
+
+@blobs_cli.command('migrate')
+@click.option('--dry-run', is_flag=True, help='只统计需要迁移的文件，不做修改')
+def blobs_migrate(dry_run):
+    """将旧目录结构中的证书文件迁入按内容存放的存储，相同内容只保留一份"""
+    from flask_app.services.blob_store import blob_store
+
+    summary = blob_store.migrate(dry_run=dry_run)
+    click.echo(f"{'需要迁移' if dry_run else '已迁移'} {summary['migrated']} 个文件，"
+               f"其中与已有内容重复 {summary['deduplicated']} 个（释放 {_format_size(summary['freed_bytes'])}），"
+               f"文件不存在 {summary['missing']} 个")
+    if not dry_run:
+        click.echo(f'修正引用数 {blob_store.recount()} 个')
+
+
+@blobs_cli.command('gc')
+@click.option('--grace-hours', type=float, default=24, show_default=True,
+              help='只删除超过此时间未被引用的文件，避免删除刚上传的文件')
+@click.option('--dry-run', is_flag=True, help='只统计可删除的文件')
+def blobs_gc(grace_hours, dry_run):
+    """删除不再被证书或上传记录引用的文件，以及过期的分片上传"""
+    from flask_app.services.blob_store import blob_store
+    from flask_app.services.chunked_upload_service import ChunkedUploadService
+
+    if not dry_run:
+        click.echo(f'删除过期的分片上传 {ChunkedUploadService.sweep()} 个')
+    removed, freed = blob_store.gc(grace_hours=grace_hours, dry_run=dry_run)
+    click.echo(f"{'可删除' if dry_run else '已删除'} {removed} 个文件，释放 {_format_size(freed)}")
+
+
+@blobs_cli.command('stats')
+@click.option('--recount', is_flag=True, help='先按 File 与 Certificate 记录重新计算引用数')
+def blobs_stats(recount):
+    """显示文件存储统计"""
+    from flask_app.services.blob_store import blob_store
+
+    if recount:
+        click.echo(f'修正引用数 {blob_store.recount()} 个')
+    stats = blob_store.stats()
+    click.echo(f"{stats['blobs']} 个文件，共 {_format_size(stats['bytes'])}，被引用 {stats['references']} 次，"
+               f"未被引用 {stats['unreferenced']} 个，去重节省 {_format_size(stats['saved_bytes'])}")
+
+
+def register_commands(app):
+    """注册命令行工具"""
+    app.cli.add_command(benchmark_cli)
+    app.cli.add_command(reextract_cli)
+    app.cli.add_command(blobs_cli)
@@ -32,6 +32,106 @@ class Config:
     FILES_FOLDER = os.path.join(BASE_DIR, 'file')
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 最大10MB
     ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png', 'bmp'}
+    UPLOAD_PRECHECK_ENABLED = True  # 上传前由浏览器计算MD5，任何用户上传过的相同文件不再上传内容（秒传）
+    UPLOAD_PRECHECK_TTL = 300  # 秒传校验的有效时间（秒）
+    UPLOAD_CHUNKED_ENABLED = True  # 浏览器分片上传，网络中断后从已上传的位置继续
+    UPLOAD_CHUNK_SIZE = 2 * 1024 * 1024  # 单个分片的最大字节数（须小于 MAX_CONTENT_LENGTH）
+    UPLOAD_CHUNKED_MAX_BYTES = 100 * 1024 * 1024  # 分片上传的文件大小上限（100MB）
+    UPLOAD_SESSION_TTL_HOURS = 24  # 上传会话无进展超过此时间后删除临时文件（小时）
+    UPLOAD_SESSION_MAX_ACTIVE_PER_USER = 5  # 每个用户未完成的上传会话上限，0 表示不限制
+    
+    # 证书缩略图配置（首次请求时生成）
+    THUMBNAIL_SIZES = {'thumb': 240, 'preview': 1024}  # 缩略图最长边像素：列表页用 thumb，详情页用 preview
+    THUMBNAIL_FORMAT = 'WEBP'  # 缩略图格式：WEBP 或 JPEG（Pillow 不支持 WebP 时自动使用 JPEG）
+    THUMBNAIL_QUALITY = 80  # 缩略图压缩质量
+    THUMBNAIL_CACHE_FOLDER = os.path.join(BASE_DIR, 'cache', 'thumbnails')  # 缩略图缓存目录
+    
+    # AI 客户端连接池配置
+    AI_CLIENT_POOL_SIZE = int(os.environ.get('AI_CLIENT_POOL_SIZE', 10))  # 每个密钥的最大连接数
+    AI_CLIENT_IDLE_TIMEOUT = int(os.environ.get('AI_CLIENT_IDLE_TIMEOUT', 300))  # 空闲客户端回收时间（秒）
+    AI_BASE_URL = os.environ.get('AI_BASE_URL') or None  # 接口地址，为空时使用SDK默认地址（压测时指向本地模拟服务器）
+    AI_SDK_MAX_RETRIES = 0  # SDK内置重试次数，重试由 AI_RETRY_* 策略负责
+    AI_RESPONSE_RECORD_FOLDER = os.environ.get('AI_RESPONSE_RECORD_FOLDER') or None  # 保存模型回复原文的目录（用于解析基准测试）
+    AI_CALL_LOG_ENABLED = True  # 记录每次接口调用的耗时与token用量
+    AI_CALL_LOG_FLUSH_INTERVAL = 10  # 调用记录写入数据库的间隔（秒）
+    AI_CALL_LOG_FLUSH_THRESHOLD = 50  # 累计多少条记录后立即写入
+    AI_CALL_LOG_MAX_BUFFER = 10000  # 数据库不可用时最多缓冲的记录数
+    
+    # API 密钥池配置
+    API_KEY_POOL_RELOAD_INTERVAL = 60  # 从数据库重新加载密钥的间隔（秒）
+    API_KEY_USAGE_FLUSH_INTERVAL = 10  # 调用次数写回数据库的间隔（秒）
+    API_KEY_USAGE_FLUSH_THRESHOLD = 20  # 累计多少次调用后立即写回
+    
+    # API 密钥限流配置（密钥未单独设置时使用）
+    AI_KEY_DEFAULT_RPS = 2  # 每个密钥每秒最大调用次数
+    AI_KEY_DEFAULT_MAX_CONCURRENCY = 5  # 每个密钥最大并发调用数
+    
+    # AI 识别模型与思考模式（密钥未单独设置时使用）
+    AI_THINKING_MODE = 'auto'  # auto：先关闭思考快速识别，必填字段缺失时再开启思考重新识别；disabled：关闭；enabled：开启
+    AI_MAX_TOKENS = None  # 单次回复最大token数，为空时使用接口默认值
+    AI_REQUEST_TIMEOUT = 120  # 单次请求超时（秒）
+    AI_ESCALATION_REQUIRED_FIELDS = ['student_name', 'competition_name', 'award_level']  # auto 模式下缺少这些字段时开启思考
+    AI_RATE_LIMIT_TIMEOUT = 60  # 排队等待的最长时间（秒）
+    
+    # AI 调用重试与熔断配置
+    AI_RETRY_MAX_ATTEMPTS = 3  # 每次识别最多尝试次数（含首次）
+    AI_RETRY_BASE_DELAY = 1.0  # 退避基础等待时间（秒），每次重试翻倍并加随机抖动
+    AI_RETRY_MAX_DELAY = 20.0  # 单次退避最长等待时间（秒）
+    AI_CIRCUIT_FAILURE_THRESHOLD = 5  # 密钥连续失败多少次后熔断
+    AI_CIRCUIT_COOLDOWN = 60  # 熔断冷却时间（秒）
+    
+    # AI 识别图片预处理配置
+    AI_IMAGE_PREPROCESS_ENABLED = True  # 识别前校正方向、缩放并重新压缩图片
+    AI_IMAGE_MAX_EDGE = 2048  # 最长边像素
+    AI_IMAGE_FORMAT = 'JPEG'  # 输出格式：JPEG 或 WEBP
+    AI_IMAGE_QUALITY = 85  # 压缩质量
+    AI_IMAGE_GRAYSCALE = False  # 是否转为灰度图
+    AI_IMAGE_CACHE_FOLDER = os.path.join(BASE_DIR, 'cache', 'ai_images')  # 派生图缓存目录
+    
+    # PDF 证书渲染配置（需要 PyMuPDF）
+    AI_PDF_RASTERIZE_ENABLED = True  # 识别前在本地将PDF渲染为图片
+    AI_PDF_DPI = 150  # 渲染分辨率
+    AI_PDF_PAGES = 'first'  # first：只渲染第一页；all：多页拼接为一张图片
+    AI_PDF_MAX_PAGES = 4  # all 模式下最多拼接的页数
+    
+    # PDF 文本层提取配置（电子证书无需调用视觉模型）
+    AI_TEXT_LAYER_ENABLED = True  # 识别前先读取PDF文本层按规则提取
+    AI_TEXT_LAYER_MIN_CHARS = 20  # 文本层少于此字符数视为扫描件
+    AI_TEXT_LAYER_REQUIRED_FIELDS = ['student_name', 'competition_name', 'award_level', 'award_date']  # 均提取到时跳过视觉模型
+    
+    # AI 识别结果缓存配置
+    EXTRACTION_CACHE_TTL_DAYS = 30  # 缓存有效期（天）
+    EXTRACTION_CACHE_MAX_ENTRIES = 5000  # 数据库缓存最大条数
+    EXTRACTION_CACHE_MEMORY_SIZE = 256  # 内存LRU最大条数
+    EXTRACTION_CACHE_HIT_FLUSH_INTERVAL = 30  # 命中次数与最近命中时间写回数据库的间隔（秒）
+    EXTRACTION_CACHE_EVICT_INTERVAL = 600  # 按有效期与容量淘汰缓存的间隔（秒）
+    EXTRACTION_CACHE_SYNC_INTERVAL = 5  # 检查其他进程是否清除了缓存的间隔（秒）
+    AI_SINGLE_FLIGHT_TIMEOUT = 300  # 等待相同识别请求结果的最长时间（秒）
+    AI_LOCK_FOLDER = os.path.join(BASE_DIR, 'cache', 'locks')  # 跨进程识别锁目录
+    
+    # AI 识别后台任务配置
+    EXTRACTION_WORKERS_ENABLED = True  # 是否随应用启动后台识别线程
+    EXTRACTION_WORKER_COUNT = int(os.environ.get('EXTRACTION_WORKER_COUNT', 4))  # 每个进程的工作线程数
+    EXTRACTION_JOB_POLL_INTERVAL = 2  # 空闲时轮询任务表的间隔（秒）
+    EXTRACTION_JOB_TIMEOUT = 300  # 运行超过此时间的任务视为中断，重新排队（秒）
+    EXTRACTION_ON_UPLOAD = True  # 上传证书后立即在后台识别，无需再点击“AI识别”
+    EXTRACTION_JOB_MAX_PENDING_PER_USER = 5  # 每个用户同时排队或识别中的任务上限（不含批量上传），0 表示不限制
+    EXTRACTION_UPLOAD_BUFFER_MAX_BYTES = 64 * 1024 * 1024  # 上传后立即识别时在内存中暂存文件的总大小上限
+    EXTRACTION_UPLOAD_KEEP_MAX_BYTES = 4 * 1024 * 1024  # 不超过此大小的上传文件同时保留在内存中交给工作线程，更大的文件由工作线程从磁盘读取
+    EXTRACTION_PRIORITIES = {'interactive': 100, 'bulk': 50, 'reprocess': 10}  # 各类识别任务的基础优先级
+    EXTRACTION_DEADLINE_BOOST = 30  # 临近截止时学生/教师任务增加的优先级
+    EXTRACTION_DEADLINE_BOOST_HOURS = 48  # 截止前多少小时内开始加权
+    EXTRACTION_PRIORITY_AGING_SECONDS = 30  # 排队每满此秒数优先级加1，避免低优先级任务饿死，0 表示不补偿
+    JOB_EVENTS_HEARTBEAT = 15  # 进度推送空闲时的保活间隔（秒）
+    JOB_EVENTS_POLL_INTERVAL = 3  # 有未完成任务时查询数据库的间隔，兜底其他进程中的变化（秒）
+    JOB_EVENTS_MAX_DURATION = 300  # 单个推送连接的最长时间，之后由浏览器自动重连（秒）
+    JOB_EVENTS_RETRY = 3000  # 浏览器断线重连等待时间（毫秒）
+    JOB_EVENTS_MAX_SUBSCRIBERS = 1000  # 每个进程的最大推送连接数，0 表示不限制
+    
+    # 批量上传配置
+    BULK_UPLOAD_MAX_FILES = 200  # 单次批量上传的最大证书数
+    BULK_UPLOAD_MAX_CONTENT_LENGTH = 200 * 1024 * 1024  # 批量上传请求大小上限（200MB）
+    BULK_EXTRACTION_CONCURRENCY = 3  # 同时执行的批量识别任务数（需小于工作线程数）
     
     # Session 配置
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
@@ -3,8 +3,14 @@
 """
 from flask_app.models.user import User
 from flask_app.models.certificate import Certificate
-from flask_app.models.file import File
+from flask_app.models.file import File, Blob, UploadSession
 from flask_app.models.dictionary import Dictionary
 from flask_app.models.system import SystemConfig, APIKey
+from flask_app.models.extraction import (
+    ExtractionCache, ExtractionJob, AICallLog, ReextractionRun, ReextractionDiff
+)
 
-__all__ = ['User', 'Certificate', 'File', 'Dictionary', 'SystemConfig', 'APIKey']
+__all__ = [
+    'User', 'Certificate', 'File', 'Blob', 'UploadSession', 'Dictionary', 'SystemConfig', 'APIKey',
+    'ExtractionCache', 'ExtractionJob', 'AICallLog', 'ReextractionRun', 'ReextractionDiff'
+]
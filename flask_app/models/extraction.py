@@ -0,0 +1,171 @@
+"""
+AI识别相关模型
+"""
+from flask_app import db
+from datetime import datetime
+import uuid
+
+
+class ExtractionCache(db.Model):
+    """AI识别结果缓存 - 以 (文件MD5, 模型, 提示词哈希) 为键"""
+    __tablename__ = 'extractioncache'
+    __table_args__ = (
+        db.UniqueConstraint('file_md5', 'model_name', 'prompt_hash', name='uq_extractioncache_key'),
+    )
+
+    cache_id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    file_md5 = db.Column(db.String(32), nullable=False, index=True)
+    model_name = db.Column(db.String(50), nullable=False)
+    prompt_hash = db.Column(db.String(64), nullable=False)
+    result = db.Column(db.Text, nullable=False)  # JSON 格式的识别结果
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    last_hit_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ExtractionCache {self.file_md5} ({self.model_name})>'
+
+
+class ExtractionJob(db.Model):
+    """AI识别任务 - 由后台工作线程异步执行"""
+    __tablename__ = 'extractionjob'
+
+    # 任务状态
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    # 识别阶段（用于进度推送）
+    STAGE_QUEUED = 'queued'
+    STAGE_ENCODING = 'encoding'  # 读取文件、预处理图片
+    STAGE_CALLING = 'calling'  # 调用AI接口
+    STAGE_PARSED = 'parsed'  # 已解析识别结果
+    STAGE_FAILED = 'failed'
+
+    job_id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.user_id'), nullable=False, index=True)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_md5 = db.Column(db.String(32), nullable=True, index=True)
+    file_type = db.Column(db.String(20), nullable=False, default='image')  # pdf/image
+    batch_id = db.Column(db.String(36), nullable=True, index=True)  # 批量上传批次
+    job_class = db.Column(db.String(20), nullable=True, default='interactive')  # interactive/bulk/reprocess
+    priority = db.Column(db.Integer, nullable=True, default=100, index=True)  # 基础优先级，越大越先执行
+    department = db.Column(db.String(100), nullable=True)  # 提交用户所在学院（公平调度）
+    cert_id = db.Column(db.String(36), nullable=True)  # 识别完成后回填的草稿证书
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED, index=True)
+    stage = db.Column(db.String(20), nullable=True, default=STAGE_QUEUED)
+    result = db.Column(db.Text, nullable=True)  # JSON 格式的识别结果
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_finished(self):
+        """是否已结束（成功或失败）"""
+        return self.status in [self.STATUS_DONE, self.STATUS_FAILED]
+
+    @property
+    def status_display(self):
+        """状态中文显示"""
+        status_map = {
+            'queued': '排队中',
+            'running': '识别中',
+            'done': '已完成',
+            'failed': '失败'
+        }
+        return status_map.get(self.status, self.status)
+
+    @property
+    def stage_display(self):
+        """识别阶段中文显示"""
+        stage_map = {
+            'queued': '排队中',
+            'encoding': '处理文件',
+            'calling': '调用AI模型',
+            'parsed': '已识别',
+            'failed': '失败'
+        }
+        stage = self.stage or self.STAGE_QUEUED
+        return stage_map.get(stage, stage)
+
+    def __repr__(self):
+        return f'<ExtractionJob {self.job_id}: {self.status}>'
+
+
+class AICallLog(db.Model):
+    """AI接口调用记录 - 只追加，由 AICallRecorder 批量写入"""
+    __tablename__ = 'aicalllog'
+
+    # 调用结果（失败时为 retry_policy 中的错误类型）
+    OUTCOME_OK = 'ok'
+    OUTCOME_EMPTY = 'empty'  # 调用成功但未解析出任何字段
+
+    log_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    key_id = db.Column(db.String(36), nullable=True, index=True)
+    model_name = db.Column(db.String(50), nullable=True, index=True)
+    thinking = db.Column(db.Boolean, default=False, nullable=False)
+    outcome = db.Column(db.String(20), nullable=False)
+    fallback = db.Column(db.Boolean, default=False, nullable=False)  # 是否回退到旧接口
+    prompt_tokens = db.Column(db.Integer, nullable=True)
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    total_tokens = db.Column(db.Integer, nullable=True)
+    latency_ms = db.Column(db.Integer, nullable=False)
+    payload_bytes = db.Column(db.Integer, nullable=True)  # 请求中附件与提示词的字节数
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<AICallLog {self.log_id}: {self.model_name} {self.outcome}>'
+
+
+class ReextractionRun(db.Model):
+    """历史证书重新识别任务（flask reextract run），记录筛选条件与断点"""
+    __tablename__ = 'reextractionrun'
+
+    STATUS_RUNNING = 'running'
+    STATUS_STOPPED = 'stopped'  # 被中断，可用 --resume 继续
+    STATUS_DONE = 'done'
+
+    run_id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    created_by = db.Column(db.String(36), db.ForeignKey('user.user_id'), nullable=False)
+    filters = db.Column(db.Text, nullable=True)  # JSON 格式的证书筛选条件
+    prompt_hash = db.Column(db.String(64), nullable=True)  # 开始时系统提示词的哈希
+    status = db.Column(db.String(20), nullable=False, default=STATUS_RUNNING)
+    last_cert_id = db.Column(db.String(36), nullable=True)  # 断点：已处理完的最后一个证书ID
+    total = db.Column(db.Integer, default=0, nullable=False)
+    processed = db.Column(db.Integer, default=0, nullable=False)
+    changed = db.Column(db.Integer, default=0, nullable=False)  # 识别结果与证书不一致的证书数
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    started_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def status_display(self):
+        """状态中文显示"""
+        status_map = {
+            'running': '进行中',
+            'stopped': '已中断',
+            'done': '已完成'
+        }
+        return status_map.get(self.status, self.status)
+
+    def __repr__(self):
+        return f'<ReextractionRun {self.run_id}: {self.processed}/{self.total}>'
+
+
+class ReextractionDiff(db.Model):
+    """重新识别结果与证书现有内容不一致的字段，证书本身不做修改"""
+    __tablename__ = 'reextractiondiff'
+
+    diff_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    run_id = db.Column(db.String(36), nullable=False, index=True)
+    cert_id = db.Column(db.String(36), nullable=False, index=True)
+    field = db.Column(db.String(50), nullable=False)
+    current_value = db.Column(db.Text, nullable=True)  # 证书中的值（可能已被用户修改）
+    new_value = db.Column(db.Text, nullable=True)  # 重新识别的值
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    def __repr__(self):
+        return f'<ReextractionDiff {self.cert_id}.{self.field}>'
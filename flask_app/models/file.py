@@ -42,3 +42,47 @@ class File(db.Model):
     
     def __repr__(self):
         return f'<File {self.file_id}: {self.file_name}>'
+
+
+class Blob(db.Model):
+    """按内容存放的证书文件，同一内容只保存一份，由 File/Certificate 引用计数"""
+    __tablename__ = 'blob'
+    
+    blob_key = db.Column(db.String(64), primary_key=True)  # <MD5><扩展名>
+    file_md5 = db.Column(db.String(32), nullable=False, index=True)
+    file_size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)  # 引用该文件的 File 与 Certificate 记录数
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, nullable=False)  # 最近一次引用数变化
+    
+    def __repr__(self):
+        return f'<Blob {self.blob_key}: {self.ref_count}>'
+
+
+class UploadSession(db.Model):
+    """分片上传会话：分片按顺序写入临时文件，全部收到后校验MD5并放入文件存储"""
+    __tablename__ = 'uploadsession'
+    
+    STATUS_UPLOADING = 'uploading'
+    STATUS_FINALIZING = 'finalizing'
+    STATUS_DONE = 'done'
+    
+    upload_id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.user_id'), nullable=False, index=True)
+    file_name = db.Column(db.String(255), nullable=False)  # 原始文件名
+    file_size = db.Column(db.Integer, nullable=False)
+    file_md5 = db.Column(db.String(32), nullable=False)  # 浏览器计算的MD5，完成时校验
+    received = db.Column(db.Integer, default=0, nullable=False)  # 已连续收到的字节数
+    status = db.Column(db.String(20), default=STATUS_UPLOADING, nullable=False)  # uploading/finalizing/done
+    file_id = db.Column(db.String(36), nullable=True)  # 完成后创建的文件记录
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # 过期后由清理任务删除会话与临时文件
+    
+    @property
+    def progress(self):
+        """上传进度（0-100）"""
+        return int(self.received * 100 / self.file_size) if self.file_size else 100
+    
+    def __repr__(self):
+        return f'<UploadSession {self.upload_id}: {self.received}/{self.file_size}>'
@@ -109,6 +109,12 @@ class APIKey(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     usage_count = db.Column(db.Integer, default=0)
     max_usage = db.Column(db.Integer, nullable=True)
+    rate_limit_rps = db.Column(db.Float, nullable=True)  # 每秒最大调用次数，为空时使用系统默认值
+    max_concurrency = db.Column(db.Integer, nullable=True)  # 最大并发调用数，为空时使用系统默认值
+    thinking_mode = db.Column(db.String(20), nullable=True)  # 思考模式：auto/disabled/enabled，为空时使用系统默认值
+    thinking_model_name = db.Column(db.String(50), nullable=True)  # 开启思考模式时使用的模型，为空时与 model_name 相同
+    max_tokens = db.Column(db.Integer, nullable=True)  # 单次回复最大token数，为空时使用系统默认值
+    request_timeout = db.Column(db.Float, nullable=True)  # 单次请求超时（秒），为空时使用系统默认值
     created_at = db.Column(db.DateTime, default=datetime.now)
     last_used_at = db.Column(db.DateTime, nullable=True)
     created_by = db.Column(db.String(50), nullable=False)
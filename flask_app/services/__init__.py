@@ -6,11 +6,13 @@ from .certificate_service import CertificateService
 from .user_service import UserService
 from .dictionary_service import DictionaryService
 from .file_service import FileService
+from .extraction_cache_service import ExtractionCacheService
 
 __all__ = [
     'CertificateService',
     'UserService', 
     'DictionaryService',
-    'FileService'
+    'FileService',
+    'ExtractionCacheService'
 ]
 
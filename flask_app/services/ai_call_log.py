@@ -0,0 +1,158 @@
+"""
+AI接口调用记录 - 在内存中缓冲每次调用的耗时与token用量，批量写入 aicalllog 表
+"""
+from flask import current_app, has_app_context
+from sqlalchemy import insert
+from datetime import datetime
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AICallRecorder:
+    """
+    进程级调用记录缓冲区
+
+    每次调用结束时 record() 只在内存中追加一行，应用上下文结束时若达到阈值或间隔，
+    以一条批量 INSERT 写入数据库（使用独立的事务，不影响调用方的会话）；写入失败的记录退回缓冲区，
+    缓冲区超过上限时丢弃最早的记录，不影响识别本身。
+    """
+
+    # 默认配置（可通过 Flask 配置 AI_CALL_LOG_* 覆盖）
+    DEFAULT_FLUSH_INTERVAL = 10
+    DEFAULT_FLUSH_THRESHOLD = 50
+    DEFAULT_MAX_BUFFER = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._dropped = 0
+        self._app = None
+
+    def init_app(self, app):
+        """应用上下文结束时按需写入记录，进程退出时写入缓冲区中的全部记录"""
+        self._app = app
+        atexit.register(self._flush_on_exit)
+
+        @app.teardown_appcontext
+        def _flush_ai_call_log(exc=None):
+            from flask_app import db
+            # 先结束本次上下文的会话，避免写入时与未提交的写操作争用 SQLite 写锁
+            db.session.remove()
+            self.maybe_flush()
+
+    def _get_setting(self, name, default):
+        """读取 Flask 配置，无应用上下文时使用默认值"""
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def record(self, key_id, model_name, outcome, latency, thinking=False, fallback=False,
+               usage=None, payload_bytes=None):
+        """
+        记录一次接口调用
+
+        Args:
+            key_id: 使用的密钥ID
+            model_name: 请求的模型
+            outcome: 调用结果，ok / empty 或 retry_policy 中的错误类型
+            latency: 耗时（秒）
+            thinking: 是否开启思考
+            fallback: 是否回退到旧接口
+            usage: 响应中的token用量 {'prompt_tokens', 'completion_tokens', 'total_tokens'}
+            payload_bytes: 请求中附件与提示词的字节数
+        """
+        if not self._get_setting('AI_CALL_LOG_ENABLED', True):
+            return
+        usage = usage or {}
+        row = {
+            'key_id': key_id,
+            'model_name': (model_name or '')[:50] or None,
+            'thinking': bool(thinking),
+            'outcome': outcome,
+            'fallback': bool(fallback),
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'total_tokens': usage.get('total_tokens'),
+            'latency_ms': int(round(latency * 1000)),
+            'payload_bytes': payload_bytes,
+            'created_at': datetime.now()
+        }
+        max_buffer = self._get_setting('AI_CALL_LOG_MAX_BUFFER', self.DEFAULT_MAX_BUFFER)
+        with self._lock:
+            self._buffer.append(row)
+            overflow = len(self._buffer) - max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self._dropped += overflow
+
+    def maybe_flush(self):
+        """缓冲的记录达到阈值或超过写入间隔时写入数据库"""
+        threshold = self._get_setting('AI_CALL_LOG_FLUSH_THRESHOLD', self.DEFAULT_FLUSH_THRESHOLD)
+        interval = self._get_setting('AI_CALL_LOG_FLUSH_INTERVAL', self.DEFAULT_FLUSH_INTERVAL)
+
+        with self._lock:
+            pending = len(self._buffer)
+            due = time.monotonic() - self._last_flush >= interval
+
+        if pending and (pending >= threshold or due):
+            self.flush()
+
+    def flush(self):
+        """
+        将缓冲区中的记录写入数据库
+
+        Returns:
+            int: 写入的记录数
+        """
+        from flask_app import db
+        from flask_app.models import AICallLog
+
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # 其他线程正在写入
+        try:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                dropped, self._dropped = self._dropped, 0
+                self._last_flush = time.monotonic()
+
+            if dropped:
+                logger.warning(f"AI调用记录缓冲区已满，丢弃了 {dropped} 条记录")
+            if not batch:
+                return 0
+
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(AICallLog), batch)
+            except Exception as e:
+                # 写入失败时退回缓冲区，下次重试
+                with self._lock:
+                    self._buffer[:0] = batch
+                logger.error(f"写入AI调用记录失败: {e}")
+                return 0
+            return len(batch)
+        finally:
+            self._flush_lock.release()
+
+    def _flush_on_exit(self):
+        if self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception as e:
+            logger.error(f"退出时写入AI调用记录失败: {e}")
+
+    def pending(self):
+        """尚未写入数据库的记录数"""
+        with self._lock:
+            return len(self._buffer)
+
+
+# 进程级单例
+ai_call_recorder = AICallRecorder()
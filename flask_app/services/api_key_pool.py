@@ -0,0 +1,282 @@
+"""
+API密钥池 - 在内存中缓存可用密钥并批量回写调用次数
+"""
+from flask import current_app, has_app_context
+from sqlalchemy import update
+from datetime import datetime
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PooledKey:
+    """密钥快照，提供与 APIKey 模型相同的常用属性"""
+
+    def __init__(self, api_key_obj):
+        self.key_id = api_key_obj.key_id
+        self.api_key = api_key_obj.api_key
+        self.model_name = api_key_obj.model_name
+        self.prompt = api_key_obj.prompt
+        self.max_usage = api_key_obj.max_usage
+        self.rate_limit_rps = api_key_obj.rate_limit_rps
+        self.max_concurrency = api_key_obj.max_concurrency
+        self.thinking_mode = api_key_obj.thinking_mode
+        self.thinking_model_name = api_key_obj.thinking_model_name
+        self.max_tokens = api_key_obj.max_tokens
+        self.request_timeout = api_key_obj.request_timeout
+        self.usage_count = api_key_obj.usage_count or 0
+        self.created_at = api_key_obj.created_at
+        self.in_flight = 0  # 正在进行的调用数
+        self.pending = 0  # 尚未写回数据库的调用次数
+        self.last_used_at = None
+
+    @property
+    def remaining(self):
+        """剩余可用次数，未设置上限时为无穷大"""
+        if not self.max_usage:
+            return float('inf')
+        return self.max_usage - self.usage_count - self.pending - self.in_flight
+
+    @property
+    def is_available(self):
+        return self.remaining > 0
+
+    def __repr__(self):
+        return f'<PooledKey {self.key_id} in_flight={self.in_flight} pending={self.pending}>'
+
+
+class APIKeyPool:
+    """
+    进程级API密钥池
+
+    可用密钥缓存在内存中，每次选择剩余额度内进行中调用最少的密钥
+    （相同时取剩余额度最多的）；调用次数先在内存中累加，应用上下文结束时
+    （请求结束、工作线程处理完一个任务）若达到阈值或间隔，以
+    usage_count = usage_count + n 批量写回 apikey 表。
+    管理员修改密钥后调用 reload()，其他进程的修改由定时重载兜底。
+    """
+
+    # 默认配置（可通过 Flask 配置 API_KEY_POOL_* 覆盖）
+    DEFAULT_RELOAD_INTERVAL = 60
+    DEFAULT_FLUSH_INTERVAL = 10
+    DEFAULT_FLUSH_THRESHOLD = 20
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._keys = {}  # key_id -> PooledKey
+        self._orphans = {}  # 已停用但仍有未写回次数的密钥
+        self._loaded_at = None
+        self._last_flush = time.monotonic()
+        self._app = None
+
+    def init_app(self, app):
+        """应用上下文结束时按需写回调用次数，进程退出时写回全部未提交的次数"""
+        self._app = app
+        atexit.register(self._flush_on_exit)
+
+        @app.teardown_appcontext
+        def _flush_api_key_usage(exc=None):
+            from flask_app import db
+            # 先结束本次上下文的会话（与 Flask-SQLAlchemy 随后的清理相同），
+            # 避免写回时与会话中未提交的写操作争用 SQLite 写锁
+            db.session.remove()
+            self.maybe_flush()
+
+    def _get_setting(self, name, default):
+        """读取 Flask 配置，无应用上下文时使用默认值"""
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _ensure_loaded(self):
+        reload_interval = self._get_setting('API_KEY_POOL_RELOAD_INTERVAL', self.DEFAULT_RELOAD_INTERVAL)
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > reload_interval:
+            self.load()
+
+    def load(self):
+        """从数据库加载可用密钥，保留进行中调用数与未写回的次数"""
+        from flask_app.models import APIKey
+
+        rows = APIKey.query.filter_by(is_active=True).order_by(APIKey.created_at.desc()).all()
+
+        with self._lock:
+            keys = {}
+            for row in rows:
+                key = PooledKey(row)
+                old = self._keys.get(row.key_id)
+                if old is not None:
+                    key.in_flight = old.in_flight
+                    key.pending = old.pending
+                    key.last_used_at = old.last_used_at
+                keys[row.key_id] = key
+            # 已被禁用或删除的密钥仍需写回未提交的次数
+            for key_id, old in self._keys.items():
+                if key_id not in keys and old.pending:
+                    self._orphans[key_id] = old
+            self._keys = keys
+            self._loaded_at = time.monotonic()
+
+    def reload(self):
+        """标记缓存失效，下次获取密钥时重新加载"""
+        with self._lock:
+            self._loaded_at = None
+
+    def acquire(self, exclude=None):
+        """
+        获取一个可用密钥并登记为进行中调用
+
+        Args:
+            exclude: 尽量避开的密钥ID（如重试时刚失败的密钥），没有其他密钥时仍可分配
+
+        Returns:
+            PooledKey: 选中的密钥，使用完毕后需调用 release()
+
+        Raises:
+            Exception: 没有可用密钥
+        """
+        from flask_app.services.retry_policy import circuit_breakers
+
+        self._ensure_loaded()
+
+        with self._lock:
+            candidates = [k for k in self._keys.values() if k.is_available]
+            if not candidates:
+                raise Exception("没有可用的API密钥，请联系管理员配置AI识别服务的API密钥")
+            # 跳过熔断中的密钥
+            candidates = [k for k in candidates if circuit_breakers.available(k.key_id)]
+            if not candidates:
+                raise Exception("AI识别服务暂时不可用，请稍后重试")
+            if exclude:
+                candidates = [k for k in candidates if k.key_id not in exclude] or candidates
+            key = min(candidates, key=lambda k: (k.in_flight, -k.remaining))
+            key.in_flight += 1
+        circuit_breakers.on_acquire(key.key_id)
+        return key
+
+    def release(self, key: PooledKey, used: bool = True):
+        """
+        归还密钥
+
+        调用次数只在内存中累加，不在调用方的事务中写数据库，由应用上下文结束时写回。
+
+        Args:
+            key: acquire() 返回的密钥
+            used: 是否实际调用了API（计入调用次数）
+        """
+        with self._lock:
+            # 获取后密钥池可能已重新加载，计数记在当前的对象上；
+            # 密钥已被停用时放入待写回列表
+            live = self._keys.get(key.key_id)
+            if live is None:
+                live = self._orphans.setdefault(key.key_id, key) if used else key
+            key = live
+            key.in_flight = max(key.in_flight - 1, 0)
+            if used:
+                key.pending += 1
+                key.last_used_at = datetime.now()
+
+    def maybe_flush(self):
+        """未写回的次数达到阈值或超过写回间隔时写回数据库"""
+        threshold = self._get_setting('API_KEY_USAGE_FLUSH_THRESHOLD', self.DEFAULT_FLUSH_THRESHOLD)
+        interval = self._get_setting('API_KEY_USAGE_FLUSH_INTERVAL', self.DEFAULT_FLUSH_INTERVAL)
+
+        with self._lock:
+            pending = sum(k.pending for k in self._keys.values())
+            pending += sum(k.pending for k in self._orphans.values())
+            due = time.monotonic() - self._last_flush >= interval
+
+        if pending and (pending >= threshold or due):
+            self.flush()
+
+    def flush(self):
+        """
+        将内存中累加的调用次数写回数据库
+
+        Returns:
+            int: 写回的调用次数
+        """
+        from flask_app import db
+        from flask_app.models import APIKey
+
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # 其他线程正在写回
+        try:
+            with self._lock:
+                batch = []
+                for key in list(self._keys.values()) + list(self._orphans.values()):
+                    if key.pending:
+                        batch.append((key, key.pending, key.last_used_at))
+                        key.pending = 0
+                self._orphans = {}
+                self._last_flush = time.monotonic()
+
+            if not batch:
+                return 0
+
+            try:
+                # 使用独立的连接与事务：release() 在识别、请求与任务代码中调用，
+                # 不能提交或回滚调用方 db.session 中尚未完成的修改
+                with db.engine.begin() as connection:
+                    for key, count, last_used_at in batch:
+                        connection.execute(
+                            update(APIKey)
+                            .where(APIKey.key_id == key.key_id)
+                            .values(usage_count=APIKey.usage_count + count, last_used_at=last_used_at)
+                        )
+                    # 达到上限的密钥标记为不可用
+                    exhausted = connection.execute(
+                        update(APIKey)
+                        .where(APIKey.is_active.is_(True))
+                        .where(APIKey.max_usage.isnot(None))
+                        .where(APIKey.max_usage > 0)
+                        .where(APIKey.usage_count >= APIKey.max_usage)
+                        .values(is_active=False)
+                    ).rowcount
+            except Exception as e:
+                # 写回失败时退回内存，下次重试
+                with self._lock:
+                    for key, count, _ in batch:
+                        key.pending += count
+                        if key.key_id not in self._keys:
+                            self._orphans[key.key_id] = key
+                logger.error(f"写回API密钥调用次数失败: {e}")
+                return 0
+
+            with self._lock:
+                for key, count, _ in batch:
+                    key.usage_count += count
+
+            if exhausted:
+                logger.info(f"{exhausted} 个API密钥已达到最大调用次数，已停用")
+                self.reload()
+            return sum(count for _, count, _ in batch)
+        finally:
+            self._flush_lock.release()
+
+    def _flush_on_exit(self):
+        if self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception as e:
+            logger.error(f"退出时写回API密钥调用次数失败: {e}")
+
+    def stats(self):
+        """各密钥的内存状态"""
+        with self._lock:
+            return [{
+                'key_id': k.key_id,
+                'in_flight': k.in_flight,
+                'pending': k.pending,
+                'remaining': None if k.remaining == float('inf') else k.remaining
+            } for k in self._keys.values()]
+
+
+# 进程级单例
+api_key_pool = APIKeyPool()
@@ -0,0 +1,403 @@
+"""
+证书文件存储 - 按内容寻址
+文件按 MD5 存放在 UPLOAD_FOLDER/blobs/ab/cd/<MD5><扩展名>，同一内容只保存一份；
+blob 表记录引用该文件的 File 与 Certificate 记录数，由模型事件自动维护，
+引用数归零超过保留时间的文件由 flask blobs gc 清理。
+"""
+from sqlalchemy import event, func, inspect, insert, select, update
+from datetime import datetime, timedelta
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import secrets
+
+from flask_app import db
+from flask_app.models import Blob, Certificate, ExtractionJob, File, UploadSession
+from flask_app.services.single_flight import file_lock
+
+logger = logging.getLogger(__name__)
+
+# blobs 目录下的文件名：<MD5><扩展名>
+_BLOB_NAME = re.compile(r'^([0-9a-f]{32})(\.[0-9a-z]{1,10})$')
+
+
+class BlobStore:
+    """按内容寻址的证书文件存储"""
+
+    FOLDER_NAME = 'blobs'
+    TEMP_FOLDER_NAME = 'tmp'
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app):
+        """注册 File/Certificate 的引用计数事件"""
+        if self._listening:
+            return
+        for model in (File, Certificate):
+            event.listen(model, 'after_insert', self._after_insert)
+            event.listen(model, 'after_delete', self._after_delete)
+            event.listen(model, 'after_update', self._after_update)
+        self._listening = True
+
+    def root(self):
+        """存储根目录（位于 UPLOAD_FOLDER 内，经 /api/file/ 按原有权限访问）"""
+        from flask_app.utils.file_utils import get_upload_folder
+        return os.path.join(get_upload_folder(), self.FOLDER_NAME)
+
+    def temp_dir(self):
+        """写入中的临时文件目录，与存储目录在同一文件系统，保证重命名是原子的"""
+        path = os.path.join(self.root(), self.TEMP_FOLDER_NAME)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def key_for(file_md5, filename):
+        """文件的存储键：MD5 加小写扩展名（保留扩展名，按扩展名判断文件类型的代码无需修改）"""
+        ext = os.path.splitext(filename or '')[1].lower()
+        if ext == '.jpeg':
+            ext = '.jpg'
+        return f"{file_md5.lower()}{ext or '.jpg'}"
+
+    @staticmethod
+    def parse_key(path):
+        """
+        从文件路径解析存储键
+
+        Returns:
+            str: 存储键，不是 blobs 目录下的文件时返回None
+        """
+        if not path:
+            return None
+        parts = os.path.normpath(path).replace('\\', '/').split('/')
+        if len(parts) < 4 or parts[-4] != BlobStore.FOLDER_NAME:
+            return None
+        match = _BLOB_NAME.match(parts[-1])
+        if not match or parts[-3] != match.group(1)[:2] or parts[-2] != match.group(1)[2:4]:
+            return None
+        return parts[-1]
+
+    def path_for(self, key):
+        """存储键对应的文件路径：blobs/ab/cd/<key>"""
+        return os.path.join(self.root(), key[:2], key[2:4], key)
+
+    def exists(self, file_md5, filename):
+        """是否已保存相同内容的文件"""
+        return os.path.isfile(self.path_for(self.key_for(file_md5, filename)))
+
+    def find(self, file_md5, file_size=None):
+        """
+        按MD5查找已保存的文件（不区分上传者）
+
+        Args:
+            file_md5: 文件MD5
+            file_size: 文件大小，给出时大小不一致的不算
+
+        Returns:
+            str: 存储键，没有时返回None
+        """
+        query = Blob.query.filter_by(file_md5=(file_md5 or '').lower())
+        if file_size is not None:
+            query = query.filter_by(file_size=file_size)
+        for blob in query.order_by(Blob.ref_count.desc()).all():
+            if os.path.isfile(self.path_for(blob.blob_key)):
+                return blob.blob_key
+        return None
+
+    @staticmethod
+    def make_challenge(file_size, max_length=64 * 1024):
+        """
+        生成持有文件的校验：随机数与文件中随机的一段
+
+        只凭MD5不能证明持有文件（MD5可能从别处得知），秒传时客户端须返回
+        MD5(随机数 + 该段内容)。
+
+        Returns:
+            dict: {'nonce': 随机数, 'offset': 起始位置, 'length': 长度}
+        """
+        length = max(min(file_size, max_length), 0)
+        offset = secrets.randbelow(file_size - length + 1) if file_size > length else 0
+        return {'nonce': secrets.token_hex(8), 'offset': offset, 'length': length}
+
+    def possession_proof(self, key, challenge):
+        """计算存储文件对 make_challenge() 校验的应答"""
+        digest = hashlib.md5(challenge['nonce'].encode('utf-8'))
+        with open(self.path_for(key), 'rb') as f:
+            f.seek(challenge['offset'])
+            digest.update(f.read(challenge['length']))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _lock(key):
+        """单个文件的跨进程锁：放入或重新引用文件与 gc 删除文件互斥"""
+        return file_lock(f'blob:{key}')
+
+    def claim(self, key):
+        """
+        声明将要引用已保存的文件（如秒传）
+
+        更新文件的修改时间，gc 在保留时间内不会删除该文件，
+        调用方在此期间写入 File/Certificate 记录即可。
+
+        Returns:
+            bool: 文件是否存在
+        """
+        with self._lock(key):
+            try:
+                os.utime(self.path_for(key))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def commit_temp(self, temp_path, file_md5, filename, file_size):
+        """
+        将已写完的临时文件放入存储
+
+        已有相同内容的文件时更新其修改时间（见 claim()）并删除临时文件，
+        否则原子重命名到存储路径。
+
+        Returns:
+            str: 存储路径
+        """
+        key = self.key_for(file_md5, filename)
+        path = self.path_for(key)
+        with self._lock(key):
+            try:
+                os.utime(path)
+                exists = True
+            except FileNotFoundError:
+                exists = False
+            if exists:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        # blob 记录在第一条 File/Certificate 记录写入时由引用计数事件创建
+        return path
+
+    # ---- 引用计数 ----
+
+    @staticmethod
+    def _change_ref(connection, path, delta):
+        key = BlobStore.parse_key(path)
+        if key is None:
+            return
+        now = datetime.now()
+        result = connection.execute(
+            update(Blob.__table__)
+            .where(Blob.__table__.c.blob_key == key)
+            .values(ref_count=Blob.__table__.c.ref_count + delta, updated_at=now)
+        )
+        if result.rowcount == 0 and delta > 0:
+            # 第一次引用该文件
+            size = os.path.getsize(path) if os.path.isfile(path) else 0
+            connection.execute(insert(Blob.__table__).values(
+                blob_key=key, file_md5=key[:32], file_size=size, ref_count=delta, created_at=now, updated_at=now
+            ))
+
+    @staticmethod
+    def _after_insert(mapper, connection, target):
+        BlobStore._change_ref(connection, target.file_path, 1)
+
+    @staticmethod
+    def _after_delete(mapper, connection, target):
+        BlobStore._change_ref(connection, target.file_path, -1)
+
+    @staticmethod
+    def _after_update(mapper, connection, target):
+        history = inspect(target).attrs.file_path.history
+        if not history.has_changes():
+            return
+        for path in history.deleted:
+            BlobStore._change_ref(connection, path, -1)
+        for path in history.added:
+            BlobStore._change_ref(connection, path, 1)
+
+    def recount(self):
+        """
+        按 File 与 Certificate 记录重新计算全部引用数
+
+        Returns:
+            int: 引用数被修正的文件数
+        """
+        counts = {}
+        for model in (File, Certificate):
+            for path, count in db.session.query(model.file_path, func.count()).group_by(model.file_path):
+                key = self.parse_key(path)
+                if key is not None:
+                    counts[key] = counts.get(key, 0) + count
+
+        fixed = 0
+        for blob in Blob.query.all():
+            expected = counts.pop(blob.blob_key, 0)
+            if blob.ref_count != expected:
+                blob.ref_count = expected
+                blob.updated_at = datetime.now()
+                fixed += 1
+        for key, count in counts.items():
+            path = self.path_for(key)
+            size = os.path.getsize(path) if os.path.isfile(path) else 0
+            db.session.add(Blob(blob_key=key, file_md5=key[:32], file_size=size, ref_count=count))
+            fixed += 1
+        db.session.commit()
+        return fixed
+
+    def gc(self, grace_hours=24, dry_run=False):
+        """
+        删除不再被引用的文件
+
+        包括引用数已归零的文件（同时删除其缩略图）、上传后从未被引用的文件（如保存证书前离开页面）
+        以及上传中断遗留的临时文件（分片上传会话中的临时文件由会话过期清理）。
+        只删除引用数与文件修改时间都超过保留时间的文件：上传与秒传在写入 File/Certificate
+        记录前会更新文件的修改时间（见 claim()、commit_temp()），且与删除互斥，
+        不会删除刚被重新引用、引用数尚未增加的文件。
+
+        Returns:
+            tuple: (删除的文件数, 释放的字节数)
+        """
+        from flask_app.utils.thumbnail_utils import clear_thumbnails
+
+        before = datetime.now() - timedelta(hours=grace_hours)
+        removed = freed = 0
+        for blob in Blob.query.filter(Blob.ref_count <= 0, Blob.updated_at < before).all():
+            path = self.path_for(blob.blob_key)
+            if dry_run:
+                if not self._recently_used(path, before):
+                    removed += 1
+                    freed += blob.file_size
+                continue
+            with self._lock(blob.blob_key):
+                # 查询之后可能已被重新引用
+                db.session.refresh(blob)
+                if blob.ref_count > 0 or self._recently_used(path, before):
+                    continue
+                db.session.delete(blob)
+                db.session.commit()
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+            removed += 1
+            freed += blob.file_size
+            if not Blob.query.filter_by(file_md5=blob.file_md5).first():
+                clear_thumbnails(blob.file_md5)
+            self._remove_empty_dir(os.path.dirname(path))
+            self._remove_empty_dir(os.path.dirname(os.path.dirname(path)))
+
+        # 存储目录中没有 blob 记录的文件
+        known = {key for (key,) in db.session.query(Blob.blob_key)}
+        uploading = {f'{upload_id}.part' for (upload_id,) in db.session.query(UploadSession.upload_id)}
+        for folder, _, names in os.walk(self.root()):
+            is_temp = os.path.basename(folder) == self.TEMP_FOLDER_NAME
+            for name in names:
+                path = os.path.join(folder, name)
+                if not is_temp and (self.parse_key(path) is None or name in known):
+                    continue
+                if is_temp and name in uploading:
+                    continue
+                try:
+                    if self._recently_used(path, before):
+                        continue
+                    size = os.path.getsize(path)
+                    if not dry_run:
+                        if is_temp:
+                            os.remove(path)
+                        else:
+                            with self._lock(name):
+                                if self._recently_used(path, before):
+                                    continue
+                                os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+                freed += size
+        return removed, freed
+
+    @staticmethod
+    def _recently_used(path, before):
+        """文件在保留时间内被写入或重新引用过（文件不存在时视为否）"""
+        try:
+            return datetime.fromtimestamp(os.path.getmtime(path)) >= before
+        except FileNotFoundError:
+            return False
+
+    def stats(self):
+        """存储统计：文件数、总大小、引用数为0的文件数，以及去重节省的字节数"""
+        count, size, refs = db.session.query(
+            func.count(Blob.blob_key), func.coalesce(func.sum(Blob.file_size), 0),
+            func.coalesce(func.sum(Blob.ref_count), 0)
+        ).one()
+        unreferenced = Blob.query.filter(Blob.ref_count <= 0).count()
+        saved = db.session.query(
+            func.coalesce(func.sum(Blob.file_size * (Blob.ref_count - 1)), 0)
+        ).filter(Blob.ref_count > 1).scalar()
+        return {'blobs': count, 'bytes': size, 'references': refs,
+                'unreferenced': unreferenced, 'saved_bytes': saved}
+
+    # ---- 迁移 ----
+
+    def migrate(self, dry_run=False):
+        """
+        将旧目录结构（uploads/<账号>_<姓名>/<时间>_cert.ext）中的文件迁入存储
+
+        逐个旧路径：读取内容计算MD5放入存储（相同内容只保留一份），改写 File、
+        Certificate 与 ExtractionJob 中的 file_path（以及与内容不符的 file_md5）并提交后，
+        再删除旧文件。
+        中途中断时未提交的文件仍使用旧路径，重新执行即可继续。
+
+        Returns:
+            dict: {'migrated': 迁移的路径数, 'deduplicated': 与已有内容重复的路径数,
+                   'missing': 文件不存在的路径数, 'freed_bytes': 释放的字节数}
+        """
+        from flask_app.utils.file_utils import save_upload_stream
+
+        paths = set()
+        for model in (File, Certificate):
+            paths.update(path for (path,) in db.session.execute(select(model.file_path).distinct())
+                         if path and self.parse_key(path) is None)
+
+        summary = {'migrated': 0, 'deduplicated': 0, 'missing': 0, 'freed_bytes': 0}
+        for old_path in sorted(paths):
+            if not os.path.isfile(old_path):
+                summary['missing'] += 1
+                logger.warning(f"迁移时文件不存在，保留原路径: {old_path}")
+                continue
+            size = os.path.getsize(old_path)
+            if dry_run:
+                summary['migrated'] += 1
+                continue
+
+            with open(old_path, 'rb') as f:
+                new_path, file_md5, _, _ = save_upload_stream(f, old_path)
+            if self._blob_ref_count(new_path) > 0:
+                summary['deduplicated'] += 1
+                summary['freed_bytes'] += size
+
+            for model in (File, Certificate, ExtractionJob):
+                # 逐条更新以触发引用计数事件
+                for row in model.query.filter_by(file_path=old_path).all():
+                    row.file_path = new_path
+                    row.file_md5 = file_md5
+            db.session.commit()
+
+            os.remove(old_path)
+            self._remove_empty_dir(os.path.dirname(old_path))
+            summary['migrated'] += 1
+        return summary
+
+    def _blob_ref_count(self, path):
+        blob = db.session.get(Blob, self.parse_key(path))
+        return blob.ref_count if blob else 0
+
+    @staticmethod
+    def _remove_empty_dir(folder):
+        try:
+            if not os.listdir(folder):
+                os.rmdir(folder)
+        except OSError:
+            pass
+
+
+# 进程级单例
+blob_store = BlobStore()
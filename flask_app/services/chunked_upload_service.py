@@ -0,0 +1,272 @@
+"""
+分片上传服务
+大文件（高清扫描的PDF等）分多次请求上传：创建上传会话 → 按偏移量逐个上传分片 → 完成时校验MD5。
+分片按顺序写入文件存储临时目录中的 <upload_id>.part，连接中断后从已收到的位置继续；
+全部收到后放入按内容存放的存储并创建文件记录。过期的会话及其临时文件由 sweep() 清理。
+"""
+from flask import current_app
+from datetime import datetime, timedelta
+import hashlib
+import logging
+import os
+import re
+
+from flask_app import db
+from flask_app.models import UploadSession
+from flask_app.services.blob_store import blob_store
+from flask_app.utils.file_utils import create_file_record, get_file_type
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkedUploadError(Exception):
+    """分片上传请求错误，status 为返回的HTTP状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class ChunkedUploadService:
+    """分片上传服务类"""
+
+    ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.pdf'}
+    READ_SIZE = 256 * 1024
+    SWEEP_BATCH = 100
+
+    @staticmethod
+    def _ttl():
+        return timedelta(hours=current_app.config.get('UPLOAD_SESSION_TTL_HOURS', 24))
+
+    @staticmethod
+    def chunk_size():
+        """单个分片的最大字节数"""
+        return current_app.config.get('UPLOAD_CHUNK_SIZE', 2 * 1024 * 1024)
+
+    @staticmethod
+    def temp_path(upload: UploadSession):
+        """会话的临时文件路径"""
+        return os.path.join(blob_store.temp_dir(), f'{upload.upload_id}.part')
+
+    @staticmethod
+    def create(user_id: str, file_name: str, file_size: int, file_md5: str):
+        """
+        创建上传会话
+
+        同一用户对相同文件（MD5与大小相同）有未完成的会话时返回该会话，从已收到的位置继续上传。
+
+        Returns:
+            UploadSession: 上传会话
+
+        Raises:
+            ChunkedUploadError: 文件格式、大小或MD5不合法，或未完成的上传过多
+        """
+        ext = os.path.splitext(file_name or '')[1].lower()
+        if ext not in ChunkedUploadService.ALLOWED_EXTENSIONS:
+            raise ChunkedUploadError('不支持该文件格式！请上传图片（JPG、PNG、BMP、GIF、WEBP）或PDF文件。')
+        max_bytes = current_app.config.get('UPLOAD_CHUNKED_MAX_BYTES', 100 * 1024 * 1024)
+        if file_size <= 0:
+            raise ChunkedUploadError('文件为空')
+        if file_size > max_bytes:
+            raise ChunkedUploadError(f'文件过大，最大 {max_bytes // (1024 * 1024)}MB', 413)
+        file_md5 = (file_md5 or '').lower()
+        if not re.fullmatch(r'[0-9a-f]{32}', file_md5):
+            raise ChunkedUploadError('文件MD5格式错误')
+
+        ChunkedUploadService.sweep(limit=ChunkedUploadService.SWEEP_BATCH)
+
+        now = datetime.now()
+        active = UploadSession.query.filter(
+            UploadSession.user_id == user_id,
+            UploadSession.status == UploadSession.STATUS_UPLOADING,
+            UploadSession.expires_at > now
+        )
+        existing = active.filter_by(file_md5=file_md5, file_size=file_size) \
+            .order_by(UploadSession.created_at.desc()).first()
+        if existing and os.path.isfile(ChunkedUploadService.temp_path(existing)):
+            existing.expires_at = now + ChunkedUploadService._ttl()
+            db.session.commit()
+            return existing
+
+        limit = current_app.config.get('UPLOAD_SESSION_MAX_ACTIVE_PER_USER', 5)
+        if limit and active.count() >= limit:
+            raise ChunkedUploadError('未完成的上传过多，请等待上传完成或稍后再试', 429)
+
+        upload = UploadSession(
+            user_id=user_id,
+            file_name=os.path.basename(file_name)[:255],
+            file_size=file_size,
+            file_md5=file_md5,
+            created_at=now,
+            updated_at=now,
+            expires_at=now + ChunkedUploadService._ttl()
+        )
+        db.session.add(upload)
+        db.session.flush()
+        open(ChunkedUploadService.temp_path(upload), 'wb').close()
+        db.session.commit()
+        return upload
+
+    @staticmethod
+    def get(upload_id: str, user_id: str):
+        """获取用户的上传会话"""
+        return UploadSession.query.filter_by(upload_id=upload_id, user_id=user_id).first()
+
+    @staticmethod
+    def write_chunk(upload: UploadSession, offset: int, stream, length: int):
+        """
+        写入一个分片
+
+        只接受从已收到的位置开始的分片（offset 等于 received）。分片中途断开时保留
+        已写入的部分，浏览器查询进度后从新的位置继续。
+
+        Args:
+            upload: 上传会话
+            offset: 分片在文件中的起始位置
+            stream: 请求体
+            length: 分片字节数（Content-Length）
+
+        Returns:
+            int: 已收到的字节数
+        """
+        now = datetime.now()
+        if upload.status != UploadSession.STATUS_UPLOADING:
+            raise ChunkedUploadError('文件已上传完成', 409)
+        if upload.expires_at < now:
+            raise ChunkedUploadError('上传已过期，请重新上传', 410)
+        if offset != upload.received:
+            raise ChunkedUploadError('分片位置与已上传的进度不一致', 409)
+        if not length:
+            raise ChunkedUploadError('缺少分片大小', 411)
+        if length > ChunkedUploadService.chunk_size():
+            raise ChunkedUploadError('分片过大', 413)
+        if offset + length > upload.file_size:
+            raise ChunkedUploadError('分片超出文件大小', 416)
+
+        path = ChunkedUploadService.temp_path(upload)
+        if not os.path.isfile(path):
+            raise ChunkedUploadError('上传已过期，请重新上传', 410)
+
+        written = 0
+        try:
+            with open(path, 'r+b') as f:
+                f.seek(offset)
+                while written < length:
+                    data = stream.read(min(ChunkedUploadService.READ_SIZE, length - written))
+                    if not data:
+                        break
+                    f.write(data)
+                    written += len(data)
+        finally:
+            if written:
+                # 以已收到的位置为条件，同一分片的并发请求只计一次
+                now = datetime.now()
+                UploadSession.query.filter_by(upload_id=upload.upload_id, received=offset).update({
+                    'received': offset + written,
+                    'updated_at': now,
+                    'expires_at': now + ChunkedUploadService._ttl()
+                }, synchronize_session=False)
+                db.session.commit()
+        db.session.refresh(upload)
+        return upload.received
+
+    @staticmethod
+    def finalize(upload: UploadSession):
+        """
+        完成上传：校验MD5，放入文件存储并创建文件记录
+
+        先以带状态条件的 UPDATE 将会话标记为处理中，并发的完成请求只有一个继续执行，
+        其余返回409，浏览器稍后重试时得到已完成的会话。重复调用（如浏览器未收到上次的响应）
+        直接返回已完成的会话。
+
+        Returns:
+            UploadSession: 已完成的上传会话，file_id 为创建的文件记录
+        """
+        if upload.status == UploadSession.STATUS_DONE:
+            return upload
+        if upload.received != upload.file_size:
+            raise ChunkedUploadError('文件尚未上传完成', 409)
+
+        claimed = UploadSession.query.filter_by(
+            upload_id=upload.upload_id,
+            status=UploadSession.STATUS_UPLOADING,
+            received=upload.file_size
+        ).update({
+            'status': UploadSession.STATUS_FINALIZING,
+            'updated_at': datetime.now()
+        }, synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(upload)
+        if not claimed:
+            if upload.status == UploadSession.STATUS_DONE:
+                return upload
+            raise ChunkedUploadError('文件正在处理，请稍后再试', 409)
+
+        try:
+            return ChunkedUploadService._commit(upload)
+        except Exception:
+            # 处理失败时恢复为上传中，浏览器可以重新完成上传
+            db.session.rollback()
+            UploadSession.query.filter_by(
+                upload_id=upload.upload_id, status=UploadSession.STATUS_FINALIZING
+            ).update({'status': UploadSession.STATUS_UPLOADING}, synchronize_session=False)
+            db.session.commit()
+            raise
+
+    @staticmethod
+    def _commit(upload: UploadSession):
+        """校验已领取会话的临时文件，放入文件存储并创建文件记录"""
+        path = ChunkedUploadService.temp_path(upload)
+        digest = hashlib.md5()
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(ChunkedUploadService.READ_SIZE), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            raise ChunkedUploadError('上传已过期，请重新上传', 410)
+        file_md5 = digest.hexdigest()
+
+        if file_md5 != upload.file_md5:
+            logger.warning(f"分片上传校验失败 {upload.upload_id}: {file_md5} != {upload.file_md5}")
+            os.remove(path)
+            db.session.delete(upload)
+            db.session.commit()
+            raise ChunkedUploadError('文件校验失败，请重新上传', 422)
+
+        file_path = blob_store.commit_temp(path, file_md5, upload.file_name, upload.file_size)
+        file_record = create_file_record(
+            user_id=upload.user_id,
+            filename=upload.file_name,
+            file_path=file_path,
+            file_type=get_file_type(file_path),
+            file_size=upload.file_size,
+            file_md5=file_md5
+        )
+        upload.status = UploadSession.STATUS_DONE
+        upload.file_id = file_record.file_id
+        upload.updated_at = datetime.now()
+        db.session.commit()
+        return upload
+
+    @staticmethod
+    def sweep(limit: int = None):
+        """
+        删除过期的上传会话及其临时文件
+
+        Returns:
+            int: 删除的会话数
+        """
+        query = UploadSession.query.filter(UploadSession.expires_at < datetime.now())
+        if limit:
+            query = query.limit(limit)
+        expired = query.all()
+        for upload in expired:
+            try:
+                os.remove(ChunkedUploadService.temp_path(upload))
+            except FileNotFoundError:
+                pass
+            db.session.delete(upload)
+        if expired:
+            db.session.commit()
+        return len(expired)
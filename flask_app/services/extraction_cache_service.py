@@ -0,0 +1,290 @@
+"""
+AI识别结果缓存服务
+内存LRU作为前端，数据库表 extractioncache 作为持久层。
+命中次数与最近命中时间先在内存中累加，与过期、容量淘汰一起在应用上下文结束时定期写回；
+清除缓存时更新缓存版本，其他进程在 EXTRACTION_CACHE_SYNC_INTERVAL 秒内发现并清空各自的内存LRU。
+"""
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from flask_app import db
+from flask_app.models import ExtractionCache, SystemConfig
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCacheService:
+    """识别结果缓存服务类"""
+
+    # 系统配置中的缓存版本键，清除缓存时更新
+    GENERATION_KEY = 'extraction_cache_generation'
+
+    # 内存LRU：(file_md5, model_name, prompt_hash) -> (result, created_at)
+    _memory = OrderedDict()
+    _lock = threading.Lock()
+    # 尚未写回的命中记录：键 -> [命中次数, 最近命中时间]
+    _hits = {}
+    _last_flush = time.monotonic()
+    _last_evict = None
+    # 本进程内存LRU对应的缓存版本及上次检查时间
+    _generation = None
+    _generation_checked = None
+
+    @classmethod
+    def init_app(cls, app):
+        """应用上下文结束时写回命中记录并定期淘汰缓存"""
+
+        @app.teardown_appcontext
+        def _maintain_extraction_cache(exc=None):
+            # 先结束本次上下文的会话，淘汰缓存时不会提交调用方未完成的修改
+            db.session.remove()
+            try:
+                cls.maintain()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"维护识别缓存失败: {e}")
+
+    @staticmethod
+    def hash_prompt(prompt: str) -> str:
+        """计算提示词哈希"""
+        return hashlib.sha256((prompt or '').encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _ttl():
+        return timedelta(days=current_app.config.get('EXTRACTION_CACHE_TTL_DAYS', 30))
+
+    @classmethod
+    def _memory_get(cls, key):
+        with cls._lock:
+            item = cls._memory.get(key)
+            if item is None:
+                return None
+            cls._memory.move_to_end(key)
+            return item
+
+    @classmethod
+    def _memory_set(cls, key, result, created_at):
+        max_size = current_app.config.get('EXTRACTION_CACHE_MEMORY_SIZE', 256)
+        with cls._lock:
+            cls._memory[key] = (result, created_at)
+            cls._memory.move_to_end(key)
+            while len(cls._memory) > max_size:
+                cls._memory.popitem(last=False)
+
+    @classmethod
+    def _memory_discard(cls, key=None):
+        with cls._lock:
+            if key is None:
+                cls._memory.clear()
+            else:
+                cls._memory.pop(key, None)
+
+    @classmethod
+    def _record_hit(cls, key):
+        """在内存中记录一次命中，由 flush_hits() 批量写回"""
+        with cls._lock:
+            hit = cls._hits.setdefault(key, [0, None])
+            hit[0] += 1
+            hit[1] = datetime.now()
+
+    @classmethod
+    def _sync_generation(cls):
+        """其他进程清除缓存后清空本进程的内存LRU（每 EXTRACTION_CACHE_SYNC_INTERVAL 秒检查一次）"""
+        interval = current_app.config.get('EXTRACTION_CACHE_SYNC_INTERVAL', 5)
+        now = time.monotonic()
+        if cls._generation_checked is not None and now - cls._generation_checked < interval:
+            return
+        generation = SystemConfig.get_value(cls.GENERATION_KEY, '')
+        with cls._lock:
+            if generation != cls._generation:
+                cls._memory.clear()
+                cls._generation = generation
+            cls._generation_checked = now
+
+    @classmethod
+    def get(cls, file_md5: str, model_name: str, prompt: str):
+        """
+        查询缓存的识别结果
+
+        Returns:
+            dict: 命中时返回识别结果副本，未命中或已过期返回None
+        """
+        if not file_md5:
+            return None
+
+        key = (file_md5, model_name, cls.hash_prompt(prompt))
+        expire_before = datetime.now() - cls._ttl()
+        cls._sync_generation()
+
+        item = cls._memory_get(key)
+        if item is not None:
+            result, created_at = item
+            if created_at >= expire_before:
+                cls._record_hit(key)
+                return dict(result)
+            cls._memory_discard(key)
+
+        entry = ExtractionCache.query.filter_by(
+            file_md5=key[0],
+            model_name=key[1],
+            prompt_hash=key[2]
+        ).first()
+        # 过期的记录由 evict() 删除
+        if not entry or entry.created_at < expire_before:
+            return None
+
+        try:
+            result = json.loads(entry.result)
+        except (TypeError, ValueError):
+            return None
+
+        cls._record_hit(key)
+        cls._memory_set(key, result, entry.created_at)
+        return dict(result)
+
+    @classmethod
+    def set(cls, file_md5: str, model_name: str, prompt: str, result: dict):
+        """写入识别结果缓存（仅缓存非空结果）"""
+        if not file_md5 or not result or all(v in ('', None) for v in result.values()):
+            return
+
+        key = (file_md5, model_name, cls.hash_prompt(prompt))
+        now = datetime.now()
+
+        entry = ExtractionCache.query.filter_by(
+            file_md5=key[0],
+            model_name=key[1],
+            prompt_hash=key[2]
+        ).first()
+        if entry:
+            entry.result = json.dumps(result, ensure_ascii=False)
+            entry.created_at = now
+            entry.last_hit_at = now
+        else:
+            db.session.add(ExtractionCache(
+                file_md5=key[0],
+                model_name=key[1],
+                prompt_hash=key[2],
+                result=json.dumps(result, ensure_ascii=False),
+                created_at=now,
+                last_hit_at=now
+            ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 并发写入同一键，保留先写入的结果
+            db.session.rollback()
+
+        cls._memory_set(key, dict(result), now)
+
+    @classmethod
+    def flush_hits(cls):
+        """
+        将内存中累加的命中次数与最近命中时间写回数据库（使用独立的事务）
+
+        Returns:
+            int: 写回的命中次数
+        """
+        with cls._lock:
+            batch, cls._hits = cls._hits, {}
+            cls._last_flush = time.monotonic()
+        if not batch:
+            return 0
+
+        try:
+            with db.engine.begin() as connection:
+                for (file_md5, model_name, prompt_hash), (count, last_hit_at) in batch.items():
+                    connection.execute(
+                        update(ExtractionCache)
+                        .where(ExtractionCache.file_md5 == file_md5)
+                        .where(ExtractionCache.model_name == model_name)
+                        .where(ExtractionCache.prompt_hash == prompt_hash)
+                        .values(hit_count=ExtractionCache.hit_count + count, last_hit_at=last_hit_at)
+                    )
+        except Exception as e:
+            # 写回失败时退回内存，下次重试
+            with cls._lock:
+                for key, (count, last_hit_at) in batch.items():
+                    hit = cls._hits.setdefault(key, [0, last_hit_at])
+                    hit[0] += count
+                    hit[1] = max(hit[1], last_hit_at)
+            logger.error(f"写回识别缓存命中记录失败: {e}")
+            return 0
+        return sum(count for count, _ in batch.values())
+
+    @classmethod
+    def maintain(cls):
+        """按 EXTRACTION_CACHE_HIT_FLUSH_INTERVAL 写回命中记录，按 EXTRACTION_CACHE_EVICT_INTERVAL 淘汰缓存"""
+        config = current_app.config
+        now = time.monotonic()
+        if cls._hits and now - cls._last_flush >= config.get('EXTRACTION_CACHE_HIT_FLUSH_INTERVAL', 30):
+            cls.flush_hits()
+        if cls._last_evict is None or now - cls._last_evict >= config.get('EXTRACTION_CACHE_EVICT_INTERVAL', 600):
+            cls._last_evict = now
+            cls.evict()
+
+    @classmethod
+    def evict(cls):
+        """
+        按 TTL 与容量淘汰缓存，容量超出时删除最久未命中的记录
+
+        内存LRU中的记录读取时自行检查 TTL，不随淘汰清空。
+
+        Returns:
+            int: 删除的记录数
+        """
+        # 先写回命中时间，按最新的命中时间淘汰
+        cls.flush_hits()
+
+        expire_before = datetime.now() - cls._ttl()
+        removed = ExtractionCache.query.filter(
+            ExtractionCache.created_at < expire_before
+        ).delete(synchronize_session=False)
+
+        max_entries = current_app.config.get('EXTRACTION_CACHE_MAX_ENTRIES', 5000)
+        overflow = ExtractionCache.query.count() - max_entries
+        if overflow > 0:
+            stale_ids = [row.cache_id for row in ExtractionCache.query.with_entities(
+                ExtractionCache.cache_id
+            ).order_by(ExtractionCache.last_hit_at.asc()).limit(overflow)]
+            removed += ExtractionCache.query.filter(
+                ExtractionCache.cache_id.in_(stale_ids)
+            ).delete(synchronize_session=False)
+
+        db.session.commit()
+        return removed
+
+    @classmethod
+    def purge(cls, cache_ids=None):
+        """
+        清除缓存
+
+        同时更新缓存版本：本进程立即清空内存LRU，其他进程在 EXTRACTION_CACHE_SYNC_INTERVAL
+        秒内发现版本变化后清空，不再返回已清除的结果。
+
+        Args:
+            cache_ids: 要清除的缓存ID列表，为None时清除全部
+
+        Returns:
+            int: 删除的记录数
+        """
+        query = ExtractionCache.query
+        if cache_ids is not None:
+            query = query.filter(ExtractionCache.cache_id.in_(cache_ids))
+        removed = query.delete(synchronize_session=False)
+        generation = uuid.uuid4().hex
+        SystemConfig.set_value(cls.GENERATION_KEY, generation, description='AI识别缓存版本（清除缓存时更新）')
+        with cls._lock:
+            cls._memory.clear()
+            cls._generation = generation
+            cls._generation_checked = time.monotonic()
+        return removed
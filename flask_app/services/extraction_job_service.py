@@ -0,0 +1,468 @@
+"""
+AI识别任务服务
+任务持久化在 extractionjob 表中，由 ExtractionWorkerPool 后台线程执行
+"""
+from flask import current_app
+from sqlalchemy import func, update
+from collections import OrderedDict
+from datetime import timedelta
+import json
+import logging
+import threading
+import time
+
+from flask_app import db
+from flask_app.models import Certificate, ExtractionJob, SystemConfig, User
+from flask_app.services.extraction_scheduler import (
+    CLASS_BULK, CLASS_INTERACTIVE, JOB_CLASSES, QueueGroup, extraction_scheduler
+)
+from flask_app.services.job_events import job_events
+from flask_app.utils.certificate_utils import prepare_extracted_info
+from flask_app.utils.date_utils import parse_award_date
+
+logger = logging.getLogger(__name__)
+
+
+class UploadBuffer:
+    """
+    刚上传文件的内存副本
+
+    上传后立即识别时按任务ID暂存文件内容，同一进程的工作线程领取任务后直接使用，
+    不再从磁盘读取。超过总大小上限时不暂存；任务由其他进程执行时到期后释放。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # job_id -> (内容, 过期时间)
+        self._size = 0
+
+    def put(self, job_id, data, max_bytes, ttl):
+        """暂存文件内容，超过上限时返回False"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            if self._size + len(data) > max_bytes:
+                return False
+            self._items[job_id] = (data, now + ttl)
+            self._size += len(data)
+        return True
+
+    def pop(self, job_id):
+        """取出并移除文件内容，没有时返回None"""
+        with self._lock:
+            item = self._items.pop(job_id, None)
+            if item is None:
+                return None
+            self._size -= len(item[0])
+        return item[0]
+
+    def _evict_expired(self, now):
+        while self._items:
+            job_id, (data, expires_at) = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            del self._items[job_id]
+            self._size -= len(data)
+
+
+# 进程级单例
+upload_buffers = UploadBuffer()
+
+
+class ExtractionJobService:
+    """识别任务服务类"""
+
+    @staticmethod
+    def count_pending(user_id: str) -> int:
+        """用户排队中与识别中的单张识别任务数（不含批量上传）"""
+        return ExtractionJob.query.filter(
+            ExtractionJob.user_id == user_id,
+            ExtractionJob.batch_id.is_(None),
+            ExtractionJob.status.in_([ExtractionJob.STATUS_QUEUED, ExtractionJob.STATUS_RUNNING])
+        ).count()
+
+    @staticmethod
+    def count_queued(job_class: str = None) -> int:
+        """排队中的任务数，可按任务类别筛选"""
+        query = ExtractionJob.query.filter_by(status=ExtractionJob.STATUS_QUEUED)
+        if job_class:
+            query = query.filter_by(job_class=job_class)
+        return query.count()
+
+    @staticmethod
+    def can_enqueue(user_id: str) -> bool:
+        """用户未完成的识别任务是否低于 EXTRACTION_JOB_MAX_PENDING_PER_USER"""
+        limit = current_app.config.get('EXTRACTION_JOB_MAX_PENDING_PER_USER', 5)
+        return not limit or ExtractionJobService.count_pending(user_id) < limit
+
+    @staticmethod
+    def _schedule_fields(user_id: str, job_class: str):
+        """任务的调度字段：类别、基础优先级、提交用户所在学院"""
+        user = db.session.get(User, user_id)
+        priority = extraction_scheduler.priority_for(
+            job_class, role=user.role if user else None, deadline=SystemConfig.get_deadline()
+        )
+        return {
+            'job_class': job_class,
+            'priority': priority,
+            'department': user.department if user else None
+        }
+
+    @staticmethod
+    def enqueue(user_id: str, file_path: str, file_md5: str = None, file_type: str = 'image',
+                file_data: bytes = None, job_class: str = CLASS_INTERACTIVE, batch_id: str = None):
+        """
+        创建识别任务并唤醒后台工作线程
+
+        Args:
+            file_data: 已在内存中的文件内容（上传后立即识别时），交给本进程的工作线程使用
+            job_class: 任务类别（见 extraction_scheduler），决定调度优先级
+            batch_id: 所属批次
+
+        Returns:
+            ExtractionJob: 新建的任务
+        """
+        job = ExtractionJob(
+            user_id=user_id,
+            file_path=file_path,
+            file_md5=file_md5,
+            file_type=file_type,
+            batch_id=batch_id,
+            status=ExtractionJob.STATUS_QUEUED,
+            stage=ExtractionJob.STAGE_QUEUED,
+            created_at=extraction_scheduler.now(),
+            **ExtractionJobService._schedule_fields(user_id, job_class)
+        )
+        db.session.add(job)
+        db.session.commit()
+        if file_data is not None:
+            upload_buffers.put(
+                job.job_id, file_data,
+                current_app.config.get('EXTRACTION_UPLOAD_BUFFER_MAX_BYTES', 64 * 1024 * 1024),
+                current_app.config.get('EXTRACTION_JOB_TIMEOUT', 300)
+            )
+        job_events.publish(job.user_id, job.job_id)
+
+        from flask_app.services.extraction_worker import extraction_workers
+        extraction_workers.notify()
+        return job
+
+    @staticmethod
+    def enqueue_batch(user_id: str, items: list, batch_id: str, job_class: str = CLASS_BULK):
+        """
+        批量创建识别任务（一次提交）
+
+        Args:
+            user_id: 提交用户ID
+            items: [{'file_path': ..., 'file_md5': ..., 'file_type': ..., 'cert_id': ...}, ...]
+            batch_id: 批次ID
+            job_class: 任务类别，默认为批量上传
+
+        Returns:
+            list: 新建的任务列表
+        """
+        now = extraction_scheduler.now()
+        schedule = ExtractionJobService._schedule_fields(user_id, job_class)
+        jobs = [ExtractionJob(
+            user_id=user_id,
+            file_path=item['file_path'],
+            file_md5=item.get('file_md5'),
+            file_type=item.get('file_type', 'image'),
+            batch_id=batch_id,
+            cert_id=item.get('cert_id'),
+            status=ExtractionJob.STATUS_QUEUED,
+            stage=ExtractionJob.STAGE_QUEUED,
+            created_at=now,
+            **schedule
+        ) for item in items]
+        db.session.add_all(jobs)
+        db.session.commit()
+        for job in jobs:
+            job_events.publish(job.user_id, job.job_id)
+
+        from flask_app.services.extraction_worker import extraction_workers
+        extraction_workers.notify(all_workers=True)
+        return jobs
+
+    @staticmethod
+    def get_batch_jobs(batch_id: str, user_id: str = None):
+        """获取批次内的全部任务"""
+        query = ExtractionJob.query.filter_by(batch_id=batch_id)
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        return query.order_by(ExtractionJob.created_at.asc(), ExtractionJob.file_path.asc()).all()
+
+    @staticmethod
+    def get_job(job_id: str, user_id: str = None):
+        """获取任务，指定 user_id 时只返回该用户的任务"""
+        query = ExtractionJob.query.filter_by(job_id=job_id)
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        return query.first()
+
+    @staticmethod
+    def has_data(result: dict) -> bool:
+        """识别结果是否至少有一个非空字段"""
+        return bool(result) and any(v not in ('', None) for v in result.values())
+
+    @staticmethod
+    def find_active_job(user_id: str, file_path: str):
+        """
+        查找用户对同一文件可以沿用的最近一个单张识别任务
+
+        只返回排队中、识别中或已识别出内容的任务；失败或结果为空的任务不沿用，用户可以重新识别。
+        """
+        jobs = ExtractionJob.query.filter(
+            ExtractionJob.user_id == user_id,
+            ExtractionJob.file_path == file_path,
+            ExtractionJob.batch_id.is_(None),
+            ExtractionJob.status != ExtractionJob.STATUS_FAILED
+        ).order_by(ExtractionJob.created_at.desc()).limit(5)
+        for job in jobs:
+            if job.status != ExtractionJob.STATUS_DONE \
+                    or ExtractionJobService.has_data(ExtractionJobService.get_result(job)):
+                return job
+        return None
+
+    @staticmethod
+    def claim_next():
+        """
+        领取下一个排队中的任务
+
+        通过带状态条件的 UPDATE 抢占任务，多个线程或进程共享同一
+        SQLite 数据库时也只会有一个领取成功。排队任务按（优先级, 学院）
+        分组后由 extraction_scheduler 选择分组，再领取组内最早的任务。
+        批量任务同时运行的数量受 BULK_EXTRACTION_CONCURRENCY 限制，为单张识别保留工作线程。
+
+        Returns:
+            ExtractionJob: 领取到的任务，队列为空时返回None
+        """
+        bulk_limit = current_app.config.get('BULK_EXTRACTION_CONCURRENCY', 3)
+
+        while True:
+            running_bulk = ExtractionJob.query.filter(
+                ExtractionJob.status == ExtractionJob.STATUS_RUNNING,
+                ExtractionJob.batch_id.isnot(None)
+            ).count()
+            queued = ExtractionJob.query.filter_by(status=ExtractionJob.STATUS_QUEUED)
+            if running_bulk >= bulk_limit:
+                queued = queued.filter(ExtractionJob.batch_id.is_(None))
+
+            groups = [
+                QueueGroup(priority, department, oldest, count)
+                for priority, department, oldest, count in queued.with_entities(
+                    ExtractionJob.priority, ExtractionJob.department,
+                    func.min(ExtractionJob.created_at), func.count(ExtractionJob.job_id)
+                ).group_by(ExtractionJob.priority, ExtractionJob.department).all()
+            ]
+            running = dict(db.session.query(
+                ExtractionJob.department, func.count(ExtractionJob.job_id)
+            ).filter_by(status=ExtractionJob.STATUS_RUNNING).group_by(ExtractionJob.department).all())
+
+            group = extraction_scheduler.choose(groups, running)
+            if group is None:
+                return None
+
+            candidate = queued.with_entities(ExtractionJob.job_id).filter(
+                ExtractionJob.priority.is_(None) if group.priority is None
+                else ExtractionJob.priority == group.priority,
+                ExtractionJob.department.is_(None) if group.department is None
+                else ExtractionJob.department == group.department
+            ).order_by(ExtractionJob.created_at.asc()).first()
+            if candidate is None:
+                continue
+
+            claimed = db.session.execute(
+                update(ExtractionJob)
+                .where(ExtractionJob.job_id == candidate.job_id)
+                .where(ExtractionJob.status == ExtractionJob.STATUS_QUEUED)
+                .values(status=ExtractionJob.STATUS_RUNNING, stage=ExtractionJob.STAGE_ENCODING,
+                        started_at=extraction_scheduler.now())
+            ).rowcount
+            db.session.commit()
+
+            if claimed == 1:
+                job = db.session.get(ExtractionJob, candidate.job_id)
+                job_events.publish(job.user_id, job.job_id)
+                return job
+            # 被其他工作线程抢先领取，继续尝试下一个
+
+    @staticmethod
+    def set_stage(job: ExtractionJob, stage: str):
+        """更新任务的识别阶段并通知进度推送连接"""
+        if job.stage == stage:
+            return
+        job.stage = stage
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        job_events.publish(job.user_id, job.job_id)
+
+    @staticmethod
+    def complete(job: ExtractionJob, result: dict):
+        """标记任务完成并保存识别结果"""
+        job.status = ExtractionJob.STATUS_DONE
+        job.stage = ExtractionJob.STAGE_PARSED
+        job.result = json.dumps(result or {}, ensure_ascii=False)
+        job.finished_at = extraction_scheduler.now()
+        db.session.commit()
+        job_events.publish(job.user_id, job.job_id)
+
+    @staticmethod
+    def fail(job: ExtractionJob, error: str):
+        """标记任务失败"""
+        job.status = ExtractionJob.STATUS_FAILED
+        job.stage = ExtractionJob.STAGE_FAILED
+        job.error = error
+        job.finished_at = extraction_scheduler.now()
+        db.session.commit()
+        job_events.publish(job.user_id, job.job_id)
+
+    @staticmethod
+    def get_result(job: ExtractionJob):
+        """解析任务的识别结果"""
+        if not job.result:
+            return {}
+        try:
+            return json.loads(job.result)
+        except (TypeError, ValueError):
+            return {}
+
+    @staticmethod
+    def requeue_stale():
+        """
+        将超时仍处于运行中的任务重新放回队列（如进程崩溃或重启）
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        timeout = current_app.config.get('EXTRACTION_JOB_TIMEOUT', 300)
+        stale_before = extraction_scheduler.now() - timedelta(seconds=timeout)
+        count = ExtractionJob.query.filter(
+            ExtractionJob.status == ExtractionJob.STATUS_RUNNING,
+            ExtractionJob.started_at < stale_before
+        ).update({
+            'status': ExtractionJob.STATUS_QUEUED,
+            'stage': ExtractionJob.STAGE_QUEUED,
+            'started_at': None
+        }, synchronize_session=False)
+        db.session.commit()
+        if count:
+            logger.warning(f"已将 {count} 个超时的识别任务重新排队")
+        return count
+
+    @staticmethod
+    def queue_stats(window_minutes: int = 60):
+        """
+        识别队列统计
+
+        Args:
+            window_minutes: 统计平均等待时间的时间窗口（分钟），取此时间内开始执行的任务
+
+        Returns:
+            dict: {'classes': {类别: {queued, running, oldest_wait, avg_wait, max_wait, started}},
+                   'departments': [{department, queued, running}], 'generated_at': ...}
+        """
+        now = extraction_scheduler.now()
+
+        def empty_stats():
+            return {'queued': 0, 'running': 0, 'oldest_wait': 0, 'avg_wait': 0, 'max_wait': 0, 'started': 0}
+
+        classes = {job_class: empty_stats() for job_class in JOB_CLASSES}
+
+        active = db.session.query(
+            ExtractionJob.job_class, ExtractionJob.status,
+            func.count(ExtractionJob.job_id), func.min(ExtractionJob.created_at)
+        ).filter(
+            ExtractionJob.status.in_([ExtractionJob.STATUS_QUEUED, ExtractionJob.STATUS_RUNNING])
+        ).group_by(ExtractionJob.job_class, ExtractionJob.status).all()
+        for job_class, status, count, oldest in active:
+            stats = classes.setdefault(job_class or CLASS_INTERACTIVE, empty_stats())
+            if status == ExtractionJob.STATUS_QUEUED:
+                stats['queued'] += count
+                stats['oldest_wait'] = max(stats['oldest_wait'], round((now - oldest).total_seconds(), 1))
+            else:
+                stats['running'] += count
+
+        # 最近开始执行的任务的排队时间
+        started = db.session.query(
+            ExtractionJob.job_class, ExtractionJob.created_at, ExtractionJob.started_at
+        ).filter(
+            ExtractionJob.started_at >= now - timedelta(minutes=window_minutes)
+        ).all()
+        waits = {}
+        for job_class, created_at, started_at in started:
+            waits.setdefault(job_class or CLASS_INTERACTIVE, []).append(
+                max((started_at - created_at).total_seconds(), 0)
+            )
+        for job_class, values in waits.items():
+            stats = classes.setdefault(job_class, empty_stats())
+            stats['started'] = len(values)
+            stats['avg_wait'] = round(sum(values) / len(values), 1)
+            stats['max_wait'] = round(max(values), 1)
+
+        departments = {}
+        for department, status, count in db.session.query(
+            ExtractionJob.department, ExtractionJob.status, func.count(ExtractionJob.job_id)
+        ).filter(
+            ExtractionJob.status.in_([ExtractionJob.STATUS_QUEUED, ExtractionJob.STATUS_RUNNING])
+        ).group_by(ExtractionJob.department, ExtractionJob.status).all():
+            item = departments.setdefault(department, {'department': department, 'queued': 0, 'running': 0})
+            item['queued' if status == ExtractionJob.STATUS_QUEUED else 'running'] += count
+
+        return {
+            'classes': classes,
+            'departments': sorted(departments.values(), key=lambda d: -d['queued']),
+            'window_minutes': window_minutes,
+            'generated_at': now.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    @staticmethod
+    def run_job(job: ExtractionJob):
+        """执行单个识别任务"""
+        from flask_app.api.certificate_extractor import CertificateExtractor
+
+        try:
+            logger.info(f"开始执行识别任务 {job.job_id}: {job.file_path}")
+            extractor = CertificateExtractor()
+            result = extractor.extract_certificate_info(
+                job.file_path, job.file_type,
+                progress=lambda stage: ExtractionJobService.set_stage(job, stage),
+                file_data=upload_buffers.pop(job.job_id),
+                raise_errors=True
+            )
+            if job.cert_id:
+                ExtractionJobService.apply_to_certificate(job, result)
+            ExtractionJobService.complete(job, result)
+            logger.info(f"识别任务 {job.job_id} 完成")
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"识别任务 {job.job_id} 失败: {e}")
+            ExtractionJobService.fail(job, str(e))
+
+    @staticmethod
+    def apply_to_certificate(job: ExtractionJob, result: dict):
+        """
+        将识别结果回填到任务关联的草稿证书
+
+        只填充仍为空的字段，不覆盖用户在识别期间已修改的内容。
+        """
+        cert = db.session.get(Certificate, job.cert_id)
+        if not cert or cert.status != 'draft':
+            return
+
+        user = db.session.get(User, job.user_id)
+        info = prepare_extracted_info(result, user) if user else dict(result or {})
+        info.setdefault('department', info.get('student_department', ''))
+
+        for field in ['student_id', 'student_name', 'department', 'competition_name',
+                      'award_category', 'award_level', 'competition_type', 'organizer',
+                      'advisor', 'advisor_id']:
+            value = info.get(field)
+            if value and not getattr(cert, field):
+                setattr(cert, field, str(value))
+
+        if cert.award_date is None:
+            cert.award_date = parse_award_date(info.get('award_date'))
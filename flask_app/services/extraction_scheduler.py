@@ -0,0 +1,123 @@
+"""
+识别任务调度
+按任务类别与截止时间计算优先级，排队时间越长优先级越高（防止饿死）；
+同一优先级内按学院公平分配，正在识别的任务较少的学院先领取。
+时钟可替换为 SimulatedClock，用于离线模拟调度效果（flask benchmark schedule）。
+"""
+from flask import current_app, has_app_context
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# 任务类别
+CLASS_INTERACTIVE = 'interactive'  # 单张上传，用户在页面等待结果
+CLASS_BULK = 'bulk'  # 批量上传
+CLASS_REPROCESS = 'reprocess'  # 管理员重新识别历史证书
+
+JOB_CLASSES = (CLASS_INTERACTIVE, CLASS_BULK, CLASS_REPROCESS)
+
+# 默认配置（可通过 Flask 配置 EXTRACTION_* 覆盖）
+DEFAULT_PRIORITIES = {CLASS_INTERACTIVE: 100, CLASS_BULK: 50, CLASS_REPROCESS: 10}
+DEFAULT_DEADLINE_BOOST = 30
+DEFAULT_DEADLINE_BOOST_HOURS = 48
+DEFAULT_AGING_SECONDS = 30
+
+# 排队中的一组任务：相同优先级与学院
+QueueGroup = namedtuple('QueueGroup', ['priority', 'department', 'oldest', 'count'])
+
+
+class SimulatedClock:
+    """模拟时钟，时间只在调用 advance() 时前进"""
+
+    def __init__(self, start=None):
+        self._now = start or datetime(2024, 1, 1, 8, 0, 0)
+
+    def now(self):
+        return self._now
+
+    def advance(self, seconds):
+        self._now += timedelta(seconds=seconds)
+        return self._now
+
+    def set(self, value):
+        self._now = value
+
+
+class ExtractionScheduler:
+    """
+    识别任务调度器
+
+    priority_for() 在任务入队时计算基础优先级：按类别取 EXTRACTION_PRIORITIES，
+    非管理员用户在截止前 EXTRACTION_DEADLINE_BOOST_HOURS 小时内入队的任务再加
+    EXTRACTION_DEADLINE_BOOST。choose() 在领取时选择下一组任务。
+    """
+
+    def __init__(self, clock=None, config=None):
+        """
+        Args:
+            clock: 提供 now() 的时钟，默认使用系统时间
+            config: 配置字典，默认读取 Flask 配置
+        """
+        self.clock = clock
+        self.config = config
+
+    def now(self):
+        return self.clock.now() if self.clock is not None else datetime.now()
+
+    def _get_setting(self, name, default):
+        if self.config is not None:
+            return self.config.get(name, default)
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def priority_for(self, job_class, role=None, deadline=None):
+        """
+        计算任务的基础优先级
+
+        Args:
+            job_class: 任务类别
+            role: 提交用户的角色，管理员与教学秘书不受截止时间影响
+            deadline: 提交截止时间，为空时不加权
+        """
+        priorities = dict(DEFAULT_PRIORITIES, **self._get_setting('EXTRACTION_PRIORITIES', {}))
+        priority = priorities.get(job_class, priorities[CLASS_INTERACTIVE])
+        if job_class != CLASS_REPROCESS and deadline is not None and role not in ('admin', 'secretary'):
+            hours = self._get_setting('EXTRACTION_DEADLINE_BOOST_HOURS', DEFAULT_DEADLINE_BOOST_HOURS)
+            remaining = deadline - self.now()
+            if timedelta(0) <= remaining <= timedelta(hours=hours):
+                priority += self._get_setting('EXTRACTION_DEADLINE_BOOST', DEFAULT_DEADLINE_BOOST)
+        return priority
+
+    def effective_priority(self, group, now=None):
+        """基础优先级加上排队时间的补偿（每 EXTRACTION_PRIORITY_AGING_SECONDS 秒加1）"""
+        aging = self._get_setting('EXTRACTION_PRIORITY_AGING_SECONDS', DEFAULT_AGING_SECONDS)
+        if not aging:
+            return group.priority
+        waited = ((now or self.now()) - group.oldest).total_seconds()
+        return group.priority + max(waited, 0) / aging
+
+    def choose(self, groups, running_by_department=None, now=None):
+        """
+        选择下一个领取任务的分组
+
+        先取有效优先级最高的分组所在的优先级，再在该优先级的各学院中
+        选择正在识别的任务最少的学院，相同时取排队最久的。
+
+        Args:
+            groups: QueueGroup 列表
+            running_by_department: {学院: 正在识别的任务数}
+
+        Returns:
+            QueueGroup: 选中的分组，没有任务时返回None
+        """
+        if not groups:
+            return None
+        now = now or self.now()
+        running = running_by_department or {}
+        top = max(groups, key=lambda g: (self.effective_priority(g, now), -g.oldest.timestamp()))
+        same_tier = [g for g in groups if g.priority == top.priority]
+        return min(same_tier, key=lambda g: (running.get(g.department, 0), g.oldest))
+
+
+# 进程级单例
+extraction_scheduler = ExtractionScheduler()
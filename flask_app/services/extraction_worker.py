@@ -0,0 +1,105 @@
+"""
+AI识别后台工作线程池
+随应用进程启动，无需外部消息队列
+"""
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionWorkerPool:
+    """
+    本地识别工作线程池
+
+    工作线程循环领取 extractionjob 表中排队的任务；新任务入队时通过
+    notify() 立即唤醒，其他进程入队的任务由轮询兜底。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._app = None
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def init_app(self, app):
+        """在第一次请求时启动工作线程（避免调试重载的父进程启动线程）"""
+        if not app.config.get('EXTRACTION_WORKERS_ENABLED', True):
+            return
+
+        @app.before_request
+        def _start_extraction_workers():
+            if not self.started:
+                self.start(app)
+
+    def start(self, app):
+        """启动工作线程"""
+        with self._lock:
+            if self._threads:
+                return
+            self._app = app
+            self._stopping = False
+
+            with app.app_context():
+                from flask_app.services.extraction_job_service import ExtractionJobService
+                ExtractionJobService.requeue_stale()
+
+            count = app.config.get('EXTRACTION_WORKER_COUNT', 2)
+            for index in range(count):
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f'extraction-worker-{index}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"已启动 {count} 个AI识别工作线程")
+
+    def stop(self, timeout=None):
+        """停止工作线程"""
+        with self._lock:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+        self.notify(all_workers=True)
+        for thread in threads:
+            thread.join(timeout)
+
+    def notify(self, all_workers=False):
+        """唤醒工作线程领取新任务"""
+        with self._wakeup:
+            if all_workers:
+                self._wakeup.notify_all()
+            else:
+                self._wakeup.notify()
+
+    def _run(self):
+        from flask_app import db
+        from flask_app.services.extraction_job_service import ExtractionJobService
+
+        app = self._app
+        poll_interval = app.config.get('EXTRACTION_JOB_POLL_INTERVAL', 2)
+
+        while not self._stopping:
+            job = None
+            with app.app_context():
+                try:
+                    job = ExtractionJobService.claim_next()
+                    if job is not None:
+                        ExtractionJobService.run_job(job)
+                except Exception as e:
+                    logger.exception(f"识别工作线程异常: {e}")
+                finally:
+                    db.session.remove()
+
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(poll_interval)
+
+
+# 进程级单例
+extraction_workers = ExtractionWorkerPool()
@@ -7,6 +7,7 @@ from flask_app.utils.file_utils import (
     save_uploaded_file, calculate_file_md5, create_file_record,
     get_user_upload_folder, generate_unique_filename
 )
+from flask_app.services.blob_store import blob_store
 from datetime import datetime
 import os
 
@@ -60,8 +61,8 @@ class FileService:
         """删除文件记录和文件"""
         file_record = File.query.get_or_404(file_id)
         
-        # 删除物理文件
-        if os.path.exists(file_record.file_path):
+        # 删除物理文件（按内容存放的文件可能被其他记录引用，由 flask blobs gc 在引用数归零后清理）
+        if blob_store.parse_key(file_record.file_path) is None and os.path.exists(file_record.file_path):
             try:
                 os.remove(file_record.file_path)
             except OSError:
@@ -0,0 +1,96 @@
+"""
+识别任务进度推送
+进程内的事件中转：任务状态或阶段变化时通知该用户的 SSE 连接，
+连接收到通知后从数据库读取任务最新状态再推送给浏览器。
+其他进程中的变化由连接定时查询数据库兜底。
+
+等待事件使用 threading.Condition，在 gevent 下（gunicorn -k gevent，猴子补丁）
+会变为协程切换，空闲连接不占用系统线程。
+"""
+from flask import current_app, has_app_context
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """一个 SSE 连接的订阅，收到的任务ID合并后一次取出"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._cond = threading.Condition()
+        self._pending = set()
+
+    def put(self, job_id):
+        with self._cond:
+            self._pending.add(job_id)
+            self._cond.notify()
+
+    def wait(self, timeout):
+        """
+        等待任务变化
+
+        Returns:
+            set: 有变化的任务ID，超时时为空集合
+        """
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, set()
+        return pending
+
+
+class JobEventBroker:
+    """进程级任务事件中转"""
+
+    DEFAULT_MAX_SUBSCRIBERS = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set(Subscription)
+        self._count = 0
+
+    def subscribe(self, user_id):
+        """
+        订阅用户的任务事件
+
+        Returns:
+            Subscription: 订阅，连接数已达 JOB_EVENTS_MAX_SUBSCRIBERS 时返回None
+        """
+        limit = self.DEFAULT_MAX_SUBSCRIBERS
+        if has_app_context():
+            limit = current_app.config.get('JOB_EVENTS_MAX_SUBSCRIBERS', limit)
+        with self._lock:
+            if limit and self._count >= limit:
+                return None
+            subscription = Subscription(user_id)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+            self._count -= 1
+
+    def publish(self, user_id, job_id):
+        """通知用户的全部连接任务有变化"""
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(job_id)
+
+    def subscriber_count(self):
+        """当前连接数"""
+        with self._lock:
+            return self._count
+
+
+# 进程级单例
+job_events = JobEventBroker()
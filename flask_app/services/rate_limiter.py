@@ -0,0 +1,200 @@
+"""
+API密钥限流器 - 按密钥限制调用速率（令牌桶）与并发数
+"""
+from collections import deque
+from contextlib import contextmanager
+from flask import current_app, has_app_context
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitTimeout(Exception):
+    """等待限流超时"""
+    pass
+
+
+class KeyRateLimiter:
+    """
+    单个密钥的限流器
+
+    令牌桶按 rate（次/秒）补充令牌，容量为 max(1, rate)；同时最多
+    max_concurrency 个调用在进行中。超出限制的请求按先来先到排队等待，
+    超时抛出 RateLimitTimeout。rate 或 max_concurrency 为空表示不限制。
+
+    clock 可替换为假时钟，配合 try_acquire() 在不等待的情况下测试。
+    """
+
+    def __init__(self, rate=None, max_concurrency=None, clock=time.monotonic):
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self.rate = None
+        self.max_concurrency = None
+        self.in_flight = 0
+        self._tokens = 0.0
+        self._updated = clock()
+        self.configure(rate, max_concurrency)
+
+    @property
+    def capacity(self):
+        return max(1.0, self.rate) if self.rate else 0.0
+
+    @property
+    def waiting(self):
+        return len(self._queue)
+
+    def configure(self, rate=None, max_concurrency=None):
+        """更新限流参数（管理员修改密钥后生效）"""
+        rate = float(rate) if rate and rate > 0 else None
+        max_concurrency = int(max_concurrency) if max_concurrency and max_concurrency > 0 else None
+
+        with self._cond:
+            if rate == self.rate and max_concurrency == self.max_concurrency:
+                return
+            self._refill(self._clock())
+            was_limited = self.rate is not None
+            self.rate = rate
+            self.max_concurrency = max_concurrency
+            # 新启用速率限制时令牌桶从满开始
+            self._tokens = min(self._tokens, self.capacity) if was_limited else self.capacity
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        if self.rate:
+            elapsed = max(now - self._updated, 0.0)
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def _try_take(self, now):
+        """
+        尝试占用一个调用名额
+
+        Returns:
+            float: 0 表示成功；正数为令牌补充所需秒数；None 表示需等待并发名额释放
+        """
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return None
+        if self.rate:
+            self._refill(now)
+            if self._tokens < 1.0:
+                return (1.0 - self._tokens) / self.rate
+            self._tokens -= 1.0
+        self.in_flight += 1
+        return 0
+
+    def try_acquire(self):
+        """不等待地尝试占用名额，有排队请求时不插队"""
+        with self._cond:
+            if self._queue:
+                return False
+            return self._try_take(self._clock()) == 0
+
+    def acquire(self, timeout=None):
+        """
+        占用一个调用名额，超出限制时排队等待
+
+        Args:
+            timeout: 最长等待秒数，None 表示一直等待
+
+        Raises:
+            RateLimitTimeout: 等待超时
+        """
+        with self._cond:
+            ticket = object()
+            self._queue.append(ticket)
+            deadline = None if timeout is None else self._clock() + timeout
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] is ticket:
+                        wait = self._try_take(self._clock())
+                        if wait == 0:
+                            return
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            raise RateLimitTimeout("AI识别请求排队超时，请稍后重试")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                # 唤醒新的队首
+                self._cond.notify_all()
+
+    def release(self):
+        """释放调用名额"""
+        with self._cond:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self._cond.notify_all()
+
+
+class RateLimiterRegistry:
+    """进程级限流器注册表，按密钥ID维护限流器"""
+
+    # 默认配置（可通过 Flask 配置 AI_KEY_DEFAULT_RPS / AI_KEY_DEFAULT_MAX_CONCURRENCY / AI_RATE_LIMIT_TIMEOUT 覆盖）
+    DEFAULT_RPS = 2
+    DEFAULT_MAX_CONCURRENCY = 5
+    DEFAULT_TIMEOUT = 60
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._limiters = {}
+
+    def _get_setting(self, name, default):
+        """读取 Flask 配置，无应用上下文时使用默认值"""
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def get(self, api_key_obj):
+        """获取密钥对应的限流器，并按密钥当前设置更新参数"""
+        rate = getattr(api_key_obj, 'rate_limit_rps', None)
+        if rate is None:
+            rate = self._get_setting('AI_KEY_DEFAULT_RPS', self.DEFAULT_RPS)
+        max_concurrency = getattr(api_key_obj, 'max_concurrency', None)
+        if max_concurrency is None:
+            max_concurrency = self._get_setting('AI_KEY_DEFAULT_MAX_CONCURRENCY', self.DEFAULT_MAX_CONCURRENCY)
+
+        with self._lock:
+            limiter = self._limiters.get(api_key_obj.key_id)
+            if limiter is None:
+                limiter = KeyRateLimiter(rate, max_concurrency, clock=self._clock)
+                self._limiters[api_key_obj.key_id] = limiter
+                return limiter
+        limiter.configure(rate, max_concurrency)
+        return limiter
+
+    @contextmanager
+    def limit(self, api_key_obj, timeout=None):
+        """
+        在限流名额内执行调用
+
+        用法:
+            with rate_limiter.limit(api_key_obj):
+                client.chat.completions.create(...)
+        """
+        if timeout is None:
+            timeout = self._get_setting('AI_RATE_LIMIT_TIMEOUT', self.DEFAULT_TIMEOUT)
+        limiter = self.get(api_key_obj)
+        started = self._clock()
+        limiter.acquire(timeout)
+        waited = self._clock() - started
+        if waited > 1:
+            logger.info(f"API密钥 {api_key_obj.key_id} 限流排队 {waited:.1f} 秒")
+        try:
+            yield limiter
+        finally:
+            limiter.release()
+
+    def discard(self, key_id):
+        """移除密钥的限流器（如密钥被删除）"""
+        with self._lock:
+            self._limiters.pop(key_id, None)
+
+
+# 进程级单例
+rate_limiter = RateLimiterRegistry()
@@ -0,0 +1,217 @@
+"""
+历史证书重新识别服务
+修改提示词后按证书ID分批（键集分页）重新识别，将与证书现有内容不一致的字段
+写入 reextractiondiff 表供对比，不修改证书本身。识别任务以 reprocess 类别进入
+识别队列，优先级最低，由调度器保证不影响用户上传的识别。
+"""
+from datetime import datetime
+import json
+import logging
+import os
+
+from flask_app import db
+from flask_app.models import Certificate, ExtractionJob, ReextractionDiff, ReextractionRun
+from flask_app.services.extraction_cache_service import ExtractionCacheService
+from flask_app.services.extraction_job_service import ExtractionJobService
+from flask_app.services.extraction_scheduler import CLASS_REPROCESS
+from flask_app.utils.date_utils import parse_award_date
+from flask_app.utils.file_utils import get_file_type, resolve_file_md5
+
+logger = logging.getLogger(__name__)
+
+
+class ReextractionService:
+    """历史证书重新识别"""
+
+    # 证书字段 -> 识别结果字段
+    DIFF_FIELDS = {
+        'student_id': 'student_id',
+        'student_name': 'student_name',
+        'department': 'student_department',
+        'competition_name': 'competition_name',
+        'award_category': 'award_category',
+        'award_level': 'award_level',
+        'competition_type': 'competition_type',
+        'organizer': 'organizer',
+        'advisor': 'advisor',
+        'award_date': 'award_date',
+    }
+
+    # 支持的证书筛选条件
+    FILTERS = ('status', 'department', 'since')
+
+    @staticmethod
+    def start_run(user_id: str, filters: dict = None, prompt: str = None):
+        """
+        创建重新识别任务
+
+        Args:
+            user_id: 发起的管理员，识别任务以其名义排队
+            filters: 证书筛选条件，见 FILTERS
+            prompt: 当前系统提示词，记录其哈希便于区分不同提示词的对比结果
+        """
+        filters = {k: v for k, v in (filters or {}).items() if k in ReextractionService.FILTERS and v}
+        run = ReextractionRun(
+            created_by=user_id,
+            filters=json.dumps(filters, ensure_ascii=False),
+            prompt_hash=ExtractionCacheService.hash_prompt(prompt) if prompt is not None else None
+        )
+        run.total = ReextractionService.certificate_query(filters).count()
+        db.session.add(run)
+        db.session.commit()
+        return run
+
+    @staticmethod
+    def get_run(run_id: str):
+        return db.session.get(ReextractionRun, run_id)
+
+    @staticmethod
+    def get_filters(run: ReextractionRun) -> dict:
+        try:
+            return json.loads(run.filters) if run.filters else {}
+        except (TypeError, ValueError):
+            return {}
+
+    @staticmethod
+    def certificate_query(filters: dict):
+        """按筛选条件查询证书"""
+        query = Certificate.query
+        if filters.get('status'):
+            query = query.filter(Certificate.status == filters['status'])
+        if filters.get('department'):
+            query = query.filter(Certificate.department == filters['department'])
+        if filters.get('since'):
+            query = query.filter(Certificate.created_at >= datetime.strptime(filters['since'], '%Y-%m-%d'))
+        return query
+
+    @staticmethod
+    def next_batch(run: ReextractionRun, batch_size: int):
+        """
+        读取断点之后的下一批证书
+
+        按 cert_id 键集分页，不使用 OFFSET，运行期间新增或删除证书不会导致重复或遗漏。
+        """
+        query = ReextractionService.certificate_query(ReextractionService.get_filters(run))
+        if run.last_cert_id:
+            query = query.filter(Certificate.cert_id > run.last_cert_id)
+        return query.order_by(Certificate.cert_id.asc()).limit(batch_size).all()
+
+    @staticmethod
+    def enqueue(run: ReextractionRun, cert: Certificate):
+        """
+        为证书创建重新识别任务（不关联 cert_id，识别结果不会回填证书）
+
+        Returns:
+            ExtractionJob: 新建的任务，证书文件不存在时返回None
+        """
+        if not cert.file_path or not os.path.isfile(cert.file_path):
+            return None
+        return ExtractionJobService.enqueue(
+            user_id=run.created_by,
+            file_path=cert.file_path,
+            file_md5=resolve_file_md5(cert.file_path),
+            file_type=get_file_type(cert.file_path),
+            job_class=CLASS_REPROCESS,
+            batch_id=run.run_id
+        )
+
+    @staticmethod
+    def poll_results(job_ids):
+        """
+        查询任务结果
+
+        Returns:
+            dict: {job_id: 识别结果}，失败的任务结果为None，未结束的任务不包含在内
+        """
+        if not job_ids:
+            return {}
+        rows = db.session.query(
+            ExtractionJob.job_id, ExtractionJob.status, ExtractionJob.result
+        ).filter(
+            ExtractionJob.job_id.in_(list(job_ids)),
+            ExtractionJob.status.in_([ExtractionJob.STATUS_DONE, ExtractionJob.STATUS_FAILED])
+        ).all()
+        results = {}
+        for job_id, status, result in rows:
+            data = None
+            if status == ExtractionJob.STATUS_DONE and result:
+                try:
+                    data = json.loads(result)
+                except (TypeError, ValueError):
+                    data = None
+            results[job_id] = data
+        return results
+
+    @staticmethod
+    def _normalize(value):
+        if value is None:
+            return ''
+        if isinstance(value, list):
+            value = ', '.join(str(item) for item in value)
+        if hasattr(value, 'strftime'):
+            value = value.strftime('%Y-%m-%d')
+        return str(value).strip()
+
+    @staticmethod
+    def diff_certificate(cert: Certificate, result: dict):
+        """
+        比较识别结果与证书现有内容
+
+        Returns:
+            list: [(字段, 证书中的值, 识别的值), ...]
+        """
+        diffs = []
+        for field, key in ReextractionService.DIFF_FIELDS.items():
+            current = ReextractionService._normalize(getattr(cert, field))
+            new = result.get(key)
+            if field == 'award_date':
+                new = parse_award_date(ReextractionService._normalize(new)) or new
+            new = ReextractionService._normalize(new)
+            if current != new:
+                diffs.append((field, current, new))
+        return diffs
+
+    @staticmethod
+    def record_batch(run: ReextractionRun, outcomes):
+        """
+        写入一批证书的对比结果并推进断点
+
+        Args:
+            outcomes: [(证书, 识别结果), ...]，按 cert_id 升序；识别失败或未识别出任何字段时结果为None
+        """
+        for cert, result in outcomes:
+            run.processed += 1
+            if not result or not any(result.values()):
+                run.failed += 1
+                continue
+            diffs = ReextractionService.diff_certificate(cert, result)
+            if diffs:
+                run.changed += 1
+                db.session.add_all([
+                    ReextractionDiff(run_id=run.run_id, cert_id=cert.cert_id, field=field,
+                                     current_value=current, new_value=new)
+                    for field, current, new in diffs
+                ])
+        if outcomes:
+            run.last_cert_id = outcomes[-1][0].cert_id
+        run.updated_at = datetime.now()
+        db.session.commit()
+
+    @staticmethod
+    def finish(run: ReextractionRun, status: str = ReextractionRun.STATUS_DONE):
+        run.status = status
+        run.updated_at = datetime.now()
+        if status == ReextractionRun.STATUS_DONE:
+            run.finished_at = run.updated_at
+        db.session.commit()
+        logger.info(f"重新识别任务 {run.run_id} {run.status_display}：已处理 {run.processed}/{run.total}，"
+                    f"不一致 {run.changed}，失败 {run.failed}")
+
+    @staticmethod
+    def field_summary(run_id: str):
+        """各字段不一致的证书数"""
+        return db.session.query(
+            ReextractionDiff.field, db.func.count(ReextractionDiff.diff_id)
+        ).filter_by(run_id=run_id).group_by(ReextractionDiff.field).order_by(
+            db.func.count(ReextractionDiff.diff_id).desc()
+        ).all()
@@ -0,0 +1,252 @@
+"""
+AI调用重试策略与熔断器
+按错误类型决定是否重试，失败过多的密钥在冷却期内不再分配
+"""
+from flask import current_app, has_app_context
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# 错误类型
+ERROR_RATE_LIMITED = 'rate_limited'  # 429 请求过多
+ERROR_SERVER = 'server'  # 5xx 服务端错误
+ERROR_NETWORK = 'network'  # 连接失败、超时
+ERROR_AUTH = 'auth'  # 401/403 密钥无效或欠费
+ERROR_CLIENT = 'client'  # 其他 4xx，请求本身有问题
+ERROR_INCOMPATIBLE = 'incompatible'  # SDK 不兼容（参数或接口不支持）
+ERROR_UNKNOWN = 'unknown'
+
+# 可换密钥重试的错误
+RETRYABLE_ERRORS = {ERROR_RATE_LIMITED, ERROR_SERVER, ERROR_NETWORK, ERROR_AUTH}
+# 计入密钥熔断的错误
+BREAKER_ERRORS = {ERROR_RATE_LIMITED, ERROR_SERVER, ERROR_NETWORK, ERROR_AUTH}
+
+
+def get_status_code(exc):
+    """从SDK或httpx异常中取HTTP状态码"""
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        response = getattr(exc, 'response', None)
+        status = getattr(response, 'status_code', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def get_retry_after(exc):
+    """读取响应头中的 Retry-After（秒），没有时返回None"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc):
+    """
+    判断AI调用异常的类型
+
+    Returns:
+        str: ERROR_* 常量之一
+    """
+    status = get_status_code(exc)
+    if status is not None:
+        if status == 429:
+            return ERROR_RATE_LIMITED
+        if status >= 500:
+            return ERROR_SERVER
+        if status in (401, 403):
+            return ERROR_AUTH
+        if 400 <= status < 500:
+            return ERROR_CLIENT
+
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return ERROR_NETWORK
+    name = type(exc).__name__
+    if 'Timeout' in name or 'Connect' in name or 'Network' in name:
+        return ERROR_NETWORK
+
+    if isinstance(exc, (TypeError, AttributeError, NotImplementedError, ImportError)):
+        return ERROR_INCOMPATIBLE
+    message = str(exc)
+    if 'unexpected keyword argument' in message or 'not supported' in message.lower():
+        return ERROR_INCOMPATIBLE
+
+    return ERROR_UNKNOWN
+
+
+def is_sdk_incompatible(exc):
+    """是否为SDK不兼容错误（仅此类错误才回退到旧接口）"""
+    return classify_error(exc) == ERROR_INCOMPATIBLE
+
+
+def _get_setting(name, default):
+    """读取 Flask 配置，无应用上下文时使用默认值"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+class RetryPolicy:
+    """
+    指数退避重试策略
+
+    第 n 次重试前等待 [0, min(max_delay, base_delay * 2^n)] 内的随机时间
+    （full jitter）；服务端返回 Retry-After 时不少于该值。
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=20.0, rand=random.random):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rand = rand
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            max_attempts=_get_setting('AI_RETRY_MAX_ATTEMPTS', 3),
+            base_delay=_get_setting('AI_RETRY_BASE_DELAY', 1.0),
+            max_delay=_get_setting('AI_RETRY_MAX_DELAY', 20.0)
+        )
+
+    def should_retry(self, exc, attempt):
+        """attempt 为已失败的次数（从1开始）"""
+        return attempt < self.max_attempts and classify_error(exc) in RETRYABLE_ERRORS
+
+    def get_delay(self, attempt, exc=None):
+        """第 attempt 次失败后的等待秒数"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = self._rand() * ceiling
+        retry_after = get_retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    单个密钥的熔断器
+
+    连续失败达到 failure_threshold 次后熔断，cooldown 秒内不再分配该密钥；
+    冷却结束后放行一个探测请求，成功则恢复，失败则重新熔断。
+    """
+
+    STATE_CLOSED = 'closed'
+    STATE_OPEN = 'open'
+    STATE_HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, cooldown=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self.state = self.STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def available(self):
+        """当前是否可以分配该密钥"""
+        if self.state == self.STATE_CLOSED:
+            return True
+        if self.state == self.STATE_OPEN and self._clock() - self.opened_at >= self.cooldown:
+            self.state = self.STATE_HALF_OPEN
+        if self.state != self.STATE_HALF_OPEN:
+            return False
+        # 探测请求未返回结果（如排队超时）时，一个冷却期后再放行下一个
+        return self._probe_at is None or self._clock() - self._probe_at >= self.cooldown
+
+    def on_acquire(self):
+        """密钥被分配时调用，半开状态下只放行一个探测请求"""
+        if self.state == self.STATE_HALF_OPEN:
+            self._probe_at = self._clock()
+
+    def record_success(self):
+        self.state = self.STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def record_failure(self):
+        """
+        记录一次失败
+
+        Returns:
+            bool: 本次失败是否触发熔断
+        """
+        self.failures += 1
+        self._probe_at = None
+        if self.state == self.STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+            tripped = self.state != self.STATE_OPEN
+            self.state = self.STATE_OPEN
+            self.opened_at = self._clock()
+            return tripped
+        return False
+
+
+class CircuitBreakerRegistry:
+    """进程级熔断器注册表，按密钥ID维护熔断器"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def _get(self, key_id):
+        breaker = self._breakers.get(key_id)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=_get_setting('AI_CIRCUIT_FAILURE_THRESHOLD', 5),
+                cooldown=_get_setting('AI_CIRCUIT_COOLDOWN', 60),
+                clock=self._clock
+            )
+            self._breakers[key_id] = breaker
+        return breaker
+
+    def available(self, key_id):
+        with self._lock:
+            breaker = self._breakers.get(key_id)
+            return breaker is None or breaker.available()
+
+    def on_acquire(self, key_id):
+        with self._lock:
+            breaker = self._breakers.get(key_id)
+            if breaker is not None:
+                breaker.on_acquire()
+
+    def record_success(self, key_id):
+        with self._lock:
+            breaker = self._breakers.get(key_id)
+            if breaker is not None:
+                breaker.record_success()
+
+    def record_failure(self, key_id, error_type=None):
+        with self._lock:
+            tripped = self._get(key_id).record_failure()
+        if tripped:
+            logger.warning(f"API密钥 {key_id} 连续调用失败（{error_type}），暂停使用")
+
+    def state(self, key_id):
+        with self._lock:
+            breaker = self._breakers.get(key_id)
+            return breaker.state if breaker else CircuitBreaker.STATE_CLOSED
+
+    def reset(self, key_id=None):
+        """重置熔断状态（管理员修改密钥后）"""
+        with self._lock:
+            if key_id is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(key_id, None)
+
+
+# 进程级单例
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,187 @@
+"""
+相同识别请求合并（single-flight）
+同一文件与提示词的并发识别只调用一次AI接口，其余调用方等待并共享结果；
+多进程部署时通过文件锁串行化，后到的进程直接读取识别缓存
+"""
+from contextlib import contextmanager
+from flask import current_app, has_app_context
+import hashlib
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+
+def _get_setting(name, default):
+    """读取 Flask 配置，无应用上下文时使用默认值"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+class _Call:
+    """一次进行中的调用"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    进程内的请求合并表
+
+    第一个调用方（leader）执行函数，同一 key 的后续调用方阻塞等待其结果；
+    leader 抛出的异常同样传递给等待方。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, timeout=None):
+        """
+        执行或等待同一 key 的调用
+
+        Args:
+            key: 请求标识
+            func: 无参函数，仅由 leader 调用
+            timeout: 等待方最长等待秒数，为空时一直等待
+
+        Returns:
+            tuple: (结果, 是否共享了其他调用方的结果)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError('等待相同的识别请求超时')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+            if call.waiters:
+                logger.info(f"合并了 {call.waiters} 个相同的识别请求")
+        return call.result, False
+
+    def in_flight(self):
+        """进行中的调用数"""
+        with self._lock:
+            return len(self._calls)
+
+
+def get_lock_folder():
+    """获取跨进程文件锁目录"""
+    folder = _get_setting('AI_LOCK_FOLDER', None)
+    if not folder:
+        folder = os.path.join(os.path.dirname(current_app.root_path), 'cache', 'locks')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _try_lock(fd):
+    """非阻塞加锁，成功返回True"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(name, timeout=None, poll_interval=0.05):
+    """
+    跨进程文件锁
+
+    锁文件在释放时删除；加锁后确认锁文件仍是目录中的同一个文件，
+    避免与正在删除锁文件的进程竞争。平台不支持文件锁时不加锁。
+
+    Args:
+        name: 锁名称
+        timeout: 最长等待秒数，超时后不加锁继续执行
+
+    Yields:
+        bool: 是否成功加锁
+    """
+    if fcntl is None and msvcrt is None:
+        yield False
+        return
+
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    path = os.path.join(get_lock_folder(), f'{digest}.lock')
+    deadline = None if timeout is None else time.monotonic() + timeout
+    fd = None
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if _try_lock(fd):
+            try:
+                # 锁文件已被上一个持有者删除时重新打开
+                if fcntl is None or os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            _unlock(fd)
+        os.close(fd)
+        fd = None
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.warning(f"等待文件锁超时，不加锁继续执行: {name}")
+            break
+        time.sleep(poll_interval)
+
+    if fd is None:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if fcntl is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _unlock(fd)
+        os.close(fd)
+
+
+# 进程级单例
+extraction_flights = SingleFlight()
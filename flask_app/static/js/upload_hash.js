@@ -0,0 +1,163 @@
+/**
+ * 上传前在浏览器中计算文件MD5（秒传预检、分片上传校验）
+ * 分块读取文件并增量计算，不把整个文件读入内存
+ */
+(function (global) {
+    'use strict';
+
+    var SHIFTS = [
+        7, 12, 17, 22, 7, 12, 17, 22, 7, 12, 17, 22, 7, 12, 17, 22,
+        5, 9, 14, 20, 5, 9, 14, 20, 5, 9, 14, 20, 5, 9, 14, 20,
+        4, 11, 16, 23, 4, 11, 16, 23, 4, 11, 16, 23, 4, 11, 16, 23,
+        6, 10, 15, 21, 6, 10, 15, 21, 6, 10, 15, 21, 6, 10, 15, 21
+    ];
+    var CONSTANTS = new Int32Array(64);
+    for (var n = 0; n < 64; n++) {
+        CONSTANTS[n] = Math.floor(Math.abs(Math.sin(n + 1)) * 4294967296) | 0;
+    }
+    var CHUNK_SIZE = 2 * 1024 * 1024;
+
+    function MD5() {
+        this.state = new Int32Array([0x67452301, 0xefcdab89 | 0, 0x98badcfe | 0, 0x10325476]);
+        this.buffer = new Uint8Array(64);
+        this.bufferLength = 0;
+        this.length = 0;
+        this.words = new Int32Array(16);
+    }
+
+    MD5.prototype._transform = function (bytes, offset) {
+        var x = this.words, state = this.state, i, j;
+        for (i = 0; i < 16; i++) {
+            j = offset + i * 4;
+            x[i] = bytes[j] | (bytes[j + 1] << 8) | (bytes[j + 2] << 16) | (bytes[j + 3] << 24);
+        }
+        var a = state[0], b = state[1], c = state[2], d = state[3], f, g, t, sum;
+        for (i = 0; i < 64; i++) {
+            if (i < 16) {
+                f = (b & c) | (~b & d);
+                g = i;
+            } else if (i < 32) {
+                f = (d & b) | (~d & c);
+                g = (5 * i + 1) % 16;
+            } else if (i < 48) {
+                f = b ^ c ^ d;
+                g = (3 * i + 5) % 16;
+            } else {
+                f = c ^ (b | ~d);
+                g = (7 * i) % 16;
+            }
+            t = d;
+            d = c;
+            c = b;
+            sum = (a + f + CONSTANTS[i] + x[g]) | 0;
+            b = (b + ((sum << SHIFTS[i]) | (sum >>> (32 - SHIFTS[i])))) | 0;
+            a = t;
+        }
+        state[0] = (state[0] + a) | 0;
+        state[1] = (state[1] + b) | 0;
+        state[2] = (state[2] + c) | 0;
+        state[3] = (state[3] + d) | 0;
+    };
+
+    /** 追加数据（Uint8Array） */
+    MD5.prototype.update = function (bytes) {
+        var i = 0, length = bytes.length;
+        this.length += length;
+        if (this.bufferLength) {
+            while (i < length && this.bufferLength < 64) {
+                this.buffer[this.bufferLength++] = bytes[i++];
+            }
+            if (this.bufferLength < 64) {
+                return this;
+            }
+            this._transform(this.buffer, 0);
+            this.bufferLength = 0;
+        }
+        for (; i + 64 <= length; i += 64) {
+            this._transform(bytes, i);
+        }
+        while (i < length) {
+            this.buffer[this.bufferLength++] = bytes[i++];
+        }
+        return this;
+    };
+
+    /** 结束计算，返回32位小写十六进制字符串 */
+    MD5.prototype.hex = function () {
+        var bits = this.length * 8;
+        var padding = new Uint8Array((this.bufferLength < 56 ? 56 : 120) - this.bufferLength + 8);
+        padding[0] = 0x80;
+        var low = bits % 4294967296, high = Math.floor(bits / 4294967296);
+        for (var i = 0; i < 4; i++) {
+            padding[padding.length - 8 + i] = (low >>> (8 * i)) & 0xff;
+            padding[padding.length - 4 + i] = (high >>> (8 * i)) & 0xff;
+        }
+        this.update(padding);
+        var out = '';
+        for (var w = 0; w < 4; w++) {
+            for (var k = 0; k < 4; k++) {
+                out += ('0' + ((this.state[w] >>> (8 * k)) & 0xff).toString(16)).slice(-2);
+            }
+        }
+        return out;
+    };
+
+    function readSlice(file, start, end) {
+        var blob = file.slice(start, end);
+        if (blob.arrayBuffer) {
+            return blob.arrayBuffer();
+        }
+        return new Promise(function (resolve, reject) {
+            var reader = new FileReader();
+            reader.onload = function () { resolve(reader.result); };
+            reader.onerror = function () { reject(reader.error); };
+            reader.readAsArrayBuffer(blob);
+        });
+    }
+
+    /**
+     * 计算文件（或其中一段）的MD5
+     * @param {Blob} file
+     * @param {Object} options prefix: 先计算的字符串（如服务器下发的随机数），
+     *        offset/length: 只计算文件中的一段，onProgress(已读字节, 总字节)
+     * @returns {Promise<string>}
+     */
+    function md5File(file, options) {
+        options = options || {};
+        var hash = new MD5();
+        if (options.prefix) {
+            hash.update(new TextEncoder().encode(options.prefix));
+        }
+        var start = options.offset || 0;
+        var end = options.length != null ? Math.min(file.size, start + options.length) : file.size;
+        var position = start;
+
+        function next() {
+            if (position >= end) {
+                return Promise.resolve(hash.hex());
+            }
+            var chunkEnd = Math.min(end, position + CHUNK_SIZE);
+            return readSlice(file, position, chunkEnd).then(function (buffer) {
+                hash.update(new Uint8Array(buffer));
+                position = chunkEnd;
+                if (options.onProgress) {
+                    options.onProgress(position - start, end - start);
+                }
+                return next();
+            });
+        }
+        return next();
+    }
+
+    /** 浏览器是否支持计算文件MD5 */
+    function isSupported() {
+        return !!(global.Promise && global.Blob && global.Uint8Array && global.TextEncoder &&
+            (global.Blob.prototype.arrayBuffer || global.FileReader));
+    }
+
+    global.UploadHash = {
+        MD5: MD5,
+        md5File: md5File,
+        isSupported: isSupported
+    };
+})(window);
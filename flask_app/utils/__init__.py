@@ -15,7 +15,8 @@ from .certificate_utils import (
     get_submit_status_by_role,
     build_certificate_from_form,
     update_certificate_from_form,
-    convert_existing_cert_to_dict
+    convert_existing_cert_to_dict,
+    prepare_extracted_info
 )
 from .decorators import (
     admin_required, 
@@ -30,8 +31,11 @@ from .file_utils import (
     get_upload_folder,
     get_user_upload_folder,
     generate_unique_filename,
+    save_upload_stream,
     save_uploaded_file,
     create_file_record,
+    resolve_file_md5,
     is_image_file,
-    is_pdf_file
+    is_pdf_file,
+    encode_file_base64
 )
@@ -212,3 +212,44 @@ def convert_existing_cert_to_dict(cert):
         'advisor': cert.advisor,
         'advisor_id': cert.advisor_id or ''
     }
+
+
+def prepare_extracted_info(extracted_info, user=None):
+    """
+    整理AI识别结果，用于填充证书表单
+    
+    - 列表类型的字段转换为逗号分隔的字符串
+    - 获奖日期统一为 YYYY-MM-DD 字符串
+    - 根据用户角色预填充学生/指导教师信息
+    
+    Args:
+        extracted_info: AI识别结果字典
+        user: User对象，默认为当前用户
+    
+    Returns:
+        dict: 整理后的证书信息字典
+    """
+    if user is None:
+        user = current_user
+    
+    extracted_info = dict(extracted_info or {})
+    
+    for key, value in extracted_info.items():
+        if isinstance(value, list):
+            extracted_info[key] = ', '.join(str(item) for item in value)
+    
+    award_date = extracted_info.get('award_date')
+    if award_date and not isinstance(award_date, str):
+        extracted_info['award_date'] = award_date.strftime('%Y-%m-%d') if hasattr(award_date, 'strftime') else str(award_date)
+    elif isinstance(award_date, str) and len(award_date) > 10:
+        extracted_info['award_date'] = award_date[:10]
+    
+    if user.role == 'student':
+        extracted_info['student_id'] = user.account_id
+        if not extracted_info.get('student_name'):
+            extracted_info['student_name'] = user.name
+    elif user.role == 'teacher':
+        extracted_info['advisor'] = user.name
+        extracted_info['advisor_id'] = user.account_id
+    
+    return extracted_info
@@ -2,7 +2,10 @@
 文件处理工具函数
 """
 import os
+import binascii
 import hashlib
+import io
+import tempfile
 from datetime import datetime
 from flask import current_app
 from flask_login import current_user
@@ -84,47 +87,95 @@ def get_user_upload_folder(user=None):
     return user_dir
 
 
-def generate_unique_filename(original_filename):
+def generate_unique_filename(original_filename, file_md5=None):
     """
     生成唯一的文件名
     
     Args:
         original_filename: 原始文件名
+        file_md5: 文件MD5，提供时加入文件名，避免同一秒内上传的文件重名
     
     Returns:
         str: 唯一文件名
     """
     ext = get_file_extension(original_filename)
     date_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if file_md5:
+        return f"{date_str}_{file_md5[:8]}_cert{ext}"
     return f"{date_str}_cert{ext}"
 
 
+def save_upload_stream(stream, original_filename, is_duplicate=None, keep_max_bytes=0, chunk_size=256 * 1024):
+    """
+    分块读取上传流，边计算MD5边写入临时文件，再放入按内容寻址的文件存储
+    
+    临时文件与存储目录在同一文件系统，读取完成后原子重命名为 blobs/ab/cd/<MD5><扩展名>，
+    存储中已有相同内容时直接删除临时文件；MD5 显示为重复证书时也直接删除临时文件。
+    每次只在内存中保留一个分块。
+    
+    Args:
+        stream: 可读的文件对象（如 FileStorage.stream）
+        original_filename: 原始文件名，用于确定扩展名
+        is_duplicate: 接收MD5、返回是否为重复文件的函数
+        keep_max_bytes: 文件不超过此大小时同时返回文件内容（如交给识别工作线程），0 表示不保留
+        chunk_size: 每次读取的字节数
+    
+    Returns:
+        tuple: (file_path, file_md5, file_size, content)；重复文件的 file_path 为None，
+               content 仅在文件不超过 keep_max_bytes 时返回
+    """
+    from flask_app.services.blob_store import blob_store
+    
+    md5 = hashlib.md5()
+    file_size = 0
+    kept = [] if keep_max_bytes else None
+    fd, temp_path = tempfile.mkstemp(prefix='upload_', suffix='.part', dir=blob_store.temp_dir())
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                md5.update(chunk)
+                f.write(chunk)
+                file_size += len(chunk)
+                if kept is not None:
+                    if file_size <= keep_max_bytes:
+                        kept.append(chunk)
+                    else:
+                        kept = None
+        
+        file_md5 = md5.hexdigest()
+        if is_duplicate is not None and is_duplicate(file_md5):
+            os.remove(temp_path)
+            return None, file_md5, file_size, None
+        
+        file_path = blob_store.commit_temp(temp_path, file_md5, original_filename, file_size)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    return file_path, file_md5, file_size, b''.join(kept) if kept is not None else None
+
+
 def save_uploaded_file(file_content, original_filename, user=None):
     """
     保存上传的文件
     
     Args:
-        file_content: 文件内容（bytes）
+        file_content: 文件内容（bytes）或可读的文件对象（按分块写入，不整体读入内存）
         original_filename: 原始文件名
-        user: User对象，默认为当前用户
+        user: 保留参数，文件按内容存放，不再区分用户目录
     
     Returns:
         tuple: (file_path, file_md5, file_type)
     """
-    if user is None:
-        user = current_user
-    
-    # 计算MD5
-    file_md5 = calculate_file_md5(file_content)
+    if isinstance(file_content, (bytes, bytearray)):
+        file_content = io.BytesIO(file_content)
     
-    # 获取保存路径
-    save_dir = get_user_upload_folder(user)
-    unique_filename = generate_unique_filename(original_filename)
-    file_path = os.path.join(save_dir, unique_filename)
-    
-    # 保存文件
-    with open(file_path, 'wb') as f:
-        f.write(file_content)
+    # 边写入边计算MD5
+    file_path, file_md5, _, _ = save_upload_stream(file_content, original_filename)
     
     # 判断文件类型
     file_type = get_file_type(file_path)
@@ -165,6 +216,38 @@ def create_file_record(user_id, filename, file_path, file_type, file_size, file_
     return file_record
 
 
+def resolve_file_md5(file_path):
+    """
+    获取服务器端已保存文件的MD5（不使用客户端提交的MD5）
+
+    依次取存储键中的MD5、文件记录中上传时计算的MD5，都没有时读取文件计算。
+    识别缓存、合并请求等以MD5为键的地方必须使用此结果，否则提交他人文件的MD5
+    即可读取或覆盖他人证书的识别结果。
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: MD5哈希值，文件不存在时返回None
+    """
+    from flask_app.models import File
+    from flask_app.services.blob_store import blob_store
+
+    key = blob_store.parse_key(file_path)
+    if key is not None:
+        return key[:32]
+    record = File.query.filter_by(file_path=file_path).filter(File.file_md5.isnot(None)).first()
+    if record is not None and record.file_md5:
+        return record.file_md5
+    if not file_path or not os.path.isfile(file_path):
+        return None
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
 def is_image_file(file_path):
     """
     判断是否为图片文件
@@ -177,3 +260,48 @@ def is_pdf_file(file_path):
     判断是否为PDF文件
     """
     return file_path.lower().endswith('.pdf')
+
+
+def encode_file_base64(file_path, mime_type=None, chunk_size=3 * 256 * 1024):
+    """
+    分块将文件编码为base64，可直接生成 data URI
+    
+    按编码后长度一次性分配缓冲区，逐块读入并编码写入，避免同时持有
+    原文件、base64 bytes、str 以及拼接前缀后的字符串等多份完整副本。
+    
+    Args:
+        file_path: 文件路径
+        mime_type: 指定时返回 data:<mime_type>;base64,... 格式
+        chunk_size: 每次读取的字节数（需为3的倍数，保证分块编码结果可直接拼接）
+    
+    Returns:
+        str: base64 字符串或 data URI
+    """
+    prefix = f'data:{mime_type};base64,'.encode('ascii') if mime_type else b''
+    file_size = os.path.getsize(file_path)
+    buffer = bytearray(len(prefix) + (file_size + 2) // 3 * 4)
+    buffer[:len(prefix)] = prefix
+    
+    chunk = bytearray(chunk_size)
+    offset = len(prefix)
+    with open(file_path, 'rb') as f:
+        while True:
+            # 读满一个分块，只有最后一块可能不是3的倍数
+            filled = 0
+            while filled < chunk_size:
+                n = f.readinto(memoryview(chunk)[filled:])
+                if not n:
+                    break
+                filled += n
+            if not filled:
+                break
+            encoded = binascii.b2a_base64(memoryview(chunk)[:filled], newline=False)
+            buffer[offset:offset + len(encoded)] = encoded
+            offset += len(encoded)
+            if filled < chunk_size:
+                break
+    
+    # 读取期间文件被截断时去掉多余的缓冲区
+    if offset < len(buffer):
+        del buffer[offset:]
+    return buffer.decode('ascii')
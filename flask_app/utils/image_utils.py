@@ -0,0 +1,194 @@
+"""
+图片预处理工具函数
+AI识别前对证书图片进行方向校正、缩放和重新压缩，派生图按MD5缓存在磁盘上
+"""
+import io
+import os
+import hashlib
+import logging
+import uuid
+from flask import current_app
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# 输出格式对应的扩展名与MIME类型
+IMAGE_FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+
+# 原图扩展名对应的MIME类型
+IMAGE_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.bmp': 'image/bmp',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+
+def get_image_mime_type(file_path):
+    """根据扩展名获取图片MIME类型"""
+    return IMAGE_MIME_TYPES.get(os.path.splitext(file_path)[1].lower(), 'image/jpeg')
+
+
+def get_preprocess_options():
+    """读取图片预处理配置"""
+    config = current_app.config
+    image_format = str(config.get('AI_IMAGE_FORMAT', 'JPEG')).upper()
+    if image_format not in IMAGE_FORMATS:
+        image_format = 'JPEG'
+    return {
+        'max_edge': int(config.get('AI_IMAGE_MAX_EDGE', 2048)),
+        'format': image_format,
+        'quality': int(config.get('AI_IMAGE_QUALITY', 85)),
+        'grayscale': bool(config.get('AI_IMAGE_GRAYSCALE', False)),
+    }
+
+
+def get_image_cache_folder():
+    """获取派生图缓存目录"""
+    folder = current_app.config.get(
+        'AI_IMAGE_CACHE_FOLDER',
+        os.path.join(os.path.dirname(current_app.root_path), 'cache', 'ai_images')
+    )
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _derivative_path(file_md5, options):
+    """派生图路径：<MD5前2位>/<MD5>_<最长边>_<质量>[_g].<扩展名>"""
+    ext = IMAGE_FORMATS[options['format']][0]
+    suffix = '_g' if options['grayscale'] else ''
+    filename = f"{file_md5}_{options['max_edge']}_{options['quality']}{suffix}{ext}"
+    return os.path.join(get_image_cache_folder(), file_md5[:2], filename)
+
+
+def render_image(image, options):
+    """
+    按预处理参数转换图片
+
+    Args:
+        image: PIL.Image 对象
+        options: get_preprocess_options() 返回的参数
+
+    Returns:
+        PIL.Image: 转换后的图片
+    """
+    # 按EXIF方向信息旋转（手机拍摄的照片常见）
+    image = ImageOps.exif_transpose(image)
+
+    if options['grayscale']:
+        image = image.convert('L')
+    elif image.mode not in ('RGB', 'L'):
+        # 透明背景铺白底，避免转换后变黑
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+    max_edge = options['max_edge']
+    if max_edge and max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return image
+
+
+def save_image(image, path, options):
+    """按预处理参数中的格式与质量保存图片"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_kwargs = {'quality': options['quality']}
+    if options['format'] == 'JPEG':
+        save_kwargs.update(optimize=True, progressive=True)
+    else:
+        save_kwargs['method'] = 4
+    image.save(path, options['format'], **save_kwargs)
+
+
+def preprocess_image(file_path, file_md5=None, data=None):
+    """
+    生成AI识别用的派生图
+
+    同一文件（MD5）与参数只处理一次；派生图不比原图小且无需旋转时直接使用原图。
+    未安装 Pillow、关闭预处理或处理失败时返回原图。
+
+    Args:
+        file_path: 原图路径
+        file_md5: 原图MD5，未提供时根据文件内容计算
+        data: 已在内存中的原图内容（如刚上传的文件），提供时不再从磁盘读取
+
+    Returns:
+        tuple: (用于识别的图片路径, MIME类型)
+    """
+    original = (file_path, get_image_mime_type(file_path))
+    if not PIL_AVAILABLE or not current_app.config.get('AI_IMAGE_PREPROCESS_ENABLED', True):
+        return original
+
+    options = get_preprocess_options()
+    if not file_md5 and data is not None:
+        file_md5 = hashlib.md5(data).hexdigest()
+    elif not file_md5:
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(chunk)
+        file_md5 = md5.hexdigest()
+
+    mime_type = IMAGE_FORMATS[options['format']][1]
+    cache_path = _derivative_path(file_md5, options)
+    if os.path.exists(cache_path):
+        return cache_path, mime_type
+
+    tmp_path = f'{cache_path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        with Image.open(io.BytesIO(data) if data is not None else file_path) as image:
+            # 需要旋转、缩放或转灰度时必须使用派生图
+            changed = image.getexif().get(0x0112, 1) != 1 \
+                or max(image.size) > options['max_edge'] or options['grayscale']
+            rendered = render_image(image, options)
+
+            save_image(rendered, tmp_path, options)
+
+        original_size = len(data) if data is not None else os.path.getsize(file_path)
+        if not changed and os.path.getsize(tmp_path) >= original_size:
+            os.remove(tmp_path)
+            return original
+
+        os.replace(tmp_path, cache_path)
+        return cache_path, mime_type
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        logger.warning(f"图片预处理失败，使用原图: {file_path}: {e}")
+        return original
+
+
+def clear_image_cache(file_md5=None):
+    """
+    清除派生图缓存
+
+    Args:
+        file_md5: 只清除该文件的派生图，为空时清除全部
+
+    Returns:
+        int: 删除的文件数
+    """
+    folder = get_image_cache_folder()
+    count = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if file_md5 is None or name.startswith(file_md5):
+                os.remove(os.path.join(root, name))
+                count += 1
+    return count
@@ -0,0 +1,168 @@
+"""
+PDF 证书栅格化工具函数
+使用 PyMuPDF 将PDF页面渲染为图片，交给图片识别流程处理；渲染结果按MD5缓存
+"""
+import os
+import hashlib
+import logging
+import math
+import uuid
+from flask import current_app
+
+try:
+    import pymupdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    try:
+        import fitz as pymupdf  # 旧版本 PyMuPDF
+        PYMUPDF_AVAILABLE = True
+    except ImportError:
+        PYMUPDF_AVAILABLE = False
+        pymupdf = None
+
+from flask_app.utils.image_utils import (
+    PIL_AVAILABLE, IMAGE_FORMATS, Image,
+    get_image_cache_folder, get_preprocess_options, render_image, save_image
+)
+
+logger = logging.getLogger(__name__)
+
+# 页面四周留白的判定阈值（灰度值大于此视为白色）
+WHITE_THRESHOLD = 245
+
+
+def is_pdf_rendering_available():
+    """是否可以在本地将PDF渲染为图片"""
+    return PYMUPDF_AVAILABLE and PIL_AVAILABLE \
+        and current_app.config.get('AI_PDF_RASTERIZE_ENABLED', True)
+
+
+def get_pdf_options():
+    """读取PDF渲染配置"""
+    config = current_app.config
+    pages = str(config.get('AI_PDF_PAGES', 'first')).lower()
+    return {
+        'dpi': int(config.get('AI_PDF_DPI', 150)),
+        'pages': 'all' if pages == 'all' else 'first',
+        'max_pages': max(1, int(config.get('AI_PDF_MAX_PAGES', 4))),
+    }
+
+
+def _rendered_path(file_md5, pdf_options, image_options):
+    """渲染结果路径：<MD5前2位>/<MD5>_pdf_<DPI>_<页面模式>_<最长边>_<质量>[_g].<扩展名>"""
+    ext = IMAGE_FORMATS[image_options['format']][0]
+    pages = 'all%d' % pdf_options['max_pages'] if pdf_options['pages'] == 'all' else 'p1'
+    suffix = '_g' if image_options['grayscale'] else ''
+    filename = (f"{file_md5}_pdf_{pdf_options['dpi']}_{pages}"
+                f"_{image_options['max_edge']}_{image_options['quality']}{suffix}{ext}")
+    return os.path.join(get_image_cache_folder(), file_md5[:2], filename)
+
+
+def trim_margins(image, padding=16):
+    """裁掉页面四周的空白，保留少量边距"""
+    gray = image.convert('L')
+    # 非白色像素的外接矩形
+    bbox = gray.point(lambda v: 0 if v > WHITE_THRESHOLD else 255).getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    left = max(left - padding, 0)
+    top = max(top - padding, 0)
+    right = min(right + padding, image.width)
+    bottom = min(bottom + padding, image.height)
+    if (right - left) * (bottom - top) >= image.width * image.height * 0.95:
+        return image
+    return image.crop((left, top, right, bottom))
+
+
+def tile_pages(pages):
+    """
+    将多页拼接为一张图片，单页直接返回
+
+    两页上下拼接，更多页按两列网格排列，保证一次识别覆盖所有页面。
+    """
+    if len(pages) == 1:
+        return pages[0]
+
+    columns = 1 if len(pages) == 2 else 2
+    rows = math.ceil(len(pages) / columns)
+    cell_width = max(page.width for page in pages)
+    cell_height = max(page.height for page in pages)
+    gap = 20
+
+    canvas = Image.new('RGB', (
+        columns * cell_width + (columns - 1) * gap,
+        rows * cell_height + (rows - 1) * gap
+    ), (255, 255, 255))
+    for index, page in enumerate(pages):
+        row, column = divmod(index, columns)
+        canvas.paste(page, (column * (cell_width + gap), row * (cell_height + gap)))
+    return canvas
+
+
+def render_pdf_pages(file_path, pdf_options, data=None):
+    """
+    渲染PDF页面，提供 data 时从内存中的文件内容渲染
+
+    Returns:
+        list: PIL.Image 页面列表
+    """
+    zoom = pdf_options['dpi'] / 72
+    matrix = pymupdf.Matrix(zoom, zoom)
+    pages = []
+    document = pymupdf.open(stream=data, filetype='pdf') if data is not None else pymupdf.open(file_path)
+    with document:
+        if document.page_count == 0:
+            raise ValueError('PDF文件没有页面')
+        count = 1 if pdf_options['pages'] == 'first' else min(document.page_count, pdf_options['max_pages'])
+        for index in range(count):
+            pixmap = document[index].get_pixmap(matrix=matrix, alpha=False)
+            page = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+            pages.append(trim_margins(page))
+    return pages
+
+
+def render_pdf(file_path, file_md5=None, data=None):
+    """
+    将PDF证书渲染为识别用图片
+
+    同一文件（MD5）与参数只渲染一次。多页PDF在 AI_PDF_PAGES='all' 时
+    拼接为一张图片，否则只渲染第一页。
+
+    Args:
+        file_path: PDF文件路径
+        file_md5: 文件MD5，未提供时根据文件内容计算
+        data: 已在内存中的文件内容（如刚上传的文件），提供时不再从磁盘读取
+
+    Returns:
+        tuple: (图片路径, MIME类型)
+    """
+    if not file_md5 and data is not None:
+        file_md5 = hashlib.md5(data).hexdigest()
+    elif not file_md5:
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(chunk)
+        file_md5 = md5.hexdigest()
+
+    pdf_options = get_pdf_options()
+    image_options = get_preprocess_options()
+    mime_type = IMAGE_FORMATS[image_options['format']][1]
+    cache_path = _rendered_path(file_md5, pdf_options, image_options)
+    if os.path.exists(cache_path):
+        return cache_path, mime_type
+
+    pages = render_pdf_pages(file_path, pdf_options, data)
+    image = render_image(tile_pages(pages), image_options)
+
+    tmp_path = f'{cache_path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        save_image(image, tmp_path, image_options)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"PDF已渲染为图片: {file_path} -> {cache_path}（{len(pages)} 页）")
+    return cache_path, mime_type
@@ -0,0 +1,68 @@
+"""
+数据库结构升级工具
+db.create_all() 只会创建缺失的表，此模块为已存在的表补充模型中新增的列
+"""
+from sqlalchemy import inspect, text
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _render_default(column):
+    """将列的标量默认值渲染为SQL字面量，不支持时返回None"""
+    default = column.default
+    if default is None or not default.is_scalar:
+        return None
+    value = default.arg
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return None
+
+
+def add_missing_columns(db):
+    """
+    为已存在的表添加模型中新增的列
+
+    新增列统一以可空列添加（带标量默认值时同时设置DEFAULT），
+    并补建模型中声明而数据库中缺少的索引。
+
+    Args:
+        db: Flask-SQLAlchemy 实例
+
+    Returns:
+        list: 新增的列，格式为 ['表名.列名', ...]
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            new_columns = [c for c in table.columns if c.name not in existing_columns]
+
+            for column in new_columns:
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                default = _render_default(column)
+                if default is not None:
+                    ddl += f' DEFAULT {default}'
+                conn.execute(text(ddl))
+                added.append(f'{table.name}.{column.name}')
+
+            existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn, checkfirst=True)
+
+    if added:
+        logger.info(f"已为数据库补充新增列: {', '.join(added)}")
+    return added
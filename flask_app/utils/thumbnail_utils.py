@@ -0,0 +1,133 @@
+"""
+证书缩略图工具函数
+列表页的缩略图与详情页的预览图在首次请求时生成，按MD5与尺寸缓存在磁盘上；
+PDF证书使用第一页渲染的图片（需要 PyMuPDF）
+"""
+import hashlib
+import logging
+import os
+import uuid
+from flask import current_app
+
+from flask_app.utils.image_utils import PIL_AVAILABLE, IMAGE_FORMATS, Image, render_image, save_image
+
+logger = logging.getLogger(__name__)
+
+# 默认尺寸：名称 -> 最长边像素
+DEFAULT_THUMBNAIL_SIZES = {'thumb': 240, 'preview': 1024}
+
+
+def get_thumbnail_options():
+    """读取缩略图配置，Pillow 不支持 WebP 时改用 JPEG"""
+    config = current_app.config
+    image_format = str(config.get('THUMBNAIL_FORMAT', 'WEBP')).upper()
+    if image_format not in IMAGE_FORMATS:
+        image_format = 'JPEG'
+    if image_format == 'WEBP' and PIL_AVAILABLE:
+        from PIL import features
+        if not features.check('webp'):
+            image_format = 'JPEG'
+    return {
+        'sizes': dict(DEFAULT_THUMBNAIL_SIZES, **config.get('THUMBNAIL_SIZES', {})),
+        'format': image_format,
+        'quality': int(config.get('THUMBNAIL_QUALITY', 80)),
+        'grayscale': False,
+    }
+
+
+def get_thumbnail_folder():
+    """获取缩略图缓存目录"""
+    folder = current_app.config.get(
+        'THUMBNAIL_CACHE_FOLDER',
+        os.path.join(os.path.dirname(current_app.root_path), 'cache', 'thumbnails')
+    )
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _thumbnail_path(file_md5, max_edge, options):
+    """缩略图路径：<MD5前2位>/<MD5>_<最长边>_<质量>.<扩展名>"""
+    ext = IMAGE_FORMATS[options['format']][0]
+    return os.path.join(get_thumbnail_folder(), file_md5[:2], f"{file_md5}_{max_edge}_{options['quality']}{ext}")
+
+
+def _open_source(file_path, max_edge):
+    """打开原图；PDF渲染第一页，分辨率按目标尺寸选择"""
+    if file_path.lower().endswith('.pdf'):
+        from flask_app.utils.pdf_utils import PYMUPDF_AVAILABLE, render_pdf_pages
+        if not PYMUPDF_AVAILABLE:
+            return None
+        dpi = 72 if max_edge <= 600 else 150
+        return render_pdf_pages(file_path, {'dpi': dpi, 'pages': 'first', 'max_pages': 1})[0]
+
+    image = Image.open(file_path)
+    # JPEG 解码时直接按比例缩小，大图生成缩略图时不必解码全部像素
+    if image.format == 'JPEG':
+        image.draft('RGB', (max_edge, max_edge))
+    return image
+
+
+def get_thumbnail(file_path, size, file_md5=None):
+    """
+    获取证书文件的缩略图，不存在时生成
+
+    Args:
+        file_path: 原文件路径（图片或PDF）
+        size: 尺寸名称，见 THUMBNAIL_SIZES
+        file_md5: 原文件MD5，未提供时根据文件内容计算
+
+    Returns:
+        tuple: (缩略图路径, MIME类型)；未安装 Pillow（PDF还需 PyMuPDF）或生成失败时返回None
+    """
+    options = get_thumbnail_options()
+    max_edge = options['sizes'].get(size)
+    if not PIL_AVAILABLE or not max_edge:
+        return None
+
+    if not file_md5:
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(chunk)
+        file_md5 = md5.hexdigest()
+
+    mime_type = IMAGE_FORMATS[options['format']][1]
+    cache_path = _thumbnail_path(file_md5, max_edge, options)
+    if os.path.exists(cache_path):
+        return cache_path, mime_type
+
+    tmp_path = f'{cache_path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        image = _open_source(file_path, max_edge)
+        if image is None:
+            return None
+        with image:
+            rendered = render_image(image, dict(options, max_edge=max_edge))
+            save_image(rendered, tmp_path, options)
+        os.replace(tmp_path, cache_path)
+        return cache_path, mime_type
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        logger.warning(f"生成缩略图失败: {file_path}: {e}")
+        return None
+
+
+def clear_thumbnails(file_md5=None):
+    """
+    清除缩略图缓存
+
+    Args:
+        file_md5: 只清除该文件的缩略图，为空时清除全部
+
+    Returns:
+        int: 删除的文件数
+    """
+    folder = get_thumbnail_folder()
+    count = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if file_md5 is None or name.startswith(file_md5):
+                os.remove(os.path.join(root, name))
+                count += 1
+    return count